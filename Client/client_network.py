@@ -4,7 +4,8 @@ import socket
 import threading
 import ssl
 import time
-from Common.irc_protocol import build_message, parse_message
+from Common.irc_protocol import build_message, parse_bytes
+from Common.framing import ByteFramer, TAGGED_MAX_LINE
 from Common.custom_errors import IRCConnectionError
 from Common.custom_errors import ProtocolError
 
@@ -86,6 +87,7 @@ class ClientConnection:
         self.multi_response_buffer = []  # Nuevo buffer para respuestas multiparte
         self.response_terminator = None  # Patrón que indica fin de respuesta múltiple
         self.command = None
+        self.capabilities = set()  # Capacidades de IRCv3 aceptadas por el servidor (CAP ACK)
         
     def set_expected_response(self, command, pattern, terminator=None):
         """Define el patrón de la respuesta que se espera recibir."""
@@ -115,9 +117,13 @@ class ClientConnection:
         for attempt in range(retries):
             try:
                 self.ssl_socket = socket.create_connection((self.host, self.port))
+                # Tags time y msgid en los mensajes (Message.tags) y todos los prefijos en
+                # NAMES; el registro queda en espera hasta el CAP END
+                self.send("CAP", ["REQ"], "message-tags server-time multi-prefix")
                 self.pass_command(password)
                 self.nick(nick)
                 self.set_user(nick, real_name)
+                self.send("CAP", ["END"])
                 self.is_connected = True
                 return
             except Exception as e:
@@ -149,89 +155,94 @@ class ClientConnection:
             message_queue (queue.Queue, optional): Cola para enviar mensajes a la interfaz gráfica.
                                                 Si es None, los mensajes se imprimen en la consola.
         """
+        framer = ByteFramer()
         try:
             while self.is_connected:
-                # Leer datos del servidor
-                data = self.ssl_socket.recv(4096).decode('utf-8').strip()
-                if not data:
+                # Leer datos del servidor directamente al búfer del framer
+                if not framer.recv_into(self.ssl_socket):
                     break
 
-                # Dividir los mensajes en líneas por el delimitador IRC (\r\n)
-                responses = data.split('\r\n')
-
-                # Procesar cada línea
-                for line in responses:
-                    if line.startswith("PING"):
+                # Procesar cada línea completa; una línea partida entre dos
+                # lecturas se entrega entera en la siguiente
+                for raw in framer.lines():
+                    try:
+                        message = parse_bytes(raw)
+                    except ProtocolError:
+                        continue  # Línea sin comando
+                    command = message.command
+                    if command == "PING":
                         # Responder automáticamente a PING con PONG
-                        server_name = line.split()[1]
+                        params = message.params
+                        server_name = params[0] if params else message.trailing
                         # print(f"[CLIENTE] PING recibido desde {server_name}. Respondiendo con PONG.")
                         self.pong(server_name)
+                    elif command == "CAP":
+                        params = message.params
+                        if len(params) >= 2 and params[1] == "ACK":
+                            for name in (message.trailing or "").split():
+                                if name.startswith("-"):
+                                    self.capabilities.discard(name[1:])
+                                else:
+                                    self.capabilities.add(name)
+                            if self.capabilities & {"message-tags", "server-time"} and framer.max_line < TAGGED_MAX_LINE:
+                                # Las líneas del servidor traen tags además de los 512 bytes
+                                framer.resize(TAGGED_MAX_LINE)
                     else:
-                        parts = line.split()
-                        if len(parts) > 1 and parts[1].isdigit():
-                            error_code = parts[1]
-                            if error_code in response_patterns["ERROR"]:
-                                self.last_matching_response = line
-                                self.response_received.set()  # Notificar a `wait_for_response()`
-                                continue  # No seguir procesando este mensaje
-                            
+                        if command in response_patterns["ERROR"]:
+                            self.last_matching_response = message.body
+                            self.response_received.set()  # Notificar a `wait_for_response()`
+                            continue  # No seguir procesando este mensaje
+
                         # Manejar mensajes espontáneos (PRIVMSG, NOTICE, etc.)
-                        if "PRIVMSG" in line or "NOTICE" in line:
-                            sender = line.split('!')[0][1:]  # Obtener el remitente
-                            msg_content = line.split(":", 2)[-1]  # Obtener el mensaje
-                            print(f"\n[{sender}] {msg_content}")  # Mostrar el mensaje directamente
+                        if command == "PRIVMSG" or command == "NOTICE":
+                            print(f"\n[{message.nick}] {message.trailing}")  # Mostrar el mensaje directamente
                             if message_queue:
-                                message_queue.put(line)
+                                message_queue.put(message)
                             continue  # No procesar como respuesta esperada
-                        
+
                         # Detectar si alguien se une a un canal (JOIN)
-                        if " JOIN " in line:
-                            parts = line.split()
-                            if len(parts) >= 3:
-                                user = line.split("!")[0][1:]  # Extrae el nombre de usuario
-                                channel = parts[-1]  # Canal al que se unió
-                                print(f"\n🔹 {user} se ha unido a {channel}")
+                        if command == "JOIN":
+                            params = message.params
+                            channel = params[-1] if params else message.trailing  # Canal al que se unió
+                            print(f"\n🔹 {message.nick} se ha unido a {channel}")
                             if message_queue:
-                                message_queue.put(line)
+                                message_queue.put(message)
                             continue
 
                         # Detectar si alguien sale de un canal (PART)
-                        if " PART " in line:
-                            parts = line.split()
-                            if len(parts) >= 3:
-                                user = line.split("!")[0][1:]  # Extrae el nombre de usuario
-                                channel = parts[2]  # Canal del que salió
-                                reason = " ".join(parts[3:]).lstrip(":") if len(parts) > 3 else ""
-                                print(f"\n🔸 {user} ha salido de {channel} ({reason})")
+                        if command == "PART":
+                            params = message.params
+                            if params:
+                                reason = message.trailing or ""
+                                print(f"\n🔸 {message.nick} ha salido de {params[0]} ({reason})")
                             if message_queue:
-                                message_queue.put(line)
+                                message_queue.put(message)
                             continue
 
                         # Detectar si alguien es expulsado (KICK)
-                        if " KICK " in line:
-                            parts = line.split()
-                            if len(parts) >= 4:
-                                kicker = line.split("!")[0][1:]  # Quién ejecutó la acción
-                                channel = parts[2]  # Canal donde ocurrió el kick
-                                kicked_user = parts[3]  # Usuario expulsado
-                                reason = " ".join(parts[4:]).lstrip(":") if len(parts) > 4 else ""
-                                print(f"\n❌ {kicked_user} fue expulsado de {channel} por {kicker} ({reason})")
+                        if command == "KICK":
+                            params = message.params
+                            if len(params) >= 2:
+                                reason = message.trailing or ""
+                                print(f"\n❌ {params[1]} fue expulsado de {params[0]} por {message.nick} ({reason})")
                             if message_queue:
-                                message_queue.put(line)
+                                message_queue.put(message)
                             continue
 
                         # Detectar si el usuario fue invitado a un canal (INVITE)
-                        if " INVITE " in line:
-                            parts = line.split()
-                            if len(parts) >= 4:
-                                inviter = line.split("!")[0][1:]  # Quién envió la invitación
-                                invited_user = parts[2]  # Usuario invitado
-                                channel = parts[-1].lstrip(":")  # Canal al que fue invitado
-                                print(f"\n📩 {inviter} ha invitado a {invited_user} a {channel}")
+                        if command == "INVITE":
+                            params = message.params
+                            if params:
+                                channel = message.trailing or params[-1]  # Canal al que fue invitado
+                                print(f"\n📩 {message.nick} ha invitado a {params[0]} a {channel}")
                             if message_queue:
-                                message_queue.put(line)
+                                message_queue.put(message)
                             continue
 
+                        # Respuestas a comandos: se comparan con la línea completa, sin
+                        # las tags (client_main las separa por posición)
+                        line = message.body
+
                         if self.command == "/topic":
                             if any(code in line for code in self.expected_response):
                                 self.multi_response_buffer.append(line)
@@ -242,7 +253,7 @@ class ClientConnection:
                                     self.response_received.set()
                                     continue
                                 if message_queue:
-                                    message_queue.put(line)
+                                    message_queue.put(message)
                         else:
 
                             # Manejar respuestas esperadas
@@ -267,7 +278,7 @@ class ClientConnection:
 
 
                         if message_queue:
-                            message_queue.put(line)
+                            message_queue.put(message)
                         # else:
                         #     print(line)  # Opcional: imprime todos los mensajes (para depuración)
         except Exception as e:
@@ -320,6 +331,21 @@ class ClientConnection:
         """
         self.send("PRIVMSG", [target], message)
 
+    def chathistory(self, target, limit=50, selector="LATEST", reference="*"):
+        """
+        Pide al servidor los mensajes recientes de un canal o conversación (CHATHISTORY).
+
+        Los mensajes llegan como PRIVMSG/NOTICE normales y se procesan igual
+        que los recibidos en vivo.
+
+        Args:
+            target (str): Canal o nick.
+            limit (int): Cantidad máxima de mensajes.
+            selector (str): LATEST, BEFORE o AFTER.
+            reference (str): "*", "msgid=..." o "timestamp=...".
+        """
+        self.send("CHATHISTORY", [selector, target, reference, str(limit)])
+
     def set_user(self, username, realname):
         """
         Establece la información del usuario (RFC 2812).
@@ -0,0 +1,104 @@
+# Common.framing.py
+
+MAX_LINE = 512     # Límite de una línea IRC, CRLF incluido (RFC 2812, 2.3)
+MAX_TAGS = 8191    # Bloque de tags de IRCv3 ("@" y espacio incluidos), además de la línea
+TAGGED_MAX_LINE = MAX_LINE + MAX_TAGS  # Límite una vez negociadas las tags (message-tags)
+READ_SIZE = 4096   # Bytes pedidos al socket en cada lectura
+
+
+class ByteFramer:
+    """
+    Separa en líneas IRC el flujo de bytes de una conexión, sin copias
+    intermedias.
+
+    Lee con `recv_into` sobre un búfer preasignado de `max_line + read_size`
+    bytes, busca los saltos de línea con `bytearray.find` y entrega cada
+    línea como un `memoryview` del propio búfer; quien la usa decodifica solo
+    lo que necesita. Una línea más larga que `max_line` se trunca y el resto
+    se descarta hasta el siguiente salto, así que la memoria por conexión
+    nunca crece.
+
+    Los `memoryview` entregados son válidos hasta la siguiente lectura.
+    """
+    def __init__(self, max_line=MAX_LINE, read_size=READ_SIZE):
+        self.max_line = max_line
+        self.read_size = read_size
+        self.buffer = bytearray(max_line + read_size)
+        self.view = memoryview(self.buffer)
+        self.start = 0            # Inicio de la línea aún incompleta
+        self.end = 0              # Fin de los datos recibidos
+        self.discarding = False   # Descartando el resto de una línea demasiado larga
+
+    def recv_into(self, sock):
+        """
+        Lee del socket directamente al búfer.
+
+        Returns:
+            int: Bytes leídos; 0 si el otro lado cerró la conexión.
+        """
+        self._compact()
+        received = sock.recv_into(self.view[self.end:self.end + self.read_size])
+        self.end += received
+        return received
+
+    def feed(self, data):
+        """
+        Copia al búfer datos ya leídos (p. ej. de un StreamReader de asyncio)
+        y entrega las líneas completas, en orden.
+        """
+        for offset in range(0, len(data), self.read_size):
+            chunk = data[offset:offset + self.read_size]
+            self._compact()
+            self.view[self.end:self.end + len(chunk)] = chunk
+            self.end += len(chunk)
+            yield from self.lines()
+
+    def lines(self):
+        """
+        Entrega las líneas completas recibidas, sin el CRLF (o LF solo).
+
+        Las líneas vacías se omiten.
+        """
+        while True:
+            newline = self.buffer.find(b"\n", self.start, self.end)
+            if newline < 0:
+                break
+            start = self.start
+            self.start = newline + 1
+            if self.discarding:
+                self.discarding = False  # Fin de la línea truncada
+                continue
+            stop = newline
+            if stop > start and self.buffer[stop - 1] == 13:  # \r
+                stop -= 1
+            stop = min(stop, start + self.max_line - 2)
+            if stop > start:
+                yield self.view[start:stop]
+
+        if self.end - self.start >= self.max_line:
+            # Sin salto de línea dentro del límite: se entrega truncada
+            if not self.discarding:
+                self.discarding = True
+                yield self.view[self.start:self.start + self.max_line - 2]
+            self.start = self.end
+        if self.start == self.end:
+            self.start = self.end = 0
+
+    def resize(self, max_line):
+        """Cambia el límite de línea conservando lo pendiente (p. ej. al pasar a enlace entre servidores)."""
+        pending = bytes(self.view[self.start:self.end])
+        self.max_line = max_line
+        self.buffer = bytearray(max_line + self.read_size)
+        self.view = memoryview(self.buffer)
+        self.view[:len(pending)] = pending
+        self.start = 0
+        self.end = len(pending)
+
+    def _compact(self):
+        # La línea incompleta (menos de max_line bytes) pasa al principio del
+        # búfer, dejando al menos read_size bytes libres
+        if self.start:
+            pending = self.end - self.start
+            self.view[:pending] = self.view[self.start:self.end]
+            self.start = 0
+            self.end = pending
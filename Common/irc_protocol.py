@@ -1,7 +1,218 @@
 # Common.irc_protocol.py
 
+import sys
+
 from Common.custom_errors import ProtocolError
 
+_COMMANDS = {}        # Bytes del verbo -> str internado (NICK, PRIVMSG, 353...)
+_MAX_COMMANDS = 1024  # Límite para que verbos basura no hagan crecer la caché
+_TAG_ESCAPES = {":": ";", "s": " ", "\\": "\\", "r": "\r", "n": "\n"}
+_TAG_VALUE_ESCAPES = str.maketrans({";": "\\:", " ": "\\s", "\\": "\\\\", "\r": "\\r", "\n": "\\n"})
+
+
+class Message:
+    """
+    Mensaje IRC parseado desde bytes.
+
+    Guarda la línea y la posición de cada campo. `command` se resuelve al
+    parsear y es un str internado; `tags`, `prefix`, `params` y `trailing`
+    se decodifican recién al leerlos (en cada lectura: conviene guardarlos
+    en una variable si se usan varias veces).
+
+    Se puede desempaquetar como la tupla de parse_message:
+        prefix, command, params, trailing = message
+    """
+    __slots__ = ("raw", "command", "_tags", "_prefix", "_middle", "_trailing")
+
+    def __init__(self, raw, command, tags, prefix, middle, trailing):
+        self.raw = raw              # Línea completa en bytes, sin CRLF
+        self.command = command
+        self._tags = tags           # (inicio, fin) o None
+        self._prefix = prefix       # (inicio, fin) o None
+        self._middle = middle       # (inicio, fin) de los parámetros
+        self._trailing = trailing   # Inicio del trailing, -1 si no tiene
+
+    @property
+    def tags(self):
+        """Tags de IRCv3 como {clave: valor}; valor "" si la tag no lo tiene."""
+        if not self._tags:
+            return {}
+        start, end = self._tags
+        return parse_tags(str(self.raw[start:end], 'utf-8', 'ignore'))
+
+    @property
+    def prefix(self):
+        """Origen del mensaje ("" si no tiene)."""
+        if not self._prefix:
+            return ''
+        start, end = self._prefix
+        return str(self.raw[start:end], 'utf-8', 'ignore')
+
+    @property
+    def nick(self):
+        """Nick del prefijo (la parte antes de "!"), o el prefijo completo."""
+        return self.prefix.split('!', 1)[0]
+
+    @property
+    def params(self):
+        """Parámetros intermedios (sin el trailing)."""
+        start, end = self._middle
+        return str(self.raw[start:end], 'utf-8', 'ignore').split()
+
+    @property
+    def trailing(self):
+        """Texto después de " :" (None si no tiene)."""
+        if self._trailing < 0:
+            return None
+        return str(self.raw[self._trailing:], 'utf-8', 'ignore')
+
+    @property
+    def line(self):
+        """Línea completa decodificada."""
+        return str(self.raw, 'utf-8', 'ignore')
+
+    @property
+    def body(self):
+        """Línea decodificada sin el bloque de tags de IRCv3 (igual a line si no tiene)."""
+        if not self._tags:
+            return self.line
+        return str(self.raw[self._tags[1]:], 'utf-8', 'ignore').lstrip(' ')
+
+    def __iter__(self):
+        # Los cuatro campos de una vez, sin pasar por cada propiedad
+        raw = self.raw
+        prefix = self._prefix
+        start, end = self._middle
+        trailing = self._trailing
+        return iter((
+            str(raw[prefix[0]:prefix[1]], 'utf-8', 'ignore') if prefix else '',
+            self.command,
+            str(raw[start:end], 'utf-8', 'ignore').split(),
+            str(raw[trailing:], 'utf-8', 'ignore') if trailing >= 0 else None,
+        ))
+
+    def __repr__(self):
+        return f"Message({self.raw!r})"
+
+
+def _unescape_tag(value):
+    # Escapes de valores de tags (IRCv3 message-tags): \: \s \\ \r \n
+    out = []
+    chars = iter(value)
+    for char in chars:
+        if char == '\\':
+            escaped = next(chars, '')
+            out.append(_TAG_ESCAPES.get(escaped, escaped))
+        else:
+            out.append(char)
+    return ''.join(out)
+
+
+def parse_tags(text):
+    """
+    Interpreta un bloque de tags de IRCv3 ("clave=valor;clave2", sin "@").
+
+    Returns:
+        dict: {clave: valor} con los valores ya sin escapes.
+    """
+    tags = {}
+    for item in text.split(';'):
+        key, _, value = item.partition('=')
+        if key:
+            tags[key] = _unescape_tag(value) if '\\' in value else value
+    return tags
+
+
+def escape_tag_value(value):
+    """Escapa el valor de una tag de IRCv3 (";", espacio, "\\", CR y LF)."""
+    return value.translate(_TAG_VALUE_ESCAPES)
+
+
+def format_tags(tags):
+    """
+    Serializa tags de IRCv3 como bloque "@clave=valor;clave2" (sin el espacio final).
+
+    Args:
+        tags (dict): {clave: valor}; un valor None o "" deja solo la clave.
+
+    Returns:
+        str: Bloque de tags, o "" si no hay ninguna.
+    """
+    if not tags:
+        return ''
+    return '@' + ';'.join(
+        f"{key}={escape_tag_value(str(value))}" if value not in (None, '') else key
+        for key, value in tags.items()
+    )
+
+
+def parse_bytes(data):
+    """
+    Parsear una línea IRC recibida como bytes (o memoryview), sin CRLF.
+
+    El formato esperado es:
+    ["@" <tags> <SPACE>] [":" <prefix> <SPACE>] <command> <params> [<SPACE> ":" <trailing>]
+
+    Recorre la línea una sola vez, de izquierda a derecha, y solo guarda
+    dónde empieza y termina cada campo (ver Message). Un memoryview se copia
+    a bytes, así el mensaje sigue siendo válido tras la siguiente lectura.
+
+    Args:
+        data (bytes | bytearray | memoryview): Línea IRC cruda.
+
+    Returns:
+        Message: Mensaje parseado.
+
+    Raises:
+        ProtocolError: Si la línea no tiene comando.
+    """
+    raw = data if type(data) is bytes else bytes(data)
+    find = raw.find
+    pos = 0
+    tags = prefix = None
+
+    if raw[:1] == b'@':
+        space = find(b' ', 1)
+        if space < 0:
+            raise ProtocolError("Mensaje IRC inválido: falta el comando")
+        tags = (1, space)
+        pos = space + 1
+        while raw[pos:pos + 1] == b' ':
+            pos += 1
+
+    if raw[pos:pos + 1] == b':':
+        space = find(b' ', pos)
+        if space < 0:
+            raise ProtocolError("Mensaje IRC inválido: falta el comando")
+        prefix = (pos + 1, space)
+        pos = space + 1
+
+    # El trailing empieza en el primer " :" después del prefijo
+    trailing = find(b' :', pos)
+    if trailing < 0:
+        middle_end = len(raw)
+    else:
+        middle_end = trailing
+        trailing += 2
+
+    if raw[pos:pos + 1] == b' ':
+        while pos < middle_end and raw[pos] == 32:  # Espacios antes del comando
+            pos += 1
+    command_end = find(b' ', pos, middle_end)
+    if command_end < 0:
+        command_end = middle_end
+    if command_end == pos:
+        raise ProtocolError("Mensaje IRC inválido: falta el comando")
+
+    verb = raw[pos:command_end]
+    command = _COMMANDS.get(verb)
+    if command is None:
+        command = sys.intern(str(verb, 'utf-8', 'ignore'))
+        if len(_COMMANDS) < _MAX_COMMANDS:
+            _COMMANDS[verb] = command
+
+    return Message(raw, command, tags, prefix, (command_end, middle_end), trailing)
+
 
 def parse_message(raw_message):
     """
@@ -14,51 +225,33 @@ def parse_message(raw_message):
     - `command` es el comando IRC (e.g., NICK, JOIN, PRIVMSG).
     - `params` son los parámetros asociados al comando.
     - `trailing` es el mensaje final (e.g., texto de un chat).
+
+    Delega en parse_bytes; quien ya tiene los bytes de la línea debe usar
+    parse_bytes directamente.
     
     Args:
         raw_message (str): Mensaje IRC crudo recibido.
     
     Returns:
-        tuple: (prefix, command, params, trailing).
+        Message: Se desempaqueta como (prefix, command, params, trailing).
     """
-    print(f"Mensaje recibido crudo: {raw_message}")
-
-    try:
-        prefix = ''
-        trailing = None
-
-        # Verifica si el mensaje tiene un prefijo
-        if raw_message.startswith(':'):
-            prefix, raw_message = raw_message[1:].split(' ', 1)
+    if not isinstance(raw_message, str):
+        raise ProtocolError(f"Error al parsear el mensaje: se esperaba str, no {type(raw_message).__name__}")
+    return parse_bytes(raw_message.encode('utf-8', 'surrogatepass'))
 
-        # Verifica si hay una sección trailing (mensaje después de ':')
-        if ' :' in raw_message:
-            raw_message, trailing = raw_message.split(' :', 1)
 
-        # Divide el resto del mensaje en comando y parámetros
-        parts = raw_message.split()
-        if not parts:
-            raise ProtocolError("Mensaje IRC inválido: falta el comando")
-
-        command = parts[0]  # El primer elemento es el comando
-        params = parts[1:]  # El resto son los parámetros
-
-        return prefix, command, params, trailing
-    except Exception as e:
-        raise ProtocolError(f"Error al parsear el mensaje: {e}")
-
-
-def build_message(command, params=None, trailing=None):
+def build_message(command, params=None, trailing=None, tags=None):
     """
     Construir un mensaje IRC para enviar al servidor o cliente.
     
     El formato generado será:
-    [":" <prefix> <SPACE>] <command> <params> [<SPACE> ":" <trailing>]
+    ["@" <tags> <SPACE>] [":" <prefix> <SPACE>] <command> <params> [<SPACE> ":" <trailing>]
     
     Args:
         command (str): Comando IRC (e.g., NICK, JOIN, PRIVMSG).
         params (list, optional): Lista de parámetros asociados al comando.
         trailing (str, optional): Mensaje adicional (texto del chat o similar).
+        tags (dict, optional): Tags de IRCv3 ({clave: valor}), escapadas al serializar.
     
     Returns:
         str: Mensaje formateado listo para enviar.
@@ -76,6 +269,9 @@ def build_message(command, params=None, trailing=None):
 
         if trailing:
             message += ' :' + trailing
+
+        if tags:
+            message = format_tags(tags) + ' ' + message
    
         return message
     except Exception as e:
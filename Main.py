@@ -1,6 +1,7 @@
 # Client.Main.py
 
 import argparse
+import logging
 from Client.client_main import run_client
 from Server.server_main import run_server
 
@@ -8,12 +9,33 @@ def main():
     parser = argparse.ArgumentParser(description="Sistema IRC con cliente y servidor.")
     parser.add_argument('--mode', choices=['client', 'server'], required=True,
                         help="Modo de ejecución: cliente o servidor")
+    parser.add_argument('--engine', choices=['threaded', 'asyncio'], default='threaded',
+                        help="Motor del servidor: un hilo por cliente o loop de asyncio")
+    parser.add_argument('--debug', action='store_true',
+                        help="Registrar cada comando recibido por el servidor")
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help="Puerto local para exponer métricas en formato Prometheus (/metrics)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Procesos del servidor en el mismo puerto (SO_REUSEPORT); 1 = un solo proceso")
+    parser.add_argument('--port', type=int, default=8080,
+                        help="Puerto TCP del servidor")
+    parser.add_argument('--name', default=None,
+                        help="Nombre del servidor dentro de una red enlazada (CONNECT)")
+    parser.add_argument('--listen', action='append', default=[], metavar='EXTREMO',
+                        help="Extremo adicional: host:puerto o unix:/ruta, con @backlog opcional (repetible)")
+    parser.add_argument('--link-password', default=None,
+                        help="Contraseña que deben enviar (PASS) los servidores que se enlazan con este")
+    parser.add_argument('--link-allow', action='append', default=[], metavar='IP',
+                        help="Dirección de un servidor que puede enlazarse sin contraseña (repetible)")
+    parser.add_argument('--oper', action='append', default=[], metavar='NOMBRE:CLAVE',
+                        help="Operador del servidor para OPER (CONNECT y SQUIT) (repetible)")
     args = parser.parse_args()
 
     if args.mode == 'client':
         run_client()
     elif args.mode == 'server':
-        run_server()
+        run_server(args.engine, logging.DEBUG if args.debug else logging.INFO, args.metrics_port, args.workers,
+                   args.port, args.name, args.listen, args.link_password, args.link_allow, args.oper)
 
 if __name__ == "__main__":
     main()
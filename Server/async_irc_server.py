@@ -0,0 +1,241 @@
+# Server.async_irc_server.py
+
+import asyncio
+from concurrent.futures import Future
+from threading import Thread, Event
+
+from Server.irc_server import IRCServer
+from Server.sendq import SendQ, CLOSE_GRACE
+from Server.server_log import log
+from Server.listeners import describe, is_unix, peer_address
+
+try:
+    import resource
+except ImportError:  # Windows no tiene el módulo resource
+    resource = None
+
+
+class StreamSocket:
+    """
+    Adaptador de un asyncio.StreamWriter con la interfaz de socket
+    (sendall/shutdown/close) que usan los manejadores de IRCServer.
+
+    Las escrituras pasan por una cola de salida acotada que vacía una tarea
+    escritora propia de la conexión.
+    """
+    def __init__(self, writer, max_bytes):
+        self.writer = writer
+        self.sendq = SendQ(max_bytes)
+        self._wakeup = asyncio.Event()
+        self._abort_handle = None
+        self.loop = asyncio.get_running_loop()
+        self._task = self.loop.create_task(self._write_loop())
+
+    def sendall(self, data):
+        if not self.sendq.push(data):
+            log.warning("SendQ excedida para %s, desconectando", self.writer.get_extra_info('peername'))
+            self._schedule_abort()
+        self._wakeup.set()
+
+    def send_reply(self, chunks):
+        """Encola la respuesta de un comando de esta conexión (ver SendQ.push_reply)."""
+        if not self.sendq.push_reply(chunks):
+            log.warning("SendQ excedida para %s, desconectando", self.writer.get_extra_info('peername'))
+            self._schedule_abort()
+        self._wakeup.set()
+
+    def shutdown(self, how):
+        self.close()
+
+    def close(self):
+        """Cierra la conexión después de vaciar lo pendiente."""
+        self.sendq.flush_held()
+        if not self.sendq.closing:
+            self.sendq.closing = True
+            self._schedule_abort()
+        self._wakeup.set()
+
+    def _schedule_abort(self):
+        # Si el cliente no lee, drain() nunca termina: cortar tras un margen
+        if self._abort_handle is None:
+            self._abort_handle = self.loop.call_later(
+                CLOSE_GRACE, self.writer.transport.abort
+            )
+
+    async def _write_loop(self):
+        while True:
+            if not self.sendq.chunks and not self.sendq.closing:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            data = self.sendq.pop_all()
+            if not data:
+                break  # Cerrando y sin nada pendiente
+            self.writer.write(data)
+            self.sendq.writes += 1
+            try:
+                await self.writer.drain()
+            except OSError:
+                break
+        self.writer.close()
+        if self._abort_handle is not None:
+            self._abort_handle.cancel()
+
+
+class AsyncIRCServer(IRCServer):
+    """
+    Servidor IRC que atiende todas las conexiones en un único loop de asyncio
+    (aceptación, lectura, despacho de comandos, temporizadores y escritura), en lugar
+    de un hilo por cliente. Reutiliza los manejadores de IRCServer, por lo que
+    las respuestas RFC 2812 son idénticas.
+    """
+    def __init__(self, host, port):
+        super().__init__(host, port)
+        self.backlog = 1024
+        self.loop = None
+        self._servers = []  # Un asyncio.Server por extremo de escucha
+        self._ready = Event()
+        self._start_error = None  # Error al abrir los extremos, relanzado en start()
+        self._streams = {}  # {tarea lectora: StreamSocket} de las conexiones abiertas
+
+    def start(self):
+        """
+        Inicia el loop de asyncio en un hilo separado.
+        """
+        self.running = True
+        _raise_fd_limit()
+        Thread(target=self._run_loop, daemon=True).start()
+        self._ready.wait()
+        if self._start_error is not None:
+            self.running = False
+            raise self._start_error
+        self._start_metrics()
+
+    def _run_loop(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self.serve())
+        finally:
+            # Cancelar las conexiones que sigan abiertas antes de cerrar el loop
+            pending = asyncio.all_tasks(self.loop)
+            for task in pending:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self.loop.close()
+
+    async def serve(self):
+        """
+        Acepta clientes y ejecuta las tareas periódicas hasta que se detenga el servidor.
+        """
+        # Los sockets se abren igual que en el motor de hilos (mismo backlog por
+        # extremo); asyncio solo los atiende
+        try:
+            self._open_listeners()
+        except OSError as e:
+            self._start_error = e
+            self._ready.set()
+            return
+        for listener, address in self._listen_sockets:
+            if is_unix(address):
+                server = await asyncio.start_unix_server(self._handle_stream, sock=listener)
+            else:
+                server = await asyncio.start_server(self._handle_stream, sock=listener)
+            self._servers.append(server)
+            log.info("Servidor asyncio escuchando en %s", describe(address))
+        self._ready.set()
+
+        tasks = [asyncio.create_task(self._timer_loop())]
+        try:
+            await asyncio.gather(*(server.serve_forever() for server in self._servers))
+        except asyncio.CancelledError:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            for server in self._servers:
+                server.close()
+            self._close_listeners()
+            # Cortar las conexiones abiertas y esperar a que cada lector las limpie
+            for stream in self._streams.values():
+                stream.writer.transport.abort()
+            await asyncio.gather(*self._streams, return_exceptions=True)
+
+    def _call_in_server(self, function, *args):
+        # El estado solo se modifica desde el loop
+        self.loop.call_soon_threadsafe(function, *args)
+
+    def _ask_server(self, function, *args):
+        # El loop ya es el único escritor: desde fuera se espera un Future
+        if self._in_loop():
+            return function(*args)
+        future = Future()
+
+        def run():
+            try:
+                future.set_result(function(*args))
+            except Exception as e:
+                future.set_exception(e)
+        self.loop.call_soon_threadsafe(run)
+        return future.result()
+
+    def _in_loop(self):
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    async def _timer_loop(self):
+        while self.running:
+            await asyncio.sleep(self.timers.tick)
+            self._on_timer_tick()
+
+    async def _handle_stream(self, reader, writer):
+        """
+        Equivalente asíncrono de IRCServer._handle_client.
+        """
+        addr = writer.get_extra_info("peername") or peer_address(None, writer.get_extra_info("sockname"))
+        log.info("Cliente conectado desde %s", addr)
+        session = self._new_session(StreamSocket(writer, self.max_sendq), addr)
+        task = asyncio.current_task()
+        self._streams[task] = session.socket
+        framer = session.framer
+        try:
+            while self.running:
+                data = await reader.read(framer.read_size)
+                if not data:
+                    break
+                session.bytes_in += len(data)
+                if not self._on_lines(session, framer.feed(data)):
+                    break
+
+        except Exception as e:
+            log.error("Error con cliente %s: %s", addr, e)
+
+        finally:
+            self._close_session(session)
+            del self._streams[task]
+
+    def stop(self):
+        """
+        Detiene el servidor.
+        """
+        self.running = False
+        if self.loop:
+            for server in self._servers:
+                self.loop.call_soon_threadsafe(server.close)
+        self._stop_metrics()
+        log.info("Servidor detenido correctamente.")
+
+
+def _raise_fd_limit():
+    """Sube el límite de descriptores abiertos al máximo permitido (miles de conexiones)."""
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    target = 65536 if hard == resource.RLIM_INFINITY else hard
+    if soft < target:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+        except (ValueError, OSError) as e:
+            log.warning("No se pudo ampliar el límite de descriptores: %s", e)
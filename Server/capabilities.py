@@ -0,0 +1,173 @@
+# Server.capabilities.py
+
+import binascii
+import calendar
+import itertools
+import os
+import time
+
+from Common.irc_protocol import escape_tag_value, format_tags
+
+# Capacidades de IRCv3 como bits de un entero (ClientSession.caps, Client.caps)
+CAP_MESSAGE_TAGS = 1 << 0      # message-tags: msgid y demás tags
+CAP_SERVER_TIME = 1 << 1       # server-time: tag time
+CAP_BATCH = 1 << 2             # batch: respuestas agrupadas entre BATCH +id / -id
+CAP_ECHO_MESSAGE = 1 << 3      # echo-message: PRIVMSG/NOTICE propios de vuelta al emisor
+CAP_MULTI_PREFIX = 1 << 4      # multi-prefix: todos los prefijos de canal en NAMES y WHO
+CAP_LABELED_RESPONSE = 1 << 5  # labeled-response: la tag label vuelve en la respuesta
+CAP_CHATHISTORY = 1 << 6       # draft/chathistory: solo anuncia el comando CHATHISTORY
+CAPABILITIES = {
+    "batch": CAP_BATCH,
+    "draft/chathistory": CAP_CHATHISTORY,
+    "echo-message": CAP_ECHO_MESSAGE,
+    "labeled-response": CAP_LABELED_RESPONSE,
+    "message-tags": CAP_MESSAGE_TAGS,
+    "multi-prefix": CAP_MULTI_PREFIX,
+    "server-time": CAP_SERVER_TIME,
+}
+TAG_CAPS = CAP_MESSAGE_TAGS | CAP_SERVER_TIME  # Las que agregan tags a los mensajes
+
+# Los msgid son un prefijo aleatorio más el pid (los workers de un clúster
+# heredan el prefijo al hacer fork) y un contador
+_MSGID_PREFIX = binascii.hexlify(os.urandom(6)).decode("ascii")
+_msgid_counter = itertools.count(1)
+_batch_counter = itertools.count(1)
+
+
+def cap_names(caps):
+    """Capacidades activas en caps, separadas por espacios."""
+    return " ".join(name for name, bit in CAPABILITIES.items() if caps & bit)
+
+
+def parse_cap_request(text):
+    """
+    Interpreta la lista de un CAP REQ ("server-time -message-tags").
+
+    Returns:
+        tuple: (bits a activar, bits a desactivar), o None si alguna
+        capacidad no existe (la petición entera se rechaza con NAK).
+    """
+    enable = disable = 0
+    for name in text.split():
+        removing = name.startswith("-")
+        bit = CAPABILITIES.get(name.lstrip("-").lower())
+        if bit is None:
+            return None
+        if removing:
+            disable |= bit
+        else:
+            enable |= bit
+    return enable, disable
+
+
+def server_time(now=None):
+    """Hora UTC en el formato de la tag time: 2026-10-17T12:00:00.000Z."""
+    now = time.time() if now is None else now
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(now)) + f".{int(now * 1000) % 1000:03d}Z"
+
+
+def parse_server_time(text):
+    """
+    Interpreta una hora con el formato de la tag time.
+
+    Returns:
+        int: Milisegundos desde el epoch (ValueError si el texto no es válido).
+    """
+    if len(text) < 19 or text[4] != "-" or text[10] != "T":
+        raise ValueError(f"Hora inválida: {text}")
+    seconds = calendar.timegm((int(text[0:4]), int(text[5:7]), int(text[8:10]),
+                               int(text[11:13]), int(text[14:16]), int(text[17:19]), 0, 0, 0))
+    fraction = text[20:23] if text[19:20] == "." else "0"
+    return seconds * 1000 + int(fraction.ljust(3, "0"))
+
+
+def new_msgid():
+    """Identificador único de mensaje dentro de la red."""
+    return f"{_MSGID_PREFIX}{os.getpid():x}-{next(_msgid_counter):x}"
+
+
+def message_tags():
+    """Tags (time y msgid) de un mensaje nuevo; se generan una vez por difusión."""
+    return {"time": server_time(), "msgid": new_msgid()}
+
+
+def tag_block(tags, caps):
+    """
+    Bloque "@... " que corresponde a un cliente con caps.
+
+    server-time habilita solo time; message-tags, todas las demás.
+
+    Returns:
+        bytes: Bloque codificado con el espacio final, o b"" si no aplica ninguna.
+    """
+    selected = {
+        key: value for key, value in tags.items()
+        if (caps & CAP_SERVER_TIME if key == "time" else caps & CAP_MESSAGE_TAGS)
+    }
+    return (format_tags(selected) + " ").encode("utf-8") if selected else b""
+
+
+def add_tag(line, tag):
+    """Agrega tag (bytes "clave=valor") al bloque de tags de una línea, o se lo crea."""
+    if line.startswith(b"@"):
+        return b"@" + tag + b";" + line[1:]
+    return b"@" + tag + b" " + line
+
+
+def new_batch_ref():
+    """Referencia nueva para un BATCH (única en este proceso)."""
+    return f"{next(_batch_counter):x}"
+
+
+def batch_start(ref, kind, params="", tags=None):
+    """Línea "BATCH +ref kind params" (con CRLF), con tags opcionales."""
+    line = f":mock.server BATCH +{ref} {kind}{' ' + params if params else ''}\r\n".encode("utf-8")
+    return (format_tags(tags) + " ").encode("utf-8") + line if tags else line
+
+
+def batch_end(ref):
+    """Línea "BATCH -ref" que cierra el lote."""
+    return f":mock.server BATCH -{ref}\r\n".encode("ascii")
+
+
+def batch(lines, kind, params="", tags=None):
+    """
+    Envuelve lines (bytes sin CRLF) en un BATCH de IRCv3.
+
+    La apertura lleva tags (por ejemplo label) y cada línea, la tag batch
+    con la referencia del lote.
+
+    Returns:
+        bytes: BATCH +ref, las líneas y BATCH -ref, cada una con su CRLF.
+    """
+    ref = new_batch_ref()
+    tag = b"batch=" + ref.encode("ascii")
+    body = b"".join(add_tag(line, tag) + b"\r\n" for line in lines)
+    return batch_start(ref, kind, params, tags) + body + batch_end(ref)
+
+
+def labeled(data, label, caps):
+    """
+    Respuesta completa a un comando con tag label (labeled-response).
+
+    Sin líneas se responde ACK; una línea lleva la tag label; varias van
+    en un BATCH labeled-response si el cliente negoció batch (si no, salen
+    sin etiquetar).
+    """
+    tag = f"label={escape_tag_value(label)}".encode("utf-8")
+    lines = [line for line in data.split(b"\r\n") if line]
+    if not lines:
+        return add_tag(b":mock.server ACK", tag) + b"\r\n"
+    if len(lines) == 1:
+        return add_tag(lines[0], tag) + b"\r\n"
+    if caps & CAP_BATCH:
+        return batch(lines, "labeled-response", tags={"label": label})
+    return data
+
+
+def tag_lines(data, tags, caps):
+    """Antepone a cada línea de data el bloque de tags que corresponde a caps."""
+    block = tag_block(tags, caps)
+    if not block:
+        return data
+    return b"".join(block + line + b"\r\n" for line in data.split(b"\r\n") if line)
@@ -0,0 +1,580 @@
+# Server.cluster.py
+
+import itertools
+import logging
+import multiprocessing
+from multiprocessing.connection import wait
+from threading import Event, Lock, Thread
+import time
+
+from Server.server_log import configure_logging, log
+from Server.capabilities import message_tags
+from Server.irc_constants import TARGMAX
+from Server.pipeline import parse_line
+
+CLAIM_TIMEOUT = 5       # Segundos máximos que un comando espera al coordinador (CLAIM/CREATE)
+PARKED_MAX_LINES = 256  # Líneas que una conexión puede acumular mientras espera al coordinador
+READY_TIMEOUT = 30      # Segundos máximos para que todos los workers estén escuchando
+
+
+class ClusterLink:
+    """
+    Extremo de un worker en el canal con el coordinador.
+
+    Varios hilos pueden enviar a la vez (un hilo por cliente en el motor
+    threaded), así que cada envío se serializa con un candado. Las respuestas
+    a las peticiones (CLAIM, CREATE) no se esperan aquí: llegan como REPLY y
+    las atiende el hilo dueño del estado (ver ClusterMixin._on_lines).
+    """
+    def __init__(self, conn):
+        self.conn = conn
+        self.lock = Lock()
+        self.ids = itertools.count()
+
+    def send(self, message):
+        with self.lock:
+            self.conn.send(message)
+
+
+class ParkedCommand:
+    """Comando de una conexión que espera respuestas del coordinador, y lo que llegó detrás."""
+    __slots__ = ("lines", "pending", "answers")
+
+    def __init__(self, lines):
+        self.lines = lines     # [bytes]: el comando en espera primero, en el orden recibido
+        self.pending = set()   # Ids de las peticiones aún sin respuesta
+        self.answers = {}      # {(CLAIM o CREATE, nombre): concedido}
+
+
+class RemoteSocket:
+    """
+    Socket de un usuario conectado a otro worker.
+
+    Lo que los manejadores le envían se reenvía por el coordinador al worker
+    dueño, que lo escribe en la conexión real.
+    """
+    def __init__(self, link, worker, nick):
+        self.link = link
+        self.worker = worker
+        self.nick = nick
+
+    def sendall(self, data):
+        self.link.send(("DELIVER", self.worker, self.nick, data))
+
+    def shutdown(self, how):
+        pass  # La conexión la cierra su worker
+
+    def close(self):
+        pass
+
+
+class ClusterMixin:
+    """
+    Convierte un servidor (IRCServer o AsyncIRCServer) en worker de un clúster.
+
+    Cada worker guarda una réplica completa de clientes y canales: los
+    usuarios de otros workers aparecen en `clients` con un RemoteSocket. Los
+    helpers que modifican el estado (_add_client, _add_member, _set_topic, ...)
+    publican además un evento que el coordinador reparte a los demás workers,
+    que lo aplican sobre su réplica sin volver a publicarlo. Los nicks se
+    reservan en el coordinador, así que una colisión entre workers recibe el
+    mismo 433 que en un solo servidor.
+
+    Reservar un nick o crear un canal no bloquea al worker: la conexión que
+    lo pide queda en espera (con sus líneas siguientes, en orden) y su
+    comando se ejecuta cuando llega la respuesta del coordinador o vence
+    CLAIM_TIMEOUT. Mientras tanto, los demás clientes siguen atendidos.
+    """
+    def join_cluster(self, link, index):
+        self.link = link
+        self.worker_index = index
+        self.parked = {}    # {sesión: ParkedCommand}
+        self.requests = {}  # {id de petición: (sesión, CLAIM o CREATE, nombre)}
+        self._answers = {}  # Respuestas del comando que se está reanudando
+
+    # --- Reservas en el coordinador sin bloquear ---
+
+    def _on_lines(self, session, lines):
+        """Ejecuta las líneas como IRCServer, dejando en espera la conexión si un comando necesita al coordinador."""
+        parked = self.parked.get(session)
+        if parked is not None:
+            parked.lines.extend(bytes(raw) for raw in lines)
+            if len(parked.lines) > PARKED_MAX_LINES:
+                log.warning("Demasiadas líneas en espera de %s, desconectando", session.addr)
+                return False
+            return True
+        # Las líneas son vistas del búfer del framer: se copian solo si hay que esperar
+        lines = iter(lines)
+        for raw in lines:
+            claims = self._claims_for(session, raw)
+            if claims:
+                self._park(session, [bytes(raw)] + [bytes(line) for line in lines], claims)
+                return True
+            if not super()._on_lines(session, (raw,)):
+                return False
+        return True
+
+    def _claims_for(self, session, raw):
+        """
+        Reservas que necesita una línea antes de ejecutarse.
+
+        Returns:
+            list: Pares (CLAIM, nick) o (CREATE, canal); vacía si no hace falta esperar.
+        """
+        if session.link is not None or (raw[:1] != b"@" and bytes(raw[:5]).upper() not in (b"NICK ", b"JOIN ")):
+            return []
+        command, line, _ = parse_line(str(raw, "utf-8", "ignore").strip())
+        parts = line.split() if line else []
+        if len(parts) < 2:
+            return []
+        if command == "NICK":
+            # Si ya está en uso aquí, el 433 no necesita al coordinador
+            return [("CLAIM", parts[1])] if super()._nick_available(parts[1]) else []
+        if command == "JOIN" and session.nickname in self.clients:
+            targets = list(dict.fromkeys(target for target in parts[1].split(",") if target))
+            if len(targets) > TARGMAX["JOIN"]:
+                return []  # El manejador responde 407 sin crear nada
+            return [("CREATE", channel) for channel in targets if channel not in self.channels]
+        return []
+
+    def _park(self, session, lines, claims):
+        parked = self.parked[session] = ParkedCommand(lines)
+        for kind, name in claims:
+            request_id = next(self.link.ids)
+            self.requests[request_id] = (session, kind, name)
+            parked.pending.add(request_id)
+            self.link.send((kind, request_id, name))
+        self.timers.schedule((session, "CLAIM"), CLAIM_TIMEOUT, self._on_claim_timeout, time.monotonic())
+
+    def _on_claim_reply(self, request_id, granted):
+        request = self.requests.pop(request_id, None)
+        if request is None:
+            return
+        session, kind, name = request
+        parked = self.parked.get(session)
+        if parked is None or request_id not in parked.pending:
+            # Respuesta tardía (venció la espera o se cerró la conexión): no retener la reserva
+            if granted is True:
+                self._release(kind, name)
+            return
+        parked.pending.discard(request_id)
+        parked.answers[(kind, name)] = granted
+        if not parked.pending:
+            self._resume(session)
+
+    def _on_claim_timeout(self, key):
+        session = key[0]
+        parked = self.parked.get(session)
+        if parked is not None:
+            # Lo no respondido cuenta como denegado; si la respuesta llega después se libera
+            log.warning("El coordinador no respondió a tiempo a %s", session.addr)
+            parked.pending.clear()
+            self._resume(session)
+
+    def _resume(self, session):
+        """Ejecuta el comando en espera con las respuestas recibidas y luego las líneas que llegaron detrás."""
+        parked = self.parked.pop(session)
+        self.timers.cancel((session, "CLAIM"))
+        self._answers = parked.answers
+        try:
+            keep_open = super()._on_lines(session, parked.lines[:1])
+        finally:
+            self._answers = {}
+            for (kind, name), granted in parked.answers.items():
+                if granted is True:
+                    self._release(kind, name)
+        if keep_open:
+            keep_open = self._on_lines(session, parked.lines[1:])
+        if not keep_open:
+            session.socket.close()  # Su lector ve el cierre y termina la sesión
+
+    def _release(self, kind, name):
+        """Devuelve al coordinador una reserva concedida que no llegó a usarse."""
+        used = name in self.clients if kind == "CLAIM" else name in self.channels
+        if not used:
+            self.link.send(("RELEASE", kind, name))
+
+    def _close_session(self, session):
+        parked = self.parked.pop(session, None)
+        if parked is not None:
+            self.timers.cancel((session, "CLAIM"))
+            for (kind, name), granted in parked.answers.items():
+                if granted is True:
+                    self._release(kind, name)
+        super()._close_session(session)
+
+    # --- Eventos publicados por los cambios locales ---
+
+    def _publish(self, *event):
+        self.link.send(("EVENT", event))
+
+    def _nick_available(self, nick):
+        # La respuesta del coordinador ya llegó: _on_lines dejó el NICK en espera hasta tenerla
+        return super()._nick_available(nick) and self._answers.get(("CLAIM", nick)) is True
+
+    def _add_client(self, nick, sock, hostname, origin=None):
+        super()._add_client(nick, sock, hostname, origin)
+        self._publish("UID", nick, hostname)
+
+    def _complete_registration(self, nick, ssl_socket):
+        super()._complete_registration(nick, ssl_socket)
+        client = self.clients[nick]
+        self._publish("USER", nick, client.username, client.realname)
+
+    def _remove_client(self, nick, origin=None):
+        peers = super()._remove_client(nick, origin)
+        self._publish("QUIT", nick)
+        return peers
+
+    def _remember_whowas(self, nick, origin=None):
+        super()._remember_whowas(nick, origin)
+        self._publish("WHOWAS", nick)
+
+    def _rename_member(self, old_nick, new_nick, origin=None):
+        peers = super()._rename_member(old_nick, new_nick, origin)
+        self._publish("NICK", old_nick, new_nick)
+        return peers
+
+    def _create_channel(self, channel):
+        # Solo el primero en crearlo en todo el clúster queda como operador
+        # (la respuesta a CREATE llegó antes de ejecutar el JOIN, ver _on_lines)
+        founder = self._answers.get(("CREATE", channel)) is True
+        super()._create_channel(channel)
+        return founder
+
+    def _add_member(self, channel, nick, prefix="", origin=None):
+        super()._add_member(channel, nick, prefix, origin)
+        self._publish("JOIN", channel, nick, prefix)
+
+    def _remove_member(self, channel, nick, origin=None, by=None):
+        super()._remove_member(channel, nick, origin, by)
+        self._publish("PART", channel, nick)
+
+    def _set_prefix(self, channel, nick, prefix, origin=None, by=None):
+        super()._set_prefix(channel, nick, prefix, origin, by)
+        self._publish("PREFIX", channel, nick, prefix)
+
+    def _set_topic(self, channel, topic, origin=None, by=None):
+        super()._set_topic(channel, topic, origin, by)
+        self._publish("TOPIC", channel, topic)
+
+    def _set_user_mode(self, nick, mode, enabled, origin=None):
+        super()._set_user_mode(nick, mode, enabled, origin)
+        self._publish("UMODE", nick, mode, enabled)
+
+    def _fan_out(self, nicks, message, skip=None, tags=None):
+        """
+        Entrega local directa; para cada otro worker, un solo envío con la
+        lista de sus destinatarios, el mensaje ya codificado y sus tags.
+        """
+        data = message.encode('utf-8') if isinstance(message, str) else message
+        clients = self.clients
+        local = []
+        remote = {}  # {worker: [nicks]}
+        for nick in nicks:
+            if nick == skip:
+                continue
+            sock = clients[nick].socket
+            if isinstance(sock, RemoteSocket):
+                remote.setdefault(sock.worker, []).append(nick)
+            else:
+                local.append(nick)
+        if remote and tags is None:
+            tags = message_tags()  # Las mismas tags en todos los workers
+        super()._fan_out(local, data, tags=tags)
+        for worker, targets in remote.items():
+            self.link.send(("FANOUT", worker, targets, data, tags))
+        return data
+
+    # --- Mensajes recibidos del coordinador ---
+
+    def run_link(self):
+        """Atiende el canal con el coordinador hasta que se cierre."""
+        while True:
+            try:
+                message = self.link.conn.recv()
+            except (EOFError, OSError):
+                break
+            self._call_in_server(self._on_link_message, message)
+
+    def _on_link_message(self, message):
+        kind = message[0]
+        try:
+            if kind == "EVENT":
+                _, worker, event = message
+                handler = self._replica_handlers.get(event[0])
+                if handler is not None:
+                    handler(self, worker, *event[1:])
+            elif kind == "REPLY":
+                _, request_id, granted = message
+                self._on_claim_reply(request_id, granted)
+            elif kind == "DELIVER":
+                _, nick, data = message
+                client = self.clients.get(nick)
+                if client is not None and not isinstance(client.socket, RemoteSocket):
+                    client.socket.sendall(data)
+            elif kind == "FANOUT":
+                _, nicks, data, tags = message
+                clients = self.clients
+                local = [
+                    nick for nick in nicks
+                    if nick in clients and not isinstance(clients[nick].socket, RemoteSocket)
+                ]
+                if local:
+                    self._record_remote(data, tags)
+                super()._fan_out(local, data, tags=tags)
+        except Exception as e:
+            log.error("Error aplicando %s del clúster: %s", kind, e)
+
+    # Cada evento se aplica con la implementación base (sin volver a publicarlo)
+
+    def _replica_uid(self, worker, nick, hostname):
+        super()._add_client(nick, RemoteSocket(self.link, worker, nick), hostname)
+
+    def _replica_user(self, worker, nick, username, realname):
+        if nick in self.clients:
+            self._set_user_info(nick, username, realname)
+
+    def _replica_quit(self, worker, nick):
+        if nick in self.clients:
+            super()._remove_client(nick)
+
+    def _replica_whowas(self, worker, nick):
+        if nick in self.clients:
+            super()._remember_whowas(nick)
+
+    def _replica_nick(self, worker, old_nick, new_nick):
+        if old_nick in self.clients:
+            self.clients[old_nick].socket.nick = new_nick
+            super()._rename_member(old_nick, new_nick)
+
+    def _replica_join(self, worker, channel, nick, prefix):
+        if nick not in self.clients:
+            return
+        if channel not in self.channels:
+            super()._create_channel(channel)
+        super()._add_member(channel, nick, prefix)
+
+    def _replica_part(self, worker, channel, nick):
+        if channel in self.channels and nick in self.channels[channel].users:
+            super()._remove_member(channel, nick)
+
+    def _replica_prefix(self, worker, channel, nick, prefix):
+        if channel in self.channels and nick in self.channels[channel].users:
+            super()._set_prefix(channel, nick, prefix)
+
+    def _replica_topic(self, worker, channel, topic):
+        if channel in self.channels:
+            super()._set_topic(channel, topic)
+
+    def _replica_umode(self, worker, nick, mode, enabled):
+        if nick in self.clients:
+            super()._set_user_mode(nick, mode, enabled)
+
+    _replica_handlers = {
+        "UID": _replica_uid,
+        "USER": _replica_user,
+        "QUIT": _replica_quit,
+        "WHOWAS": _replica_whowas,
+        "NICK": _replica_nick,
+        "JOIN": _replica_join,
+        "PART": _replica_part,
+        "PREFIX": _replica_prefix,
+        "TOPIC": _replica_topic,
+        "UMODE": _replica_umode,
+    }
+
+
+class ClusterHub:
+    """
+    Coordinador del clúster (corre en el proceso principal).
+
+    Reparte los eventos de estado de cada worker a los demás en el orden en
+    que llegan y enruta los mensajes hacia el worker dueño de cada usuario.
+    También arbitra lo que dos workers podrían hacer a la vez: que no haya
+    dos nicks iguales y que solo quien crea un canal quede como operador.
+    Para esto último lleva la membresía de cada canal.
+    """
+    def __init__(self, conns):
+        self.conns = conns
+        self.owners = {}    # {nick: índice del worker donde está conectado}
+        self.channels = {}  # {canal: set(nicks)}
+        self.joined = {}    # {nick: set(canales)}
+        self.ready = set()
+        self.all_ready = Event()
+        self.running = True
+
+    def run(self):
+        index_of = {conn: index for index, conn in enumerate(self.conns)}
+        alive = list(self.conns)
+        while self.running and alive:
+            for conn in wait(alive, timeout=1):
+                worker = index_of[conn]
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    alive.remove(conn)
+                    self._drop_worker(worker)
+                    continue
+                self._on_message(worker, message)
+
+    def _on_message(self, worker, message):
+        kind = message[0]
+        if kind == "EVENT":
+            event = message[1]
+            self._track(worker, event)
+            self._relay(worker, ("EVENT", worker, event))
+        elif kind == "DELIVER":
+            _, target, nick, data = message
+            self._send(target, ("DELIVER", nick, data))
+        elif kind == "FANOUT":
+            _, target, nicks, data, tags = message
+            self._send(target, ("FANOUT", nicks, data, tags))
+        elif kind == "CLAIM":
+            _, request_id, nick = message
+            granted = self.owners.setdefault(nick, worker) == worker
+            self._send(worker, ("REPLY", request_id, granted))
+        elif kind == "CREATE":
+            _, request_id, channel = message
+            granted = channel not in self.channels
+            if granted:
+                self.channels[channel] = set()  # El JOIN del creador llega a continuación
+            self._send(worker, ("REPLY", request_id, granted))
+        elif kind == "RELEASE":
+            # Reserva concedida que el worker no usó (respuesta tardía o comando fallido)
+            _, what, name = message
+            if what == "CLAIM" and self.owners.get(name) == worker:
+                del self.owners[name]
+            elif what == "CREATE" and self.channels.get(name) == set():
+                del self.channels[name]
+        elif kind == "READY":
+            self.ready.add(worker)
+            if len(self.ready) == len(self.conns):
+                self.all_ready.set()
+
+    def _track(self, worker, event):
+        """Actualiza dueños de nicks y membresía según un evento de estado."""
+        kind = event[0]
+        if kind == "JOIN":
+            _, channel, nick, _ = event
+            self.channels.setdefault(channel, set()).add(nick)
+            self.joined.setdefault(nick, set()).add(channel)
+        elif kind == "PART":
+            self._leave(event[1], event[2])
+        elif kind == "NICK":
+            _, old_nick, new_nick = event
+            self.owners.pop(old_nick, None)
+            channels = self.joined.pop(old_nick, set())
+            for channel in channels:
+                members = self.channels[channel]
+                members.discard(old_nick)
+                members.add(new_nick)
+            if channels:
+                self.joined[new_nick] = channels
+        elif kind == "QUIT":
+            _, nick = event
+            if self.owners.get(nick) == worker:
+                del self.owners[nick]
+            for channel in list(self.joined.get(nick, ())):
+                self._leave(channel, nick)
+
+    def _leave(self, channel, nick):
+        members = self.channels.get(channel)
+        if members is not None:
+            members.discard(nick)
+            if not members:
+                del self.channels[channel]
+        channels = self.joined.get(nick)
+        if channels is not None:
+            channels.discard(channel)
+            if not channels:
+                del self.joined[nick]
+
+    def _relay(self, origin, message):
+        for index in range(len(self.conns)):
+            if index != origin:
+                self._send(index, message)
+
+    def _send(self, index, message):
+        try:
+            self.conns[index].send(message)
+        except OSError:
+            pass  # Worker caído: _drop_worker limpia sus usuarios
+
+    def _drop_worker(self, worker):
+        """Da de baja en los demás workers a los usuarios de un worker caído."""
+        if self.running:
+            log.error("El worker %s terminó; se liberan sus usuarios", worker)
+        for nick in [nick for nick, owner in self.owners.items() if owner == worker]:
+            self._track(worker, ("QUIT", nick))
+            self._relay(worker, ("EVENT", worker, ("QUIT", nick)))
+
+
+class ServerCluster:
+    """
+    Varios procesos worker escuchando en el mismo puerto con SO_REUSEPORT (el
+    kernel reparte las conexiones entre ellos) y un coordinador que mantiene
+    el estado compartido, de modo que para los clientes es un solo servidor.
+    """
+    def __init__(self, server_class, workers, host, port, log_level=logging.INFO, metrics_port=None):
+        self.server_class = server_class
+        self.workers = workers
+        self.host = host
+        self.port = port
+        self.log_level = log_level
+        self.metrics_port = metrics_port
+        self.processes = []
+        self.hub = None
+
+    def start(self):
+        context = multiprocessing.get_context()
+        conns = []
+        for index in range(self.workers):
+            hub_end, worker_end = context.Pipe()
+            metrics_port = None if self.metrics_port is None else self.metrics_port + index
+            process = context.Process(
+                target=_worker_main,
+                args=(self.server_class, self.host, self.port, index, worker_end, self.log_level, metrics_port),
+                daemon=True,
+            )
+            process.start()
+            worker_end.close()
+            conns.append(hub_end)
+            self.processes.append(process)
+
+        self.hub = ClusterHub(conns)
+        Thread(target=self.hub.run, daemon=True).start()
+        if not self.hub.all_ready.wait(READY_TIMEOUT):
+            raise RuntimeError("Los workers del clúster no arrancaron a tiempo")
+        log.info("Clúster de %s workers escuchando en %s:%s", self.workers, self.host, self.port)
+
+    def stop(self):
+        if self.hub:
+            self.hub.running = False
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join()
+        log.info("Clúster detenido correctamente.")
+
+
+def cluster_server_class(server_class):
+    """Clase de worker para el motor dado (IRCServer o AsyncIRCServer)."""
+    return type(f"Cluster{server_class.__name__}", (ClusterMixin, server_class), {})
+
+
+def _worker_main(server_class, host, port, index, conn, log_level, metrics_port):
+    logs = configure_logging(log_level)
+    server = cluster_server_class(server_class)(host, port)
+    server.reuse_port = True
+    server.metrics_port = metrics_port
+    server.join_cluster(ClusterLink(conn), index)
+    try:
+        server.start()
+        server.link.send(("READY", index))
+        server.run_link()  # Hasta que el coordinador cierre el canal
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        logs.stop()
@@ -0,0 +1,46 @@
+# Server.commands.py
+
+
+class Command:
+    """
+    Entrada del registro de comandos: el manejador y sus requisitos.
+    """
+    __slots__ = ("name", "handler", "min_params", "needs_registration")
+
+    def __init__(self, name, handler, min_params=0, needs_registration=True):
+        self.name = name
+        self.handler = handler                        # handler(server, session, line)
+        self.min_params = min_params                  # Parámetros mínimos (461 si faltan)
+        self.needs_registration = needs_registration  # Requiere NICK registrado (451 si no)
+
+
+class CommandRegistry:
+    """
+    Tabla verbo -> Command consultada con una sola búsqueda en diccionario.
+
+    Los comandos se agregan con el decorador `register`, sin tocar el bucle
+    de despacho:
+
+        @commands.register("JOIN", min_params=1)
+        def _cmd_join(self, session, data):
+            ...
+    """
+    def __init__(self, commands=None):
+        self.commands = dict(commands or {})
+
+    def register(self, name, min_params=0, needs_registration=True):
+        """Decorador que registra un manejador para el verbo `name`."""
+        def decorator(handler):
+            self.commands[name.upper()] = Command(name.upper(), handler, min_params, needs_registration)
+            return handler
+        return decorator
+
+    def get(self, verb):
+        return self.commands.get(verb)
+
+    def copy(self):
+        """Copia del registro, para que una subclase agregue comandos sin alterar la base."""
+        return CommandRegistry(self.commands)
+
+    def __contains__(self, verb):
+        return verb in self.commands
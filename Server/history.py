@@ -0,0 +1,192 @@
+# Server.history.py
+
+from collections import OrderedDict, deque
+
+from Server.capabilities import CAP_MESSAGE_TAGS, CAP_SERVER_TIME, parse_server_time
+
+HISTORY_LINES = 200               # Mensajes máximos por canal o conversación privada
+HISTORY_BYTES = 64 * 1024         # Bytes máximos por canal o conversación privada
+HISTORY_TOTAL_BYTES = 16 << 20    # Bytes máximos entre todos los búferes
+CHATHISTORY_MAX = 100             # Mensajes máximos por respuesta de CHATHISTORY
+
+
+class HistoryEntry:
+    """Mensaje guardado: línea y tags ya codificadas, listas para reenviar."""
+    __slots__ = ("at", "msgid", "time_tag", "msgid_tag", "line")
+
+    def __init__(self, msgid, time_text, line):
+        self.at = parse_server_time(time_text)        # Milisegundos, con la precisión de la tag
+        self.msgid = msgid
+        self.time_tag = f"time={time_text}".encode("ascii")
+        self.msgid_tag = f"msgid={msgid}".encode("ascii")
+        self.line = line                              # b":nick!user@host PRIVMSG #c :texto"
+
+    @property
+    def size(self):
+        return len(self.line) + len(self.time_tag) + len(self.msgid_tag)
+
+
+class HistoryBuffer:
+    """
+    Anillo de los últimos mensajes de un canal o de una conversación privada.
+
+    Se acota por cantidad de mensajes y por bytes; al superar cualquiera de
+    los dos límites se descartan los más antiguos.
+    """
+    __slots__ = ("entries", "size", "max_lines", "max_bytes")
+
+    def __init__(self, max_lines=HISTORY_LINES, max_bytes=HISTORY_BYTES):
+        self.entries = deque()
+        self.size = 0
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+
+    def append(self, entry):
+        """
+        Agrega entry y descarta lo más antiguo que exceda los límites.
+
+        Returns:
+            int: Variación de bytes del búfer (para el total de ChatHistory).
+        """
+        before = self.size
+        self.entries.append(entry)
+        self.size += entry.size
+        while len(self.entries) > self.max_lines or (self.size > self.max_bytes and len(self.entries) > 1):
+            self.size -= self.entries.popleft().size
+        return self.size - before
+
+    def _index(self, reference, after):
+        """
+        Posición de corte para una referencia de CHATHISTORY.
+
+        Args:
+            reference (tuple): ("msgid", id) o ("timestamp", milisegundos).
+            after (bool): True para AFTER (el corte deja a la izquierda lo
+                anterior o igual a la referencia).
+
+        Returns:
+            int: Índice en entries, o None si el msgid no está en el búfer.
+        """
+        kind, value = reference
+        entries = self.entries
+        if kind == "msgid":
+            for index in range(len(entries) - 1, -1, -1):
+                if entries[index].msgid == value:
+                    return index + 1 if after else index
+            return None
+        index = 0
+        for entry in entries:
+            if entry.at > value or (not after and entry.at == value):
+                break
+            index += 1
+        return index
+
+    def select(self, selector, reference, limit):
+        """
+        Mensajes para CHATHISTORY, del más antiguo al más reciente.
+
+        Args:
+            selector (str): "LATEST", "BEFORE" o "AFTER".
+            reference (tuple): ("msgid", id), ("timestamp", milisegundos) o None
+                (solo con LATEST: sin límite inferior).
+            limit (int): Cantidad máxima de mensajes.
+
+        Returns:
+            list: HistoryEntry seleccionadas; None si la referencia no existe.
+        """
+        entries = list(self.entries)
+        if selector == "LATEST":
+            if reference is not None:
+                start = self._index(reference, after=True)
+                if start is None:
+                    return None
+                entries = entries[start:]
+            return entries[-limit:]
+        index = self._index(reference, after=selector == "AFTER")
+        if index is None:
+            return None
+        if selector == "BEFORE":
+            return entries[max(0, index - limit):index]
+        return entries[index:index + limit]
+
+
+class ChatHistory:
+    """
+    Historial reciente de mensajes por canal y por par de usuarios.
+
+    Además del límite de cada búfer hay un total para todo el servidor: al
+    superarlo se descartan los búferes usados hace más tiempo.
+
+    Las conversaciones privadas se identifican por el par de nicks exactos
+    (el servidor distingue mayúsculas en los nicks: "Ana" y "ana" son dos
+    usuarios), así que se olvidan cuando uno de los dos deja el nick
+    (drop_nick): quien lo tome después no debe poder leerlas.
+    """
+    def __init__(self, max_total_bytes=HISTORY_TOTAL_BYTES):
+        self.buffers = OrderedDict()  # {canal o (nick, nick): HistoryBuffer}, el último es el más reciente
+        self.by_nick = {}             # {nick: {claves (nick, nick)}} de las conversaciones privadas
+        self.size = 0
+        self.max_total_bytes = max_total_bytes
+
+    @staticmethod
+    def key(target, nick):
+        """Clave del búfer: el canal, o el par de nicks (ordenado, tal como se registraron)."""
+        if target.startswith("#"):
+            return target
+        return tuple(sorted((target, nick)))
+
+    def record(self, key, entry):
+        buffer = self.buffers.get(key)
+        if buffer is None:
+            buffer = self.buffers[key] = HistoryBuffer()
+            if isinstance(key, tuple):
+                for nick in key:
+                    self.by_nick.setdefault(nick, set()).add(key)
+        else:
+            self.buffers.move_to_end(key)
+        self.size += buffer.append(entry)
+        while self.size > self.max_total_bytes and len(self.buffers) > 1:
+            self.drop(next(iter(self.buffers)))
+
+    def get(self, key):
+        return self.buffers.get(key)
+
+    def drop(self, key):
+        """Olvida el historial de key (p. ej. un canal que se quedó vacío)."""
+        buffer = self.buffers.pop(key, None)
+        if buffer is not None:
+            self.size -= buffer.size
+            if isinstance(key, tuple):
+                for nick in key:
+                    keys = self.by_nick.get(nick)
+                    if keys is not None:
+                        keys.discard(key)
+                        if not keys:
+                            del self.by_nick[nick]
+
+    def drop_nick(self, nick):
+        """Olvida las conversaciones privadas de nick (QUIT, desconexión o cambio de nick)."""
+        for key in list(self.by_nick.get(nick, ())):
+            self.drop(key)
+
+
+def replay(entries, caps, batch_ref=None):
+    """
+    Codifica entries para un cliente con caps en un único bloque de bytes.
+
+    Cada línea lleva las tags que el cliente negoció (time, msgid) y, si
+    va dentro de un BATCH, la tag batch con batch_ref.
+    """
+    prefix = [b"batch=" + batch_ref.encode("ascii")] if batch_ref else []
+    out = []
+    for entry in entries:
+        tags = list(prefix)
+        if caps & CAP_SERVER_TIME:
+            tags.append(entry.time_tag)
+        if caps & CAP_MESSAGE_TAGS:
+            tags.append(entry.msgid_tag)
+        if tags:
+            out.append(b"@" + b";".join(tags) + b" ")
+        out.append(entry.line)
+        out.append(b"\r\n")
+    return b"".join(out)
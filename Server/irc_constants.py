@@ -7,3 +7,9 @@ RESPONSES = {
     "ERR_NO_SUCH_NICK": ":mock.server 401 {target} :El usuario no está conectado\r\n",
     "ERR_NOT_IN_CHANNEL": ":mock.server 442 {nickname} {channel} :No estás en el canal\r\n",
 }
+
+# Destinos máximos por comando (listas separadas por comas); se anuncian en el 005
+TARGMAX = {"JOIN": 100, "PART": 100, "PRIVMSG": 30, "NOTICE": 30}
+
+# Bytes máximos por envío en respuestas largas (LIST, WHO, NAMES con miles de filas)
+REPLY_BATCH_BYTES = 16 * 1024
@@ -1,27 +1,102 @@
 # Server.irc_server.py
 
+import logging
+import random
 import socket
+import hmac
 import ssl
-from threading import Thread
+import sys
+import textwrap
+from queue import SimpleQueue
+from threading import Thread, get_ident
 import time
 import uuid
+from itertools import islice
+
+from Server.sendq import QueuedSocket
+from Server.pipeline import parse_line
+from Common.framing import ByteFramer, TAGGED_MAX_LINE
+from Common.irc_protocol import parse_bytes, parse_tags
+from Common.custom_errors import ProtocolError
+from Server.commands import CommandRegistry
+from Server.timer_wheel import TimerWheel
+from Server.records import Client, Channel, USER_MODES, UMODE_OPERATOR
+from Server.snapshots import Snapshot
+from Server.capabilities import (TAG_CAPS, CAPABILITIES, CAP_ECHO_MESSAGE, CAP_LABELED_RESPONSE, CAP_MESSAGE_TAGS,
+                                 CAP_MULTI_PREFIX, CAP_BATCH, cap_names, parse_cap_request, message_tags,
+                                 parse_server_time, labeled, tag_lines, new_batch_ref, batch_start,
+                                 batch_end)
+from Server.history import ChatHistory, HistoryEntry, CHATHISTORY_MAX, replay
+from Server.irc_constants import TARGMAX, REPLY_BATCH_BYTES
+from Server.whowas import WhowasEntry, WhowasStore, WHOWAS_SWEEP
+from Server.server_log import log
+from Server.metrics import ServerMetrics, start_metrics_endpoint
+from Server.links import ServerNetwork
+from Server.listeners import open_listener, close_listener, describe, is_unix, peer_address
+
+
+class ClientSession:
+    """
+    Estado de una conexión de cliente, independiente del motor de E/S.
+    """
+    def __init__(self, socket, addr):
+        self.socket = socket  # Socket con cola de salida (interfaz sendall/shutdown/close)
+        self.addr = addr
+        self.nickname = None
+        self.framer = ByteFramer()  # Búfer de lectura acotado (línea de 512 + una lectura)
+        self.last_activity = time.monotonic()  # Último dato recibido
+        self.ping_sent = None                  # Momento del PING pendiente de respuesta
+        self.bytes_in = 0                      # Bytes recibidos (solo los escribe su lector)
+        self.link = None                       # ServerLink si la conexión es de otro servidor
+        self.password = None                   # Recibida con PASS (contraseña de enlace de un servidor)
+        self.caps = 0                          # Capacidades de IRCv3 negociadas con CAP REQ
+        self.cap_negotiating = False           # CAP antes del registro: bienvenida hasta CAP END
 
 
 class IRCServer:
     """
     Servidor IRC simulado basado en el RFC 2812 para probar cliente.
     """
+    commands = CommandRegistry()  # Verbo -> manejador; ver los métodos _cmd_*
+
     def __init__(self, host, port):
         self.host = host
         self.port = port
         self.server_socket = None
         self.running = False
-        self.clients = {}  # Almacena clientes como {nickname: socket}
-        self.channels = {}  # {channel_name: {"users": [nicknames], "operators": [nicknames]}}
-        self.whowas = {}    # {nickname: {...}} para almacenar usuarios desconectados
-        self.ping_interval = 30  # Segundos entre PINGs
+        self.clients = {}  # {nickname: Client}
+        self.channels = {}  # {channel_name: Channel}
+        self.whowas = WhowasStore()  # Nicks abandonados (QUIT o cambio de nick), acotado en cantidad y tiempo
+        self.history = ChatHistory()  # PRIVMSG/NOTICE recientes por canal y conversación, para CHATHISTORY
+        # Vistas inmutables para LIST, WHO y NAMES; se reconstruyen solo si
+        # state_version cambió (lo suben los helpers que modifican el estado)
+        self.state_version = 0
+        self._list_rows = Snapshot(self._build_list_rows)
+        self._who_rows = Snapshot(self._build_who_rows)
+        self._visible_nicks = Snapshot(self._build_visible_nicks)
+        self.ping_interval = 30  # Segundos de inactividad antes de enviar PING
+        self.ping_jitter = 10    # Hasta estos segundos extra, para no enviar todos los PING a la vez
         self.ping_timeout = 280  # Tiempo máximo sin PONG antes de desconectar
+        self.timers = TimerWheel(tick=1.0, now=time.monotonic())  # PING y timeouts por conexión
+        self.timers.schedule("WHOWAS", WHOWAS_SWEEP, self._on_whowas_timer, time.monotonic())
         self.pending_users = {}
+        self.backlog = socket.SOMAXCONN  # Conexiones pendientes de aceptar en host:port
+        self.listeners = []  # Extremos adicionales: [{"address": (host, port) o ruta Unix, "backlog": n}]
+        self._listen_sockets = []  # [(socket, dirección)] abiertos por start()
+        self.reuse_port = False  # SO_REUSEPORT: varios procesos escuchando en el mismo puerto
+        self.max_sendq = 512 * 1024  # Bytes máximos en la cola de salida de cada cliente
+        self.messages_processed = 0  # Comandos procesados (para medir mensajes/segundo)
+        self.trace_commands = log.isEnabledFor(logging.DEBUG)  # Registrar cada línea recibida
+        self.sessions = set()    # Conexiones abiertas, registradas o no
+        self.metrics = ServerMetrics()
+        self.metrics_port = None  # Puerto local de /metrics (Prometheus); None lo desactiva
+        self._metrics_httpd = None
+        self.network = ServerNetwork(self)  # Enlaces con otros servidores (CONNECT/LINKS/SQUIT)
+        self.operators = {}  # {nombre: contraseña} para OPER; solo los operadores usan CONNECT y SQUIT
+        # Un único hilo (el actor) modifica clients, channels, whowas, sessions...;
+        # los demás le encolan (función, args, respuesta) y no tocan el estado
+        self._actions = SimpleQueue()
+        self._actor_ident = None
 
 #/connect -ssl 127.0.0.1 6667
 
@@ -29,75 +104,404 @@ class IRCServer:
         """
         Inicia el servidor en un hilo separado.
         """
+        self._open_listeners()
         self.running = True
-        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server_socket.bind((self.host, self.port))
-        self.server_socket.listen(5)
-        print(f"[SERVER] Servidor simulado escuchando en {self.host}:{self.port}")
-
-        Thread(target=self._accept_clients, daemon=True).start()
-        Thread(target=self._send_pings, daemon=True).start()
-        Thread(target=self._check_inactive_clients, daemon=True).start()
-        
-    def _send_pings(self):
-        """Envía PINGs periódicos a los clientes."""
-        while self.running:
-            time.sleep(self.ping_interval)
-            current_time = time.time()
-            for nick, data in list(self.clients.items()):
-                try:
-                    # Usar el nombre del servidor como token
-                    token = "mock.server"  # Usar un token fijo para simplificar (en lugar de UUID)
-                    data["socket"].sendall(f"PING :{token}\r\n".encode("utf-8"))
-                    data["ping_token"] = token
-                    data["last_ping_sent"] = current_time
-                except Exception as e:
-                    print(f"[ERROR] Error enviando PING a {nick}: {e}")
-                        
-    def _check_inactive_clients(self):
-        """Desconecta clientes inactivos."""
+        self.server_socket = self._listen_sockets[0][0]
+        Thread(target=self._run_actor, daemon=True).start()
+        for listener, address in self._listen_sockets:
+            log.info("Servidor simulado escuchando en %s", describe(address))
+            Thread(target=self._accept_clients, args=(listener, address), daemon=True).start()
+        Thread(target=self._run_timers, daemon=True).start()
+        self._start_metrics()
+
+    def add_listener(self, address, backlog=None):
+        """
+        Agrega un extremo de escucha además de host:port. Se abre en start().
+
+        Args:
+            address: (host, puerto) para TCP o la ruta de un socket Unix, para
+                bots y bouncers en la misma máquina sin pasar por TCP.
+            backlog: Conexiones pendientes de aceptar; por defecto `self.backlog`.
+        """
+        self.listeners.append({"address": address, "backlog": backlog})
+
+    def _open_listeners(self):
+        """Abre host:port y los extremos adicionales, cada uno con su backlog."""
+        endpoints = [{"address": (self.host, self.port), "backlog": None}] + self.listeners
+        try:
+            for endpoint in endpoints:
+                address = endpoint["address"]
+                backlog = endpoint["backlog"] or self.backlog
+                listener = open_listener(address, backlog, self.reuse_port)
+                if not is_unix(address):
+                    address = listener.getsockname()  # Puerto real si se pidió el 0
+                self._listen_sockets.append((listener, address))
+        except OSError:
+            self._close_listeners()
+            raise
+        self.port = self._listen_sockets[0][1][1]
+
+    def _close_listeners(self):
+        for listener, address in self._listen_sockets:
+            close_listener(listener, address)
+        self._listen_sockets = []
+
+    def _start_metrics(self):
+        """Abre el endpoint local de métricas si se configuró un puerto."""
+        if self.metrics_port is None:
+            return
+        self._metrics_httpd = start_metrics_endpoint(self, self.metrics_port)
+        self.metrics_port = self._metrics_httpd.server_address[1]
+        log.info("Métricas disponibles en http://127.0.0.1:%s/metrics", self.metrics_port)
+
+    def _stop_metrics(self):
+        if self._metrics_httpd is not None:
+            self._metrics_httpd.shutdown()
+            self._metrics_httpd.server_close()
+            self._metrics_httpd = None
+
+    def _run_timers(self):
+        """Avanza la rueda de temporizadores una vez por tick."""
         while self.running:
-            time.sleep(100)
-            current_time = time.time()
-            to_remove = []
-            for nick, data in list(self.clients.items()):
-                last_pong = data.get("last_pong", 0)
-                last_ping = data.get("last_ping_sent", 0)
-                # Verificar si no ha respondido al PING o no se ha enviado PING
-                if (current_time - last_pong > self.ping_timeout) or (
-                    current_time - last_ping > self.ping_timeout
-                ):
-                    print(f"[SERVER] Desconectando a {nick} por inactividad")
-                    to_remove.append(nick)
-            for nick in to_remove:
-                self._disconnect_client(nick, "Ping timeout")
-                
+            time.sleep(self.timers.tick)
+            self._call_in_server(self._on_timer_tick)
+
+    def _on_timer_tick(self):
+        """Ejecuta solo los temporizadores vencidos en este tick."""
+        for callback, key in self.timers.advance(time.monotonic()):
+            try:
+                callback(key)
+            except Exception as e:
+                log.error("Error en temporizador de %s: %s", key, e)
+
+    def _run_actor(self):
+        """
+        Hilo dueño del estado: ejecuta en orden, de a una, las acciones
+        encoladas por los hilos de clientes, temporizadores y enlaces.
+
+        Al no haber dos escritores no hace falta ningún candado, y cada
+        manejador (LIST, WHO, NAMES...) ve el estado completo y coherente.
+        """
+        self._actor_ident = get_ident()
+        while True:
+            function, args, reply = self._actions.get()
+            try:
+                result = function(*args)
+            except Exception as e:
+                if reply is None:
+                    log.error("Error en %s: %s", getattr(function, "__name__", function), e)
+                else:
+                    reply.put((False, e))
+                continue
+            if reply is not None:
+                reply.put((True, result))
+
+    def _call_in_server(self, function, *args):
+        """Encola function para el hilo dueño del estado, sin esperar."""
+        self._actions.put((function, args, None))
+
+    def _ask_server(self, function, *args):
+        """
+        Ejecuta function en el hilo dueño del estado y espera su resultado.
+
+        Las excepciones se relanzan en el hilo que preguntó.
+        """
+        if get_ident() == self._actor_ident:
+            return function(*args)
+        reply = SimpleQueue()
+        self._actions.put((function, args, reply))
+        ok, result = reply.get()
+        if not ok:
+            raise result
+        return result
+
+    def _new_session(self, sock, addr):
+        """Crea la sesión de una conexión aceptada y programa su primer PING."""
+        session = ClientSession(sock, addr)
+        self.sessions.add(session)
+        self._schedule_ping(session, self.ping_interval)
+        return session
+
+    def _schedule_ping(self, session, delay):
+        jitter = random.uniform(0, self.ping_jitter)
+        self.timers.schedule(session, delay + jitter, self._on_ping_timer, time.monotonic())
+
+    def _on_ping_timer(self, session):
+        """
+        Vence el temporizador de una conexión: envía PING si estuvo inactiva
+        o la desconecta si no respondió al PING anterior.
+        """
+        now = time.monotonic()
+        idle = now - session.last_activity
+
+        if session.ping_sent is not None and session.last_activity <= session.ping_sent:
+            log.info("Desconectando a %s por inactividad", session.nickname or session.addr)
+            if session.nickname in self.clients:
+                self._disconnect_client(session.nickname, "Ping timeout")
+            else:
+                session.socket.close()
+            return
+
+        if idle < self.ping_interval:
+            # Hubo tráfico reciente: no hace falta PING
+            session.ping_sent = None
+            self._schedule_ping(session, self.ping_interval - idle)
+            return
+
+        # Usar el nombre del servidor como token
+        token = "mock.server"  # Usar un token fijo para simplificar (en lugar de UUID)
+        session.socket.sendall(f"PING :{token}\r\n".encode("utf-8"))
+        session.ping_sent = now
+        if session.nickname in self.clients:
+            client = self.clients[session.nickname]
+            client.ping_token = token
+            client.last_ping_sent = time.time()
+        self.timers.schedule(session, self.ping_timeout, self._on_ping_timer, now)
+
     def _disconnect_client(self, nick, reason):
         """Limpia los datos del cliente desconectado."""
         if nick in self.clients:
             try:
-                self.clients[nick]["socket"].close()
+                self.clients[nick].socket.close()
             except:
                 pass
-            del self.clients[nick]
-            # Limpiar canales y WHOWAS
-            for channel in list(self.channels.keys()):
-                if nick in self.channels[channel]["users"]:
-                    self.channels[channel]["users"].remove(nick)
-                    if nick in self.channels[channel]["operators"]:
-                        self.channels[channel]["operators"].remove(nick)
-                    if not self.channels[channel]["users"]:
-                        del self.channels[channel]
-            print(f"[SERVER] {nick} desconectado: {reason}")
+            # Limpiar solo los canales en los que estaba
+            self._remove_client(nick)
+            log.info("%s desconectado: %s", nick, reason)
+
+    def _nick_available(self, nick):
+        """Indica si nick puede tomarse (no lo usa ningún cliente)."""
+        return nick not in self.clients
+
+    # Los helpers que cambian el estado avisan a los servidores enlazados;
+    # `origin` es el enlace por el que llegó el cambio (None si es local).
+
+    def _add_client(self, nick, sock, hostname, origin=None):
+        """Crea el registro de un cliente que acaba de elegir nick."""
+        nick = sys.intern(nick)  # Una sola copia del nick para clients y los canales
+        self.clients[nick] = Client(sock, hostname)
+        self.state_version += 1
+        self.network.propagate(("UID", nick, hostname), origin)
+
+    def _remove_client(self, nick, origin=None):
+        """
+        Saca a nick de sus canales y elimina su registro.
+
+        Returns:
+            dict: Usuarios que compartían algún canal con nick (sin repetir).
+        """
+        peers = self._leave_all_channels(nick)
+        del self.clients[nick]
+        self.history.drop_nick(nick)
+        self.state_version += 1
+        self.network.propagate(("QUIT", nick), origin)
+        return peers
+
+    def _remember_whowas(self, nick, origin=None):
+        """Guarda los datos actuales de nick en WHOWAS."""
+        client = self.clients[nick]
+        self.whowas.add(WhowasEntry(nick, client.username, client.hostname, client.realname, time.time()))
+        self.network.propagate(("WHOWAS", nick), origin)
+
+    def _on_whowas_timer(self, key):
+        """Barrido periódico: descarta las entradas de WHOWAS que superaron el TTL."""
+        self.whowas.expire(time.time())
+        self.timers.schedule(key, WHOWAS_SWEEP, self._on_whowas_timer, time.monotonic())
+
+    def _set_prefix(self, channel, nick, prefix, origin=None, by=None):
+        """Cambia el prefijo de modo de nick en el canal ("@" o ""); by es quien lo cambió."""
+        self.channels[channel].users[nick] = prefix
+        self.state_version += 1
+        self.network.propagate(("PREFIX", channel, nick, prefix, by), origin)
+
+    def _set_topic(self, channel, topic, origin=None, by=None):
+        self.channels[channel].topic = topic
+        self.state_version += 1
+        self.network.propagate(("TOPIC", channel, topic, by), origin)
+
+    def _set_user_mode(self, nick, mode, enabled, origin=None):
+        """Activa o desactiva un modo de usuario (p. ej. "+i")."""
+        client = self.clients[nick]
+        if enabled:
+            client.modes |= USER_MODES[mode]
+        else:
+            client.modes &= ~USER_MODES[mode]
+        self.state_version += 1
+        self.network.propagate(("UMODE", nick, mode, enabled), origin)
+
+    def _set_user_info(self, nick, username, realname):
+        """Guarda los datos de USER de nick (sin propagarlos)."""
+        client = self.clients[nick]
+        client.username = username
+        client.realname = realname
+        self.state_version += 1
+
+    def _create_channel(self, channel):
+        """
+        Crea un canal vacío con los modos por defecto (+nt).
+
+        Returns:
+            bool: True si quien lo crea debe quedar como operador.
+        """
+        self.channels[sys.intern(channel)] = Channel()
+        self.state_version += 1
+        return True
+
+    def _add_member(self, channel, nick, prefix="", origin=None):
+        """Agrega a nick al canal con su prefijo de modo ("@" para operadores)."""
+        channel, nick = sys.intern(channel), sys.intern(nick)
+        self.channels[channel].users[nick] = prefix
+        self.clients[nick].channels.add(channel)
+        self.state_version += 1
+        self.network.propagate(("JOIN", channel, nick, prefix), origin)
+
+    def _remove_member(self, channel, nick, origin=None, by=None):
+        """Saca a nick del canal (by lo expulsó, si fue un KICK) y elimina el canal si queda vacío."""
+        users = self.channels[channel].users
+        del users[nick]
+        if nick in self.clients:
+            self.clients[nick].channels.discard(channel)
+        if not users:
+            del self.channels[channel]
+            self.history.drop(channel)
+            log.debug("Canal %s eliminado porque está vacío.", channel)
+        self.state_version += 1
+        self.network.propagate(("PART", channel, nick, by), origin)
+
+    def _broadcast(self, channel, message, skip=None, tags=None):
+        """Envía message a todos los miembros del canal (excepto skip)."""
+        return self._fan_out(self.channels[channel].users, message, skip, tags)
+
+    def _targets(self, session, command, text):
+        """
+        Separa una lista de destinos "a,b,c" (sin repetidos, en orden).
 
-    def _accept_clients(self):
+        Returns:
+            list: Destinos, o None si superan TARGMAX (ya se respondió 407).
+        """
+        targets = list(dict.fromkeys(target for target in text.split(",") if target))
+        if len(targets) > TARGMAX[command]:
+            session.socket.sendall(
+                f":mock.server 407 {session.nickname} {targets[TARGMAX[command]]} :Demasiados destinos (máximo {TARGMAX[command]})\r\n".encode('utf-8'))
+            return None
+        return targets
+
+    def _record_history(self, target, sender, data, tags):
+        """Guarda una línea PRIVMSG/NOTICE ya codificada en el historial de target."""
+        key = ChatHistory.key(target, sender)
+        self.history.record(key, HistoryEntry(tags["msgid"], tags["time"], data.rstrip(b"\r\n")))
+
+    def _record_remote(self, data, tags):
         """
-        Acepta y gestiona conexiones de clientes.
+        Guarda en el historial un PRIVMSG/NOTICE que llegó de otro servidor
+        (o de otro worker) para entregarlo aquí, con las tags de su origen.
+        """
+        if not tags or "msgid" not in tags or "time" not in tags:
+            return
+        try:
+            message = parse_bytes(data.rstrip(b"\r\n"))
+            if message.command in ("PRIVMSG", "NOTICE") and message.params:
+                self._record_history(message.params[0], message.nick, data, tags)
+        except (ProtocolError, ValueError):
+            pass
+
+    def _fan_out(self, nicks, message, skip=None, tags=None):
+        """
+        Envía message a cada nick de nicks (excepto skip).
+
+        El mensaje se formatea y codifica una sola vez; todos los destinatarios
+        reciben el mismo objeto bytes. tags son las de IRCv3 del mensaje (time,
+        msgid); si no se dan, se generan al primer destinatario que las pida.
+        """
+        data = message.encode('utf-8') if isinstance(message, str) else message
+        self.metrics.record_fanout(len(nicks) - (skip in nicks))
+        if self.network.links:
+            # Con servidores enlazados, un solo envío por enlace con destinatarios;
+            # las tags viajan con el mensaje para que sean las mismas en toda la red
+            self.network.fan_out(nicks, data, skip, tags or message_tags())
+            return data
+        self._deliver(nicks, data, skip, tags)
+        return data
+
+    def _deliver(self, nicks, data, skip=None, tags=None):
+        """
+        Entrega data a los usuarios locales de nicks (excepto skip).
+
+        Quien negoció server-time o message-tags recibe las líneas con su
+        bloque de tags delante; ese bloque se arma una sola vez por difusión
+        y combinación de capacidades, no por destinatario.
+        """
+        clients = self.clients
+        tagged = None  # {bits de capacidades: bytes con tags}
+        for nick in nicks:
+            if nick == skip:
+                continue
+            client = clients[nick]
+            caps = client.caps & TAG_CAPS
+            if not caps:
+                client.socket.sendall(data)
+                continue
+            if tagged is None:
+                tagged = {}
+                if tags is None:
+                    tags = message_tags()
+            out = tagged.get(caps)
+            if out is None:
+                out = tagged[caps] = tag_lines(data, tags, caps)
+            client.socket.sendall(out)
+
+    def _is_operator(self, channel, nick):
+        return self.channels[channel].users.get(nick) == "@"
+
+    def _leave_all_channels(self, nick):
+        """
+        Saca a nick de todos sus canales usando el índice inverso del cliente.
+
+        Returns:
+            dict: Usuarios que compartían algún canal con nick (sin repetir).
+        """
+        peers = {}
+        joined = self.clients[nick].channels
+        for channel in joined:
+            users = self.channels[channel].users
+            del users[nick]
+            if users:
+                peers.update(dict.fromkeys(users))
+            else:
+                del self.channels[channel]
+                self.history.drop(channel)
+        joined.clear()
+        return peers
+
+    def _rename_member(self, old_nick, new_nick, origin=None):
+        """
+        Pasa el registro de un usuario a new_nick y lo renombra en sus canales.
+
+        Returns:
+            dict: Usuarios que comparten algún canal con él (sin repetir).
+        """
+        new_nick = sys.intern(new_nick)
+        client = self.clients[new_nick] = self.clients.pop(old_nick)
+        self.history.drop_nick(old_nick)  # Sus conversaciones privadas no pasan al nick nuevo ni a quien tome el viejo
+        peers = {}
+        for channel in client.channels:
+            users = self.channels[channel].users
+            users[new_nick] = users.pop(old_nick)
+            peers.update(dict.fromkeys(users))
+        self.state_version += 1
+        self.network.propagate(("NICK", old_nick, new_nick), origin)
+        peers.pop(new_nick, None)
+        return peers
+
+    def _accept_clients(self, listener, address):
+        """
+        Acepta y gestiona conexiones de clientes de un extremo (TCP o Unix).
         """
         while self.running:
             try:
-                client_socket, addr = self.server_socket.accept()
-                print(f"[SERVER] Cliente conectado desde {addr}")
+                client_socket, addr = listener.accept()
+                addr = peer_address(addr, address)
+                log.info("Cliente conectado desde %s", addr)
 
                 # Configurar SSL
                 #context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
@@ -107,668 +511,1053 @@ class IRCServer:
                 ssl_socket=client_socket
                 Thread(target=self._handle_client, args=(ssl_socket, addr), daemon=True).start()
             except Exception as e:
-                print(f"[ERROR] Error al aceptar cliente: {e}")
+                log.error("Error al aceptar cliente: %s", e)
                 
     def _complete_registration(self, nick, ssl_socket):
         """Envía mensajes de bienvenida tras NICK + USER exitosos."""
         user_info = self.pending_users.get(ssl_socket)
         if user_info:
-            self.clients[nick]["username"] = user_info["username"]
-            self.clients[nick]["realname"] = user_info["realname"]
+            self._set_user_info(nick, user_info["username"], user_info["realname"])
             # Limpiar datos temporales
             del self.pending_users[ssl_socket]
+            self.network.propagate(("USER", nick, user_info["username"], user_info["realname"]))
         
         # Mensajes de registro
         welcome_msgs = [
             f":mock.server 001 {nick} :Bienvenido al servidor",
             f":mock.server 002 {nick} :Tu host es mock.server",
             f":mock.server 003 {nick} :Este servidor fue creado hoy",
-            f":mock.server 004 {nick} mock.server 1.0 o o"
+            f":mock.server 004 {nick} mock.server 1.0 o o",
+            f":mock.server 005 {nick} CHANTYPES=# PREFIX=(o)@ CHATHISTORY={CHATHISTORY_MAX} "
+            f"TARGMAX={','.join(f'{command}:{limit}' for command, limit in sorted(TARGMAX.items()))} "
+            f":son compatibles con este servidor",
         ]
         for msg in welcome_msgs:
             ssl_socket.sendall(f"{msg}\r\n".encode('utf-8'))
-        print(f"[SERVER] Cliente {nick} registrado completamente")
+        log.info("Cliente %s registrado completamente", nick)
 
     def _handle_client(self, ssl_socket, addr):
         """
         Maneja comandos del cliente basado en RFC 2812.
         """
+        # Las respuestas y difusiones pasan por la cola de salida del cliente
+        session = self._ask_server(self._new_session, QueuedSocket(ssl_socket, self.max_sendq), addr)
+        framer = session.framer
         try:
-            nickname = None
-            buffer = ""
             while self.running:
-                data = ssl_socket.recv(4096).decode('utf-8', errors='ignore')
-                if not data:
+                # Este hilo solo lee y separa líneas; los comandos se ejecutan en
+                # el actor. Se espera a que termine antes de la siguiente lectura,
+                # así las líneas (memoryview del framer) siguen siendo válidas
+                received = framer.recv_into(ssl_socket)
+                if not received:
+                    break
+                session.bytes_in += received
+                if not self._ask_server(self._on_lines, session, framer.lines()):
                     break
-                buffer += data
-                while '\r\n' in buffer:
-                    line, buffer = buffer.split('\r\n', 1)
-                    line = line.strip()
-                    if not line:
-                        continue
-
-                    print(f"[SERVER] Mensaje recibido: {line}")
-            
-            
-                # Procesar comandos
-                if data.startswith("NICK"):
-                    parts = data.split()
-                    if len(parts) < 2:
-                        ssl_socket.sendall(f":mock.server 431 :No se proporcionó un nickname\r\n".encode('utf-8'))
-                        continue
-
-                    new_nick = parts[1]
-
-                    # Verificar si el NICK ya está en uso
-                    if new_nick in self.clients:
-                        ssl_socket.sendall(f":mock.server 433 * {new_nick} :El apodo ya está en uso\r\n".encode('utf-8'))
-                        print(f"[SERVER] NICK rechazado: {new_nick} ya está en uso")
-                        continue
-
-                    # Si el usuario ya tiene un nick registrado (cambio de nick)
-                    if nickname and nickname in self.clients:
-                        old_nick = nickname
-
-                        # Guardar el nick antiguo en WHOWAS
-                        user_data = {
-                            "nickname": old_nick,
-                            "username": self.clients[old_nick].get("username", "~user"),
-                            "hostname": self.clients[old_nick].get("hostname", addr[0]),  # Usar hostname almacenado
-                            "realname": self.clients[old_nick].get("realname", "Desconocido"),
-                            "disconnected_time": time.time()
-                        }
-
-                        if old_nick not in self.whowas:
-                            self.whowas[old_nick] = []
-                        self.whowas[old_nick].insert(0, user_data)
-                        if len(self.whowas[old_nick]) > 10:
-                            self.whowas[old_nick].pop()
-
-                        # Actualizar el nick en el diccionario
-                        self.clients[new_nick] = self.clients.pop(old_nick)
-                        nickname = new_nick
-                        ssl_socket.sendall(f":{old_nick} NICK {new_nick}\r\n".encode('utf-8'))
-                        print(f"[SERVER] {old_nick} cambió su nick a {new_nick}")
 
-                    else:
-                        self.clients[new_nick] = {
-                            "socket": ssl_socket,
-                            "modes": [],
-                            "username": None,
-                            "realname": None,
-                            "hostname": addr[0]
-                        }
-                        nickname = new_nick
-                        print(f"[SERVER] Cliente registrado con NICK: {new_nick}")
-                        
-                        if ssl_socket in self.pending_users:
-                            self._complete_registration(new_nick, ssl_socket)
-    
-                elif data.startswith("USER"):
-                    print("4")
-                    parts = data.split()
-                    if len(parts) < 5:
-                        ssl_socket.sendall(f":mock.server 461 {nickname} USER :Faltan parámetros\r\n".encode('utf-8'))
-                        print("[SERVER] Comando USER rechazado: Faltan parámetros")
-                        continue
-                    print("1")
-                    username = parts[1]
-                    realname = " ".join(parts[4:])[1:]  # Nombre real sin el ":"
-                    self.pending_users[ssl_socket] = {
-                        "username": username,
-                        "realname": realname
-                    }
-
-                    if nickname and nickname in self.clients:
-                        print("2")
-                        self._complete_registration(nickname, ssl_socket)
-                    else:
-                        ssl_socket.sendall(f":mock.server 451 * :Debes registrar un NICK primero\r\n".encode('utf-8'))
-                        print("[SERVER] USER recibido, esperando NICK válido")
-
-                #No implementada autentificación ya que el servidor no tiene conexión restringida, posible extensión luego    
-                elif data.startswith("PASS"):
-                    parts = data.split()
-                    if len(parts) < 2:
-                        ssl_socket.sendall(f":mock.server 461 {nickname} PASS :Faltan parámetros\r\n".encode('utf-8'))
-                        print("[SERVER] Comando PASS rechazado: Faltan parámetros")
-                        continue
-
-                    password = parts[1]
-                    # Futura lógica para validar la contraseña
-                    print(f"[SERVER] Cliente {nickname} envió la contraseña: {password}")
-                    
-                elif data.startswith("JOIN"):
-                    parts = data.split()
-                    if len(parts) < 2 or parts[1].strip() == ":":
-                        ssl_socket.sendall(f":mock.server 461 {nickname} JOIN :Faltan parámetros\r\n".encode('utf-8'))
-                        continue
-
-                    channel = parts[1]
-
-                    # Verificar si el canal existe
-                    if channel not in self.channels:
-                        # Crear canal y asignar modos por defecto (+nt)
-                        self.channels[channel] = {
-                            "users": [nickname],
-                            "operators": [nickname],
-                            "topic": None,
-                            "modes": "+nt"  # +n: No mensajes externos, +t: Solo ops pueden cambiar el tema
-                        }
-                        print(f"[SERVER] Canal {channel} creado por {nickname}")
-                    else:
-                        if nickname not in self.channels[channel]["users"]:
-                            self.channels[channel]["users"].append(nickname)
-
-                    # Enviar respuestas obligatorias según RFC 2812
-                    # 1. Enviar JOIN a todos los usuarios del canal
-                    for user in self.channels[channel]["users"]:
-                        self.clients[user]["socket"].sendall(f":{nickname}!{self.clients[nickname]['username']}@mock.server JOIN {channel}\r\n".encode('utf-8'))
-
-                    # 2. Enviar lista de usuarios (353 RPL_NAMREPLY)
-                    users_list = " ".join([f"@{u}" if u in self.channels[channel]["operators"] else u for u in self.channels[channel]["users"]])
-                    ssl_socket.sendall(f":mock.server 353 {nickname} = {channel} :{users_list}\r\n".encode('utf-8'))
-                    ssl_socket.sendall(f":mock.server 366 {nickname} {channel} :Fin de la lista NAMES\r\n".encode('utf-8'))
-
-                    # 3. Enviar tema del canal (332 RPL_TOPIC o 331 RPL_NOTOPIC)
-                    topic = self.channels[channel].get("topic")
-                    if topic:
-                        ssl_socket.sendall(f":mock.server 332 {nickname} {channel} :{topic}\r\n".encode('utf-8'))
-                    else:
-                        ssl_socket.sendall(f":mock.server 331 {nickname} {channel} :No hay tema establecido\r\n".encode('utf-8'))
-                                
-                elif data.startswith("MODE"):
-                    parts = data.split()
-                    if len(parts) < 3:
-                        ssl_socket.sendall(f":mock.server 461 {nickname} MODE :Faltan parámetros\r\n".encode('utf-8'))
-                        continue
-
-                    target = parts[1]
-                    mode = parts[2]
-
-                    # Modo aplicado a un usuario
-                    if target in self.clients:
-                        if mode == "+i":
-                            if "+i" not in self.clients[target]["modes"]:
-                                self.clients[target]["modes"].append("+i")
-                                ssl_socket.sendall(f":mock.server 221 {target} :Modo +i activado\r\n".encode('utf-8'))
-                                print(f"[SERVER] {target} ha activado el modo +i (invisible)")
-                            else:
-                                ssl_socket.sendall(f":mock.server 443 {target} :El modo ya está activado\r\n".encode('utf-8'))
-                        elif mode == "-i":
-                            if "+i" in self.clients[target]["modes"]:
-                                self.clients[target]["modes"].remove("+i")
-                                ssl_socket.sendall(f":mock.server 221 {target} :Modo +i desactivado\r\n".encode('utf-8'))
-                                print(f"[SERVER] {target} ha desactivado el modo +i (invisible)")
-                            else:
-                                ssl_socket.sendall(f":mock.server 442 {target} :El modo no estaba activado\r\n".encode('utf-8'))
-
-                    elif target in self.channels:
-                        if len(parts) < 4:
-                            ssl_socket.sendall(f":mock.server 461 {nickname} MODE :Faltan parámetros\r\n".encode('utf-8'))
-                            continue
-
-                        target = parts[1]
-                        mode = parts[2]
-                        target_user = parts[3]  # Nombre de usuario (puede incluir "_")
-
-                        # Modo aplicado a un canal
-                        if target in self.channels:
-                            channel = target
-
-                            # Verificar si el usuario que ejecuta el comando es operador
-                            if nickname not in self.channels[channel]["operators"]:
-                                error_msg = f":mock.server 482 {nickname} {channel} :No tienes permisos para cambiar modos\r\n"
-                                ssl_socket.sendall(error_msg.encode('utf-8'))
-                                continue
-
-                            # Manejar +o (promover a operador)
-                            if mode == "+o":
-                                if target_user not in self.channels[channel]["users"]:
-                                    error_msg = f":mock.server 441 {target_user} {channel} :El usuario no está en el canal\r\n"
-                                    ssl_socket.sendall(error_msg.encode('utf-8'))
-                                elif target_user in self.channels[channel]["operators"]:
-                                    error_msg = f":mock.server 443 {channel} {target_user} :Ya es operador\r\n"
-                                    ssl_socket.sendall(error_msg.encode('utf-8'))
-                                else:
-                                    self.channels[channel]["operators"].append(target_user)
-                                    # Notificar a TODOS en el canal
-                                    message = f":{nickname}!{self.clients[nickname]['username']}@mock.server MODE {channel} +o {target_user}\r\n"
-                                    for user in self.channels[channel]["users"]:
-                                        self.clients[user]["socket"].sendall(message.encode('utf-8'))
-
-                            # Manejar -o (quitar operador)
-                            elif mode == "-o":
-                                if target_user not in self.channels[channel]["operators"]:
-                                    error_msg = f":mock.server 441 {channel} {target_user} :El usuario no era operador\r\n"
-                                    ssl_socket.sendall(error_msg.encode('utf-8'))
-                                else:
-                                    self.channels[channel]["operators"].remove(target_user)
-                                    # Notificar a TODOS en el canal
-                                    message = f":{nickname}!{self.clients[nickname]['username']}@mock.server MODE {channel} -o {target_user}\r\n"
-                                    for user in self.channels[channel]["users"]:
-                                        self.clients[user]["socket"].sendall(message.encode('utf-8'))
-                    
-                                 
-                elif data.startswith("PART"):
-                    parts = data.split()
-                    if len(parts) < 2:
-                        ssl_socket.sendall(f":mock.server 461 {nickname} PART :Faltan parámetros\r\n".encode('utf-8'))
-                        continue
-
-                    channel = parts[1]
-                    if channel in self.channels and nickname in self.channels[channel]["users"]:
-                        # Notificar a todos en el canal
-                        for user in self.channels[channel]["users"]:
-                            self.clients[user]["socket"].sendall(f":{nickname}!{self.clients[nickname]['username']}@mock.server PART {channel}\r\n".encode('utf-8'))
-
-                        # Eliminar al usuario del canal
-                        self.channels[channel]["users"].remove(nickname)
-                        if nickname in self.channels[channel]["operators"]:
-                            self.channels[channel]["operators"].remove(nickname)
-
-                        # Eliminar el canal si está vacío
-                        if not self.channels[channel]["users"]:
-                            del self.channels[channel]
-                            print(f"[SERVER] Canal {channel} eliminado porque está vacío.")
+        except Exception as e:
+            if session.socket.sendq.closing:
+                # El escritor cerró el socket (SendQ excedida o cierre pedido) mientras se leía
+                log.debug("Lectura interrumpida por el cierre de %s: %s", addr, e)
+            else:
+                log.error("Error con cliente %s: %s", addr, e)
 
-                    else:
-                        ssl_socket.sendall(f":mock.server 442 {nickname} {channel} :No estás en el canal\r\n".encode('utf-8'))
-                                
-                elif data.startswith("TOPIC"):
-                    parts = data.split(' ', 2)  # Dividir en máximo 3 partes
-                    if len(parts) < 2:
-                        ssl_socket.sendall(f":mock.server 461 {nickname} TOPIC :Faltan parámetros\r\n".encode('utf-8'))
-                        continue
-
-                    channel = parts[1]
-                    if channel not in self.channels:
-                        ssl_socket.sendall(f":mock.server 403 {nickname} {channel} :No existe el canal\r\n".encode('utf-8'))
-                        continue
-
-                    # Consulta del tema actual
-                    if len(parts) == 2:
-                        topic = self.channels[channel].get("topic")
-                        if topic:
-                            ssl_socket.sendall(f":mock.server 332 {nickname} {channel} :{topic}\r\n".encode('utf-8'))
-                        else:
-                            ssl_socket.sendall(f":mock.server 331 {nickname} {channel} :No hay tema establecido\r\n".encode('utf-8'))
-                        continue
-
-                    # Establecer o eliminar tema
-                    new_topic = parts[2].strip()
-                    if nickname not in self.channels[channel]["operators"]:
-                        ssl_socket.sendall(f":mock.server 482 {channel} :No tienes permisos para cambiar el tema\r\n".encode('utf-8'))
-                        continue
-
-                    if new_topic == ":":
-                        self.channels[channel]["topic"] = None
-                        # Notificar a todos en el canal
-                        for user in self.channels[channel]["users"]:
-                            self.clients[user]["socket"].sendall(
-                                f":{nickname}!{self.clients[nickname]['username']}@mock.server TOPIC {channel} :\r\n".encode('utf-8')
-                            )
-                        ssl_socket.sendall(f":mock.server 331 {nickname} {channel} :Tema eliminado\r\n".encode('utf-8'))
-                    else:
-                        self.channels[channel]["topic"] = new_topic.lstrip(':')
-                        # Notificar a todos en el canal
-                        for user in self.channels[channel]["users"]:
-                            self.clients[user]["socket"].sendall(
-                                f":{nickname}!{self.clients[nickname]['username']}@mock.server TOPIC {channel} :{new_topic.lstrip(':')}\r\n".encode('utf-8')
-                            )
-                        ssl_socket.sendall(f":mock.server 332 {nickname} {channel} :{new_topic.lstrip(':')}\r\n".encode('utf-8'))
-                        
-                elif data.startswith("KICK"):
-                    parts = data.split(' ', 3)
-                    if len(parts) < 3:
-                        ssl_socket.sendall(f":mock.server 461 {nickname} KICK :Faltan parámetros\r\n".encode('utf-8'))
-                        continue
-
-                    channel = parts[1]
-                    target = parts[2]
-                    reason = parts[3][1:] if len(parts) > 3 else "Expulsado por un operador"
-
-                    if channel not in self.channels:
-                        ssl_socket.sendall(f":mock.server 403 {nickname} {channel} :No existe el canal\r\n".encode('utf-8'))
-                        continue
-
-                    if nickname not in self.channels[channel]["operators"]:
-                        ssl_socket.sendall(f":mock.server 482 {channel} :No tienes permisos para expulsar usuarios\r\n".encode('utf-8'))
-                        continue
-
-                    if target not in self.channels[channel]["users"]:
-                        ssl_socket.sendall(f":mock.server 441 {nickname} {target} :El usuario no está en el canal\r\n".encode('utf-8'))
-                        continue
-
-                    # Notificar al expulsado y al canal
-                    kick_message = f":{nickname}!{self.clients[nickname]['username']}@mock.server KICK {channel} {target} :{reason}\r\n"
-                    for user in self.channels[channel]["users"]:
-                        self.clients[user]["socket"].sendall(kick_message.encode('utf-8'))
-
-                    # Eliminar al usuario del canal
-                    self.channels[channel]["users"].remove(target)
-                    if target in self.channels[channel]["operators"]:
-                        self.channels[channel]["operators"].remove(target)
-                        
-                elif data.startswith("INVITE"):
-                    parts = data.split()
-                    if len(parts) < 3:
-                        ssl_socket.sendall(f":mock.server 461 {nickname} INVITE :Faltan parámetros\r\n".encode('utf-8'))
-                        continue
-
-                    target = parts[1]
-                    channel = parts[2]
-
-                    if channel not in self.channels:
-                        ssl_socket.sendall(f":mock.server 403 {nickname} {channel} :No existe el canal\r\n".encode('utf-8'))
-                        continue
-
-                    if target not in self.clients:
-                        ssl_socket.sendall(f":mock.server 401 {nickname} {target} :El usuario no está conectado\r\n".encode('utf-8'))
-                        continue
-
-                    # Enviar invitación al usuario
-                    self.clients[target]["socket"].sendall(
-                        f":{nickname}!{self.clients[nickname]['username']}@mock.server INVITE {target} :{channel}\r\n".encode('utf-8')
-                    )
-                    ssl_socket.sendall(f":mock.server 341 {nickname} {target} {channel} :Invitación enviada\r\n".encode('utf-8'))
-                    
-                elif data.startswith("WHOIS"):
-                    parts = data.split()
-                    if len(parts) < 2:
-                        ssl_socket.sendall(f":mock.server 461 {nickname} WHOIS :Faltan parámetros\r\n".encode('utf-8'))
-                        continue
-
-                    target = parts[1]
-                    if target not in self.clients:
-                        ssl_socket.sendall(f":mock.server 401 {nickname} {target} :El usuario no está conectado\r\n".encode('utf-8'))
-                        continue
-
-                    # Obtener información del usuario
-                    user_info = self.clients[target]
-                    username = user_info.get("username", "*")
-                    hostname = "127.0.0.1"  # Puedes cambiar esto por el host real del usuario
-                    realname = user_info.get("realname", "Desconocido")
-                    server_name = "mock.server"
-                    idle_time = "0"  # Tiempo de inactividad (puedes implementar esto si es necesario)
-
-                    # Enviar respuesta WHOISUSER (311)
-                    ssl_socket.sendall(
-                        f":mock.server 311 {nickname} {target} {username} {hostname} * :{realname}\r\n".encode('utf-8')
-                    )
-
-                    # Enviar respuesta WHOISSERVER (312)
-                    ssl_socket.sendall(
-                        f":mock.server 312 {nickname} {target} {server_name} :Información del servidor\r\n".encode('utf-8')
-                    )
-
-                    # Enviar respuesta WHOISIDLE (317)
-                    ssl_socket.sendall(
-                        f":mock.server 317 {nickname} {target} {idle_time} :Segundos inactivo\r\n".encode('utf-8')
-                    )
-
-                    # Enviar respuesta ENDOFWHOIS (318)
-                    ssl_socket.sendall(
-                        f":mock.server 318 {nickname} {target} :Fin de la lista WHOIS\r\n".encode('utf-8')
-                    )
-                    
-                elif data.startswith("WHOWAS"):
-                    parts = data.split()
-                    if len(parts) < 2:
-                        ssl_socket.sendall(f":mock.server 406 {nickname} :Faltan parámetros\r\n".encode('utf-8'))
-                        continue
-
-                    target = parts[1]
-                    if target not in self.whowas or not self.whowas[target]:
-                        ssl_socket.sendall(f":mock.server 406 {nickname} {target} :No hay información histórica\r\n".encode('utf-8'))
-                        continue
-
-                    # Enviar todas las entradas históricas del usuario
-                    for entry in self.whowas[target]:
-                        ssl_socket.sendall(
-                            f":mock.server 314 {nickname} {entry['nickname']} {entry['username']} {entry['hostname']} * :{entry['realname']}\r\n".encode('utf-8')
-                        )
-                    ssl_socket.sendall(f":mock.server 369 {nickname} {target} :Fin de la lista WHOWAS\r\n".encode('utf-8'))
-                    
-                elif data.startswith("WHO"):
-                    parts = data.split()
-                    channel = parts[1] if len(parts) > 1 else None
-
-                    # WHO sin parámetros: listar usuarios no invisibles en todo el servidor
-                    if not channel:
-                        for user, details in self.clients.items():
-                            if "+i" not in details["modes"]:
-                                username = details.get("username", "~user")
-                                flags = "H"  # H = Usuario disponible (no away)
-                                ssl_socket.sendall(
-                                    f":mock.server 352 {nickname} * {username} {self.host} mock.server {user} {flags} :0 {details['realname']}\r\n".encode('utf-8')
-                                )
-                        ssl_socket.sendall(f":mock.server 315 {nickname} * :Fin de la lista WHO\r\n".encode('utf-8'))
-                        continue
-
-                    # WHO para un canal específico
-                    if channel not in self.channels:
-                        ssl_socket.sendall(f":mock.server 403 {nickname} {channel} :No existe el canal\r\n".encode('utf-8'))
-                        continue
-
-                    for user in self.channels[channel]["users"]:
-                        if "+i" in self.clients[user]["modes"] and nickname not in self.channels[channel]["users"]:
-                            continue  # Ocultar usuarios invisibles a extraños
-                        username = self.clients[user].get("username", "~user")
-                        flags = "H@ " if user in self.channels[channel]["operators"] else "H"
-                        ssl_socket.sendall(
-                            f":mock.server 352 {nickname} {channel} {username} {self.host} mock.server {user} {flags} :0 {self.clients[user]['realname']}\r\n".encode('utf-8')
-                        )
-                    ssl_socket.sendall(f":mock.server 315 {nickname} {channel} :Fin de la lista WHO\r\n".encode('utf-8'))
-                    
-                elif data.startswith("NAMES"):
-                    parts = data.split()
-                    channel = parts[1] if len(parts) > 1 else "*"
-
-                    if channel != "*" and channel not in self.channels:
-                        ssl_socket.sendall(f":mock.server 403 {nickname} {channel} :No existe el canal\r\n".encode('utf-8'))
-                        continue
-
-                    users = []
-                    if channel == "*":
-                        # Listar todos los usuarios visibles
-                        for user in self.clients.values():
-                            if "+i" not in user["modes"]:
-                                users.append(user["nickname"])
-                    else:
-                        # Listar usuarios del canal con @ para operadores
-                        for user in self.channels[channel]["users"]:
-                            prefix = "@" if user in self.channels[channel]["operators"] else ""
-                            users.append(f"{prefix}{user}")
-
-                    ssl_socket.sendall(f":mock.server 353 {nickname} = {channel} :{' '.join(users)}\r\n".encode('utf-8'))
-                    ssl_socket.sendall(f":mock.server 366 {nickname} {channel} :Fin de la lista NAMES\r\n".encode('utf-8'))
-    
-                elif data.startswith("REJOIN"):
-                    parts = data.split()
-                    if len(parts) < 2:
-                        ssl_socket.sendall(f":mock.server 461 {nickname} REJOIN :Faltan parámetros\r\n".encode('utf-8'))
-                        continue
-
-                    channel = parts[1]
-                    if channel in self.channels and nickname in self.channels[channel]["users"]:
-                        # Notificar al usuario
-                        ssl_socket.sendall(f":mock.server 332 {nickname} {channel} :Reunión exitosa\r\n".encode('utf-8'))
-                    else:
-                        ssl_socket.sendall(f":mock.server 442 {nickname} {channel} :No estás en el canal\r\n".encode('utf-8'))
-                                        
-                elif data.startswith("LIST"):
-                    # Enviar lista de canales
-                    for channel, details in self.channels.items():
-                        topic = details.get("topic", "Sin tema")
-                        visible_users = [u for u in details["users"] if "+i" not in self.clients[u]["modes"]]
-                        ssl_socket.sendall(
-                            f":mock.server 322 {nickname} {channel} {len(visible_users)} :{topic}\r\n".encode('utf-8')
-                        )
-                    ssl_socket.sendall(f":mock.server 323 {nickname} :Fin de la lista\r\n".encode('utf-8'))
-                    
-                elif data.startswith("PRIVMSG"):
-                    parts = data.split(' ', 2)  # Dividir en 3 partes: PRIVMSG, target, message
-                    if len(parts) < 3:
-                        ssl_socket.sendall(f":mock.server 461 {nickname} PRIVMSG :Faltan parámetros\r\n".encode('utf-8'))
-                        continue
-
-                    target = parts[1]
-                    raw_message = parts[2].strip()
-
-                    # Eliminar el ":" inicial del mensaje si existe (solo el primero)
-                    message = raw_message[1:] if raw_message.startswith(":") else raw_message
-
-                    # Obtener username válido (ej. ~user si no está registrado)
-                    username = self.clients[nickname].get("username", "~user")
-
-                    # Mensaje a un canal
-                    if target.startswith("#"):
-                        if target in self.channels:
-                            # Formato IRC: :nick!user@host PRIVMSG #canal :mensaje
-                            full_message = f":{nickname}!{username}@mock.server PRIVMSG {target} :{message}\r\n"
-                            for user in self.channels[target]["users"]:
-                                if user != nickname:
-                                    self.clients[user]["socket"].sendall(full_message.encode('utf-8'))
-                            print(f"[SERVER] Mensaje enviado a canal {target}: {message}")
-                        else:
-                            ssl_socket.sendall(f":mock.server 403 {nickname} {target} :No existe el canal\r\n".encode('utf-8'))
-
-                    # Mensaje privado a un usuario
-                    else:
-                        if target in self.clients:
-                            # Formato IRC: :nick!user@host PRIVMSG usuario :mensaje
-                            full_message = f":{nickname}!{username}@mock.server PRIVMSG {target} :{message}\r\n"
-                            self.clients[target]["socket"].sendall(full_message.encode('utf-8'))
-                            print(f"[SERVER] Mensaje enviado a usuario {target}: {message}")
-                        else:
-                            ssl_socket.sendall(f":mock.server 401 {nickname} {target} :El usuario no está conectado\r\n".encode('utf-8'))
-                            
-                    
-                elif data.startswith("NOTICE"):
-                    parts = data.split(' ', 2)  # Divide en máximo 3 partes: NOTICE, target, message
-                    if len(parts) < 3:
-                        ssl_socket.sendall(f":mock.server 461 {nickname} NOTICE :Faltan parámetros\r\n".encode('utf-8'))
-                        continue
-
-                    target = parts[1]
-                    message = parts[2][1:] if parts[2].startswith(":") else parts[2]  # Eliminar el ":" inicial si existe
-
-                    if target in self.clients:
-                        # Formato IRC estándar: :nickname!username@host NOTICE usuario :mensaje
-                        full_message = f":{nickname}!{self.clients[nickname]['username']}@mock.server NOTICE {target} :{message}\r\n"
-                        self.clients[target]["socket"].sendall(full_message.encode('utf-8'))
-                        print(f"[SERVER] Notificación enviada a {target}: {message}")
-                        
-                
-                elif data.startswith("VERSION"):
-                    version_response = (
-                        f":mock.server 351 {nickname} mock.irc.server-1.0 mock.server :Python IRC Server\r\n"
-                    )
-                    ssl_socket.sendall(version_response.encode("utf-8"))
-                elif data.startswith("CAP LS"):
-                    # Enviar lista de capacidades (aunque esté vacía)
-                    ssl_socket.sendall(b":mock.server CAP * LS :\r\n")
-                
-                elif data.startswith("CAP END"):
-                    ssl_socket.sendall(b":mock.server CAP * ACK :\r\n")  # Confirmar fin de CAP
-                    
-                elif data.startswith("STATS"):
-                    parts = data.split()
-                    if len(parts) < 2:
-                        error_msg = f":mock.server 461 {nickname} STATS :Faltan parámetros\r\n"
-                        ssl_socket.sendall(error_msg.encode("utf-8"))
-                        continue
-
-                    query = parts[1].upper()
-                    if query == "L":  # Ejemplo: Estadísticas de conexiones
-                        stats_msg = (
-                            f":mock.server 211 {nickname} mock.server :Estadísticas del servidor\r\n"
-                            f":mock.server 251 {nickname} :Usuarios conectados: {len(self.clients)}\r\n"
-                            f":mock.server 255 {nickname} :Canales activos: {len(self.channels)}\r\n"
-                        )
-                        ssl_socket.sendall(stats_msg.encode("utf-8"))
-                    else:
-                        error_msg = f":mock.server 219 {nickname} {query} :Tipo de STATS no soportado\r\n"
-                        ssl_socket.sendall(error_msg.encode("utf-8"))
-
-                    end_msg = f":mock.server 219 {nickname} {query} :Fin de STATS\r\n"
-                    ssl_socket.sendall(end_msg.encode("utf-8"))
-    
-                elif data.startswith("PING"):
-                    server_name = data.split()[1]
-                    ssl_socket.sendall(f"PONG {server_name}\r\n".encode('utf-8'))
-                    print(f"[SERVER] PING recibido, PONG enviado a {nickname}")
-
-                elif data.startswith("PONG"):
-                    print(f"[SERVER] PONG recibido de {nickname}")
-                    if nickname in self.clients:
-                        parts = data.split(":", 1)
-                        if len(parts) >= 2:
-                            received_token = parts[1].strip()
-                            stored_token = self.clients[nickname].get("ping_token", "")
-                            if received_token == stored_token:
-                                self.clients[nickname]["last_pong"] = time.time()
-                                print(f"[SERVER] PONG válido de {nickname}")
-                            else:
-                                print(f"[SERVER] Token inválido de {nickname}")
-                                
-                elif data.startswith("QUIT"):
-                    reason = data.split(":", 1)[1] if ":" in data else "Desconexión voluntaria"
-                    print(f"[SERVER] {nickname} se ha desconectado: {reason}")
-                    ssl_socket.sendall(f":mock.server 221 {nickname} QUIT :{reason}\r\n".encode('utf-8'))
-
-                    if nickname in self.clients:
-                        # Guardar en WHOWAS
-                        user_data = {
-                            "nickname": nickname,
-                            "username": self.clients[nickname].get("username", "~user"),
-                            "hostname": addr[0],
-                            "realname": self.clients[nickname].get("realname", "Desconocido"),
-                            "disconnected_time": time.time()
-                        }
-                        # Almacenar hasta 10 entradas históricas por usuario
-                        if nickname not in self.whowas:
-                            self.whowas[nickname] = []
-                        self.whowas[nickname].insert(0, user_data)  # Insertar al inicio
-                        if len(self.whowas[nickname]) > 10:
-                            self.whowas[nickname].pop()  # Mantener solo 10 registros
-
-                    # Eliminar al usuario de todos los canales
-                    for channel, details in self.channels.items():
-                        if nickname in details["users"]:
-                            details["users"].remove(nickname)
-                            if not details["users"]:  # Si el canal queda vacío, eliminarlo
-                                del self.channels[channel]
-                            else:
-                                for user in details["users"]:
-                                    self.clients[user]["socket"].sendall(f":{nickname} QUIT :{reason}\r\n".encode('utf-8'))
-                    break
+        finally:
+            self._ask_server(self._close_session, session)
 
-                else:
-                    ssl_socket.sendall(b":mock.server 421 Unknown command\r\n")
-                    print(f"[SERVER] Comando desconocido recibido: {data}")
+    def _on_lines(self, session, lines):
+        """
+        Procesa las líneas completas de un bloque recibido de un cliente.
 
-            
+        Ejecuta, en orden, todos los comandos del bloque, de modo que un
+        cliente puede enviar varios comandos en una sola escritura. Cada
+        línea llega como memoryview del búfer del framer y se decodifica
+        una sola vez, aquí; las respuestas de cada comando salen juntas
+        (ver _run_command).
 
+        Returns:
+            bool: False si la conexión debe cerrarse (QUIT).
+        """
+        session.last_activity = time.monotonic()
+        for raw in lines:
+            line = str(raw, "utf-8", "ignore").strip()
+            if not line:
+                continue
+            if self.trace_commands:
+                log.debug("Mensaje recibido: %s", line)
+            if session.link is not None:
+                self.network.on_line(session.link, line)
+                continue
+
+            command, line, tags = parse_line(line)
+            if command is None:
+                continue
+
+            self.messages_processed += 1
+            started = time.perf_counter()
+            label = parse_tags(tags).get("label") if tags and session.caps & CAP_LABELED_RESPONSE else None
+            keep_open, chunks = self._run_command(session, command, line, label)
+            verb = command if command in self.commands else "UNKNOWN"
+            self.metrics.record_command(verb, len(line), time.perf_counter() - started, chunks)
+            if not keep_open:
+                return False
+        return True
+
+    def _close_session(self, session):
+        """Libera el nick y cierra el socket de una sesión terminada."""
+        self.timers.cancel(session)
+        self.sessions.discard(session)
+        self.metrics.record_closed(session)
+        if session.link is not None:
+            self.network.drop(session.link, "Conexión cerrada")
+        nickname = session.nickname
+        # Solo si el nick sigue siendo de esta sesión (tras un QUIT otro cliente pudo tomarlo)
+        if nickname in self.clients and self.clients[nickname].socket is session.socket:
+            self._remove_client(nickname)
+        try:
+            session.socket.shutdown(socket.SHUT_RDWR)
         except Exception as e:
-            print(f"[ERROR] Error con cliente {addr}: {e}")
+            log.warning("Error al cerrar la conexión SSL: %s", e)
+        session.socket.close()
+        log.info("Conexión cerrada con %s", session.addr)
+
+    def _run_command(self, session, command, data, label=None):
+        """
+        Ejecuta un comando acumulando sus respuestas a esta conexión.
+
+        Todo lo que el comando envía a la propia conexión (respuestas
+        numéricas, su eco en difusiones) se retiene en la cola y se encola
+        al final de una vez, en lugar de una escritura por línea. Se encola
+        como respuesta (send_reply), bloque a bloque: una respuesta mayor
+        que la sendq no desconecta a quien la pidió. Con label
+        (labeled-response) la respuesta lleva la etiqueta.
 
+        Returns:
+            tuple: (seguir abierta, envíos acumulados).
+        """
+        sendq = session.socket.sendq
+        sendq.hold()
+        try:
+            keep_open = self._process_command(session, command, data)
         finally:
-            if nickname and nickname in self.clients:
-                del self.clients[nickname]
-            try:
-                ssl_socket.shutdown(socket.SHUT_RDWR)
-            except Exception as e:
-                print(f"[!] Error al cerrar la conexión SSL: {e}")
-            ssl_socket.close()
-            print(f"[SERVER] Conexión cerrada con {addr}")
+            held = sendq.release()  # Vacía si el comando cerró la conexión
+            chunks = len(held)
+            if label:
+                out = labeled(b"".join(held), label, session.caps)
+                held = [out[start:start + REPLY_BATCH_BYTES] for start in range(0, len(out), REPLY_BATCH_BYTES)]
+            if held:
+                session.socket.send_reply(held)
+        return keep_open, chunks
+
+    def _process_command(self, session, command, data):
+        """
+        Ejecuta un comando del cliente buscando su manejador en el registro.
+
+        Los parámetros mínimos y el requisito de registro se validan aquí,
+        según lo que declara cada comando.
+
+        Returns:
+            bool: False si la conexión debe cerrarse (QUIT).
+        """
+        spec = self.commands.get(command)
+        if spec is None:
+            session.socket.sendall(b":mock.server 421 Unknown command\r\n")
+            log.debug("Comando desconocido recibido: %s", data)
+            return True
+
+        nickname = session.nickname
+        if spec.needs_registration and nickname not in self.clients:
+            session.socket.sendall(":mock.server 451 * :No estás registrado\r\n".encode('utf-8'))
+            return True
+        if spec.min_params and len(data.split()) - 1 < spec.min_params:
+            session.socket.sendall(f":mock.server 461 {nickname or '*'} {command} :Faltan parámetros\r\n".encode('utf-8'))
+            return True
+
+        return spec.handler(self, session, data) is not False
+
+
+    @commands.register("NICK", needs_registration=False)
+    def _cmd_nick(self, session, data):
+        ssl_socket = session.socket
+        addr = session.addr
+        nickname = session.nickname
+
+        parts = data.split()
+        if len(parts) < 2:
+            ssl_socket.sendall(f":mock.server 431 :No se proporcionó un nickname\r\n".encode('utf-8'))
+            return
+
+        new_nick = parts[1]
+
+        # Verificar si el NICK ya está en uso
+        if not self._nick_available(new_nick):
+            ssl_socket.sendall(f":mock.server 433 * {new_nick} :El apodo ya está en uso\r\n".encode('utf-8'))
+            log.debug("NICK rechazado: %s ya está en uso", new_nick)
+            return
+
+        # Si el usuario ya tiene un nick registrado (cambio de nick)
+        if nickname and nickname in self.clients:
+            old_nick = nickname
+
+            # Guardar el nick antiguo en WHOWAS
+            self._remember_whowas(old_nick)
+
+            # Actualizar el nick en el diccionario y en sus canales
+            peers = self._rename_member(old_nick, new_nick)
+            nickname = new_nick
+            session.nickname = new_nick
+            nick_message = f":{old_nick} NICK {new_nick}\r\n".encode('utf-8')
+            ssl_socket.sendall(nick_message)
+            self._fan_out(peers, nick_message)
+            log.info("%s cambió su nick a %s", old_nick, new_nick)
+
+        else:
+            self._add_client(new_nick, ssl_socket, addr[0])
+            self.clients[new_nick].caps = session.caps  # Negociadas antes del registro
+            nickname = new_nick
+            session.nickname = new_nick
+            log.info("Cliente registrado con NICK: %s", new_nick)
+
+            if ssl_socket in self.pending_users and not session.cap_negotiating:
+                self._complete_registration(new_nick, ssl_socket)
+
+    @commands.register("USER", min_params=4, needs_registration=False)
+    def _cmd_user(self, session, data):
+        ssl_socket = session.socket
+        nickname = session.nickname
+
+        parts = data.split()
+        username = parts[1]
+        realname = " ".join(parts[4:])[1:]  # Nombre real sin el ":"
+        self.pending_users[ssl_socket] = {
+            "username": username,
+            "realname": realname
+        }
+
+        if nickname and nickname in self.clients:
+            if not session.cap_negotiating:
+                self._complete_registration(nickname, ssl_socket)
+        else:
+            ssl_socket.sendall(f":mock.server 451 * :Debes registrar un NICK primero\r\n".encode('utf-8'))
+            log.debug("USER recibido, esperando NICK válido")
+
+    # Los clientes no necesitan contraseña; la usan los servidores que se enlazan (ver _cmd_server)
+    @commands.register("PASS", min_params=1, needs_registration=False)
+    def _cmd_pass(self, session, data):
+        nickname = session.nickname
+
+        session.password = data.split(" ", 1)[1].lstrip(":")
+        log.debug("Cliente %s envió PASS", nickname)
+
+    @commands.register("OPER", min_params=2)
+    def _cmd_oper(self, session, data):
+        ssl_socket = session.socket
+        nickname = session.nickname
+
+        parts = data.split()
+        name, password = parts[1], parts[2].lstrip(":")
+        expected = self.operators.get(name)
+        if expected is None:
+            ssl_socket.sendall(f":mock.server 491 {nickname} :No hay operadores con ese nombre\r\n".encode('utf-8'))
+            return
+        if not hmac.compare_digest(password.encode('utf-8'), expected.encode('utf-8')):
+            ssl_socket.sendall(f":mock.server 464 {nickname} :Contraseña incorrecta\r\n".encode('utf-8'))
+            return
+        if not self.clients[nickname].modes & UMODE_OPERATOR:
+            self._set_user_mode(nickname, "+o", True)
+        ssl_socket.sendall(f":mock.server 381 {nickname} :Ahora eres operador del servidor\r\n".encode('utf-8'))
+        log.info("%s es operador del servidor (%s)", nickname, name)
+
+    def _require_operator(self, session):
+        """Responde 481 y devuelve False si quien envía el comando no es operador del servidor."""
+        if self.clients[session.nickname].modes & UMODE_OPERATOR:
+            return True
+        session.socket.sendall(f":mock.server 481 {session.nickname} :Permiso denegado: no eres operador\r\n".encode('utf-8'))
+        return False
+
+    @commands.register("JOIN", min_params=1)
+    def _cmd_join(self, session, data):
+        ssl_socket = session.socket
+        nickname = session.nickname
+
+        parts = data.split()
+        if parts[1].strip() == ":":
+            ssl_socket.sendall(f":mock.server 461 {nickname} JOIN :Faltan parámetros\r\n".encode('utf-8'))
+            return
+
+        channels = self._targets(session, "JOIN", parts[1])
+        if channels is None:
+            return
+
+        # Las respuestas de todos los canales salen en una sola escritura
+        caps = session.caps
+        reply = []
+        for channel in channels:
+            # Verificar si el canal existe
+            if channel not in self.channels:
+                # Quien crea el canal queda como operador
+                founder = self._create_channel(channel)
+                self._add_member(channel, nickname, "@" if founder else "")
+                log.debug("Canal %s creado por %s", channel, nickname)
+            else:
+                if nickname not in self.channels[channel].users:
+                    self._add_member(channel, nickname)
+
+            # Enviar respuestas obligatorias según RFC 2812
+            # 1. Enviar JOIN a todos los usuarios del canal (el propio, en la respuesta)
+            tags = message_tags() if caps & TAG_CAPS else None
+            join_message = self._broadcast(
+                channel, f":{nickname}!{self.clients[nickname].username}@mock.server JOIN {channel}\r\n",
+                skip=nickname, tags=tags,
+            )
+            reply.append(tag_lines(join_message, tags, caps & TAG_CAPS) if tags else join_message)
+
+            # 2. Enviar lista de usuarios (353 RPL_NAMREPLY)
+            users_list = " ".join([f"{self._member_prefix(prefix, caps)}{u}" for u, prefix in self.channels[channel].users.items()])
+            reply.append(f":mock.server 353 {nickname} = {channel} :{users_list}\r\n".encode('utf-8'))
+            reply.append(f":mock.server 366 {nickname} {channel} :Fin de la lista NAMES\r\n".encode('utf-8'))
+
+            # 3. Enviar tema del canal (332 RPL_TOPIC o 331 RPL_NOTOPIC)
+            topic = self.channels[channel].topic
+            if topic:
+                reply.append(f":mock.server 332 {nickname} {channel} :{topic}\r\n".encode('utf-8'))
+            else:
+                reply.append(f":mock.server 331 {nickname} {channel} :No hay tema establecido\r\n".encode('utf-8'))
+        ssl_socket.sendall(b"".join(reply))
+
+    @commands.register("MODE", min_params=2)
+    def _cmd_mode(self, session, data):
+        ssl_socket = session.socket
+        nickname = session.nickname
+
+        parts = data.split()
+        target = parts[1]
+        mode = parts[2]
+
+        # Modo aplicado a un usuario
+        if target in self.clients:
+            if mode == "+i":
+                if not self.clients[target].invisible:
+                    self._set_user_mode(target, "+i", True)
+                    ssl_socket.sendall(f":mock.server 221 {target} :Modo +i activado\r\n".encode('utf-8'))
+                    log.debug("%s ha activado el modo +i (invisible)", target)
+                else:
+                    ssl_socket.sendall(f":mock.server 443 {target} :El modo ya está activado\r\n".encode('utf-8'))
+            elif mode == "-i":
+                if self.clients[target].invisible:
+                    self._set_user_mode(target, "+i", False)
+                    ssl_socket.sendall(f":mock.server 221 {target} :Modo +i desactivado\r\n".encode('utf-8'))
+                    log.debug("%s ha desactivado el modo +i (invisible)", target)
+                else:
+                    ssl_socket.sendall(f":mock.server 442 {target} :El modo no estaba activado\r\n".encode('utf-8'))
+
+        elif target in self.channels:
+            if len(parts) < 4:
+                ssl_socket.sendall(f":mock.server 461 {nickname} MODE :Faltan parámetros\r\n".encode('utf-8'))
+                return
+
+            target = parts[1]
+            mode = parts[2]
+            target_user = parts[3]  # Nombre de usuario (puede incluir "_")
+
+            # Modo aplicado a un canal
+            if target in self.channels:
+                channel = target
+
+                # Verificar si el usuario que ejecuta el comando es operador
+                if not self._is_operator(channel, nickname):
+                    error_msg = f":mock.server 482 {nickname} {channel} :No tienes permisos para cambiar modos\r\n"
+                    ssl_socket.sendall(error_msg.encode('utf-8'))
+                    return
+
+                # Manejar +o (promover a operador)
+                if mode == "+o":
+                    if target_user not in self.channels[channel].users:
+                        error_msg = f":mock.server 441 {target_user} {channel} :El usuario no está en el canal\r\n"
+                        ssl_socket.sendall(error_msg.encode('utf-8'))
+                    elif self._is_operator(channel, target_user):
+                        error_msg = f":mock.server 443 {channel} {target_user} :Ya es operador\r\n"
+                        ssl_socket.sendall(error_msg.encode('utf-8'))
+                    else:
+                        self._set_prefix(channel, target_user, "@", by=nickname)
+                        # Notificar a TODOS en el canal
+                        message = f":{nickname}!{self.clients[nickname].username}@mock.server MODE {channel} +o {target_user}\r\n"
+                        self._broadcast(channel, message)
+
+                # Manejar -o (quitar operador)
+                elif mode == "-o":
+                    if not self._is_operator(channel, target_user):
+                        error_msg = f":mock.server 441 {channel} {target_user} :El usuario no era operador\r\n"
+                        ssl_socket.sendall(error_msg.encode('utf-8'))
+                    else:
+                        self._set_prefix(channel, target_user, "", by=nickname)
+                        # Notificar a TODOS en el canal
+                        message = f":{nickname}!{self.clients[nickname].username}@mock.server MODE {channel} -o {target_user}\r\n"
+                        self._broadcast(channel, message)
+
+    @commands.register("PART", min_params=1)
+    def _cmd_part(self, session, data):
+        ssl_socket = session.socket
+        nickname = session.nickname
+
+        parts = data.split()
+        channels = self._targets(session, "PART", parts[1])
+        if channels is None:
+            return
+
+        for channel in channels:
+            if channel in self.channels and nickname in self.channels[channel].users:
+                # Notificar a todos en el canal
+                self._broadcast(channel, f":{nickname}!{self.clients[nickname].username}@mock.server PART {channel}\r\n")
+
+                # Eliminar al usuario del canal (y el canal si queda vacío)
+                self._remove_member(channel, nickname)
+
+            else:
+                ssl_socket.sendall(f":mock.server 442 {nickname} {channel} :No estás en el canal\r\n".encode('utf-8'))
+
+    @commands.register("TOPIC", min_params=1)
+    def _cmd_topic(self, session, data):
+        ssl_socket = session.socket
+        nickname = session.nickname
+
+        parts = data.split(' ', 2)  # Dividir en máximo 3 partes
+        channel = parts[1]
+        if channel not in self.channels:
+            ssl_socket.sendall(f":mock.server 403 {nickname} {channel} :No existe el canal\r\n".encode('utf-8'))
+            return
+
+        # Consulta del tema actual
+        if len(parts) == 2:
+            topic = self.channels[channel].topic
+            if topic:
+                ssl_socket.sendall(f":mock.server 332 {nickname} {channel} :{topic}\r\n".encode('utf-8'))
+            else:
+                ssl_socket.sendall(f":mock.server 331 {nickname} {channel} :No hay tema establecido\r\n".encode('utf-8'))
+            return
+
+        # Establecer o eliminar tema
+        new_topic = parts[2].strip()
+        if not self._is_operator(channel, nickname):
+            ssl_socket.sendall(f":mock.server 482 {channel} :No tienes permisos para cambiar el tema\r\n".encode('utf-8'))
+            return
+
+        if new_topic == ":":
+            self._set_topic(channel, None, by=nickname)
+            # Notificar a todos en el canal
+            self._broadcast(channel, f":{nickname}!{self.clients[nickname].username}@mock.server TOPIC {channel} :\r\n")
+            ssl_socket.sendall(f":mock.server 331 {nickname} {channel} :Tema eliminado\r\n".encode('utf-8'))
+        else:
+            self._set_topic(channel, new_topic.lstrip(':'), by=nickname)
+            # Notificar a todos en el canal
+            self._broadcast(channel, f":{nickname}!{self.clients[nickname].username}@mock.server TOPIC {channel} :{new_topic.lstrip(':')}\r\n")
+            ssl_socket.sendall(f":mock.server 332 {nickname} {channel} :{new_topic.lstrip(':')}\r\n".encode('utf-8'))
+
+    @commands.register("KICK", min_params=2)
+    def _cmd_kick(self, session, data):
+        ssl_socket = session.socket
+        nickname = session.nickname
+
+        parts = data.split(' ', 3)
+        channel = parts[1]
+        target = parts[2]
+        reason = parts[3][1:] if len(parts) > 3 else "Expulsado por un operador"
+
+        if channel not in self.channels:
+            ssl_socket.sendall(f":mock.server 403 {nickname} {channel} :No existe el canal\r\n".encode('utf-8'))
+            return
+
+        if not self._is_operator(channel, nickname):
+            ssl_socket.sendall(f":mock.server 482 {channel} :No tienes permisos para expulsar usuarios\r\n".encode('utf-8'))
+            return
+
+        if target not in self.channels[channel].users:
+            ssl_socket.sendall(f":mock.server 441 {nickname} {target} :El usuario no está en el canal\r\n".encode('utf-8'))
+            return
+
+        # Notificar al expulsado y al canal
+        kick_message = f":{nickname}!{self.clients[nickname].username}@mock.server KICK {channel} {target} :{reason}\r\n"
+        self._broadcast(channel, kick_message)
+
+        # Eliminar al usuario del canal
+        self._remove_member(channel, target, by=nickname)
+
+    @commands.register("INVITE", min_params=2)
+    def _cmd_invite(self, session, data):
+        ssl_socket = session.socket
+        nickname = session.nickname
+
+        parts = data.split()
+        target = parts[1]
+        channel = parts[2]
+
+        if channel not in self.channels:
+            ssl_socket.sendall(f":mock.server 403 {nickname} {channel} :No existe el canal\r\n".encode('utf-8'))
+            return
+
+        if target not in self.clients:
+            ssl_socket.sendall(f":mock.server 401 {nickname} {target} :El usuario no está conectado\r\n".encode('utf-8'))
+            return
+
+        # Enviar invitación al usuario
+        self.clients[target].socket.sendall(
+            f":{nickname}!{self.clients[nickname].username}@mock.server INVITE {target} :{channel}\r\n".encode('utf-8')
+        )
+        ssl_socket.sendall(f":mock.server 341 {nickname} {target} {channel} :Invitación enviada\r\n".encode('utf-8'))
+
+    @commands.register("WHOIS", min_params=1)
+    def _cmd_whois(self, session, data):
+        ssl_socket = session.socket
+        nickname = session.nickname
+
+        parts = data.split()
+        target = parts[1]
+        if target not in self.clients:
+            ssl_socket.sendall(f":mock.server 401 {nickname} {target} :El usuario no está conectado\r\n".encode('utf-8'))
+            return
+
+        # Obtener información del usuario
+        user_info = self.clients[target]
+        username = user_info.username
+        hostname = "127.0.0.1"  # Puedes cambiar esto por el host real del usuario
+        realname = user_info.realname
+        server_name = "mock.server"
+        idle_time = "0"  # Tiempo de inactividad (puedes implementar esto si es necesario)
+
+        # Enviar respuesta WHOISUSER (311)
+        ssl_socket.sendall(
+            f":mock.server 311 {nickname} {target} {username} {hostname} * :{realname}\r\n".encode('utf-8')
+        )
+
+        # Enviar canales del usuario (319 RPL_WHOISCHANNELS)
+        if user_info.channels:
+            channels_list = " ".join(
+                f"{self.channels[channel].users[target]}{channel}" for channel in user_info.channels
+            )
+            ssl_socket.sendall(
+                f":mock.server 319 {nickname} {target} :{channels_list}\r\n".encode('utf-8')
+            )
+
+        # Enviar respuesta WHOISSERVER (312)
+        ssl_socket.sendall(
+            f":mock.server 312 {nickname} {target} {server_name} :Información del servidor\r\n".encode('utf-8')
+        )
+
+        # Enviar respuesta WHOISIDLE (317)
+        ssl_socket.sendall(
+            f":mock.server 317 {nickname} {target} {idle_time} :Segundos inactivo\r\n".encode('utf-8')
+        )
+
+        # Enviar respuesta ENDOFWHOIS (318)
+        ssl_socket.sendall(
+            f":mock.server 318 {nickname} {target} :Fin de la lista WHOIS\r\n".encode('utf-8')
+        )
+
+    @commands.register("WHOWAS")
+    def _cmd_whowas(self, session, data):
+        ssl_socket = session.socket
+        nickname = session.nickname
+
+        parts = data.split()
+        if len(parts) < 2:
+            ssl_socket.sendall(f":mock.server 406 {nickname} :Faltan parámetros\r\n".encode('utf-8'))
+            return
+
+        target = parts[1]
+        entries = self.whowas.get(target, time.time())
+        if entries is None:
+            ssl_socket.sendall(f":mock.server 406 {nickname} {target} :No hay información histórica\r\n".encode('utf-8'))
+            return
+
+        # WHOWAS nick [count]: las count entradas más recientes (todas si falta o no es positivo)
+        count = None
+        if len(parts) > 2 and parts[2].lstrip("-").isdigit() and int(parts[2]) > 0:
+            count = int(parts[2])
+
+        # Se recorre el deque del historial sin copiarlo
+        for entry in islice(entries, count):
+            ssl_socket.sendall(
+                f":mock.server 314 {nickname} {entry.nickname} {entry.username} {entry.hostname} * :{entry.realname}\r\n".encode('utf-8')
+            )
+        ssl_socket.sendall(f":mock.server 369 {nickname} {target} :Fin de la lista WHOWAS\r\n".encode('utf-8'))
+
+    @commands.register("WHO")
+    def _cmd_who(self, session, data):
+        ssl_socket = session.socket
+        nickname = session.nickname
+
+        parts = data.split()
+        channel = parts[1] if len(parts) > 1 else None
+
+        # WHO sin parámetros: listar usuarios no invisibles en todo el servidor
+        if not channel:
+            rows = self._who_rows.get(self.state_version)
+            for block in self._numeric_rows(f":mock.server 352 {nickname}", rows):
+                ssl_socket.sendall(block)
+            ssl_socket.sendall(f":mock.server 315 {nickname} * :Fin de la lista WHO\r\n".encode('utf-8'))
+            return
+
+        # WHO para un canal específico
+        if channel not in self.channels:
+            ssl_socket.sendall(f":mock.server 403 {nickname} {channel} :No existe el canal\r\n".encode('utf-8'))
+            return
+
+        reply = []
+        users = self.channels[channel].users
+        for user in users:
+            if self.clients[user].invisible and nickname not in users:
+                continue  # Ocultar usuarios invisibles a extraños
+            username = self.clients[user].username
+            flags = "H" + self._member_prefix(users[user], session.caps)
+            reply.append(f":mock.server 352 {nickname} {channel} {username} {self.host} mock.server {user} {flags} :0 {self.clients[user].realname}\r\n".encode('utf-8'))
+        reply.append(f":mock.server 315 {nickname} {channel} :Fin de la lista WHO\r\n".encode('utf-8'))
+        self._send_batched(ssl_socket, reply)
+
+    @commands.register("NAMES")
+    def _cmd_names(self, session, data):
+        ssl_socket = session.socket
+        nickname = session.nickname
+
+        parts = data.split()
+        channel = parts[1] if len(parts) > 1 else "*"
+
+        if channel != "*" and channel not in self.channels:
+            ssl_socket.sendall(f":mock.server 403 {nickname} {channel} :No existe el canal\r\n".encode('utf-8'))
+            return
+
+        if channel == "*":
+            # Listar todos los usuarios visibles
+            users = self._visible_nicks.get(self.state_version)
+        else:
+            # Listar usuarios del canal con @ para operadores
+            caps = session.caps
+            users = [f"{self._member_prefix(prefix, caps)}{user}" for user, prefix in self.channels[channel].users.items()]
+
+        # Varias líneas 353 si los nicks no caben en una sola
+        head = f":mock.server 353 {nickname} = {channel} :"
+        groups = textwrap.wrap(" ".join(users), 510 - len(head), break_long_words=False, break_on_hyphens=False)
+        reply = [f"{head}{group}\r\n".encode('utf-8') for group in groups or [""]]
+        reply.append(f":mock.server 366 {nickname} {channel} :Fin de la lista NAMES\r\n".encode('utf-8'))
+        self._send_batched(ssl_socket, reply)
+
+    @commands.register("REJOIN", min_params=1)
+    def _cmd_rejoin(self, session, data):
+        ssl_socket = session.socket
+        nickname = session.nickname
+
+        parts = data.split()
+        channel = parts[1]
+        if channel in self.channels and nickname in self.channels[channel].users:
+            # Notificar al usuario
+            ssl_socket.sendall(f":mock.server 332 {nickname} {channel} :Reunión exitosa\r\n".encode('utf-8'))
+        else:
+            ssl_socket.sendall(f":mock.server 442 {nickname} {channel} :No estás en el canal\r\n".encode('utf-8'))
+
+    @commands.register("LIST")
+    def _cmd_list(self, session, data):
+        ssl_socket = session.socket
+        nickname = session.nickname
+
+        # Enviar lista de canales (renderizada una vez por versión del estado)
+        rows = self._list_rows.get(self.state_version)
+        for block in self._numeric_rows(f":mock.server 322 {nickname}", rows):
+            ssl_socket.sendall(block)
+        ssl_socket.sendall(f":mock.server 323 {nickname} :Fin de la lista\r\n".encode('utf-8'))
+
+    # --- Vistas para LIST, WHO y NAMES ---
+    # Cada fila guarda lo que sigue al nick del destinatario, ya codificado;
+    # _numeric_rows antepone ese prefijo con un join por bloque de envío.
+
+    def _build_list_rows(self):
+        clients = self.clients
+        for channel, details in self.channels.items():
+            visible = sum(1 for u in details.users if not clients[u].invisible)
+            yield f" {channel} {visible} :{details.topic or ''}\r\n".encode('utf-8')
+
+    def _build_who_rows(self):
+        for user, details in self.clients.items():
+            if not details.invisible:
+                flags = "H"  # H = Usuario disponible (no away)
+                yield f" * {details.username} {self.host} mock.server {user} {flags} :0 {details.realname}\r\n".encode('utf-8')
+
+    def _build_visible_nicks(self):
+        return (user for user, details in self.clients.items() if not details.invisible)
+
+    @staticmethod
+    def _member_prefix(prefix, caps):
+        """Prefijos de un miembro para NAMES/WHO: todos con multi-prefix, si no solo el mayor."""
+        return prefix if caps & CAP_MULTI_PREFIX else prefix[:1]
+
+    @staticmethod
+    def _numeric_rows(prefix, rows):
+        """
+        Une las filas de una vista, cada una tras prefix, en bloques de hasta
+        REPLY_BATCH_BYTES: una vista con miles de filas sale en varios envíos
+        acotados y no en uno del tamaño de toda la respuesta.
+        """
+        prefix = prefix.encode('utf-8')
+        start = size = 0
+        for index, row in enumerate(rows):
+            size += len(prefix) + len(row)
+            if size >= REPLY_BATCH_BYTES:
+                yield prefix + prefix.join(rows[start:index + 1])
+                start, size = index + 1, 0
+        if start < len(rows):
+            yield prefix + prefix.join(rows[start:])
+
+    @staticmethod
+    def _send_batched(sock, lines):
+        """Envía lines (bytes con CRLF) en bloques de hasta REPLY_BATCH_BYTES."""
+        batch, size = [], 0
+        for line in lines:
+            batch.append(line)
+            size += len(line)
+            if size >= REPLY_BATCH_BYTES:
+                sock.sendall(b"".join(batch))
+                batch, size = [], 0
+        if batch:
+            sock.sendall(b"".join(batch))
+
+    @commands.register("PRIVMSG", min_params=2)
+    def _cmd_privmsg(self, session, data):
+        ssl_socket = session.socket
+        nickname = session.nickname
+
+        parts = data.split(' ', 2)  # Dividir en 3 partes: PRIVMSG, destinos, message
+        targets = self._targets(session, "PRIVMSG", parts[1])
+        if targets is None:
+            return
+        raw_message = parts[2].strip()
+
+        # Eliminar el ":" inicial del mensaje si existe (solo el primero)
+        message = raw_message[1:] if raw_message.startswith(":") else raw_message
+
+        # Obtener username válido (ej. ~user si no está registrado)
+        username = self.clients[nickname].username
+
+        for target in targets:
+            # Mensaje a un canal
+            if target.startswith("#"):
+                if target in self.channels:
+                    # Formato IRC: :nick!user@host PRIVMSG #canal :mensaje
+                    full_message = f":{nickname}!{username}@mock.server PRIVMSG {target} :{message}\r\n"
+                    # Con echo-message el emisor recibe su propio mensaje (con las mismas tags)
+                    tags = message_tags()
+                    data = self._broadcast(target, full_message, skip=None if session.caps & CAP_ECHO_MESSAGE else nickname, tags=tags)
+                    self._record_history(target, nickname, data, tags)
+                    log.debug("Mensaje enviado a canal %s: %s", target, message)
+                else:
+                    ssl_socket.sendall(f":mock.server 403 {nickname} {target} :No existe el canal\r\n".encode('utf-8'))
+
+            # Mensaje privado a un usuario
+            else:
+                if target in self.clients:
+                    # Formato IRC: :nick!user@host PRIVMSG usuario :mensaje
+                    full_message = f":{nickname}!{username}@mock.server PRIVMSG {target} :{message}\r\n"
+                    tags = message_tags()
+                    data = self._fan_out(self._recipients(session, target), full_message, tags=tags)
+                    self._record_history(target, nickname, data, tags)
+                    log.debug("Mensaje enviado a usuario %s: %s", target, message)
+                else:
+                    ssl_socket.sendall(f":mock.server 401 {nickname} {target} :El usuario no está conectado\r\n".encode('utf-8'))
+
+    @staticmethod
+    def _recipients(session, target):
+        """Destinatarios de un mensaje privado: target y, con echo-message, el emisor."""
+        if session.caps & CAP_ECHO_MESSAGE and target != session.nickname:
+            return (target, session.nickname)
+        return (target,)
+
+    @commands.register("NOTICE", min_params=2)
+    def _cmd_notice(self, session, data):
+        nickname = session.nickname
+
+        parts = data.split(' ', 2)  # Divide en máximo 3 partes: NOTICE, destinos, message
+        targets = self._targets(session, "NOTICE", parts[1])
+        if targets is None:
+            return
+        message = parts[2][1:] if parts[2].startswith(":") else parts[2]  # Eliminar el ":" inicial si existe
+
+        for target in targets:
+            if target in self.clients:
+                # Formato IRC estándar: :nickname!username@host NOTICE usuario :mensaje
+                full_message = f":{nickname}!{self.clients[nickname].username}@mock.server NOTICE {target} :{message}\r\n"
+                tags = message_tags()
+                data = self._fan_out(self._recipients(session, target), full_message, tags=tags)
+                self._record_history(target, nickname, data, tags)
+                log.debug("Notificación enviada a %s: %s", target, message)
+
+    @commands.register("CHATHISTORY", min_params=4)
+    def _cmd_chathistory(self, session, data):
+        ssl_socket = session.socket
+        nickname = session.nickname
+
+        parts = data.split()
+        subcommand, target, reference, limit = parts[1].upper(), parts[2], parts[3], parts[4]
+
+        def fail(code, text):
+            ssl_socket.sendall(f":mock.server FAIL CHATHISTORY {code} {subcommand} :{text}\r\n".encode('utf-8'))
+
+        if subcommand not in ("LATEST", "BEFORE", "AFTER"):
+            fail("INVALID_PARAMS", "Subcomando no soportado")
+            return
+        # Referencia: "*" (solo LATEST), msgid=... o timestamp=...
+        kind, _, value = reference.partition("=")
+        try:
+            if reference == "*" and subcommand == "LATEST":
+                reference = None
+            elif kind == "msgid" and value:
+                reference = (kind, value)
+            elif kind == "timestamp":
+                reference = (kind, parse_server_time(value))
+            else:
+                raise ValueError(reference)
+            limit = min(int(limit), CHATHISTORY_MAX)
+        except ValueError:
+            fail("INVALID_PARAMS", "Referencia o límite inválido")
+            return
+
+        if target.startswith("#") and (target not in self.channels or nickname not in self.channels[target].users):
+            fail("INVALID_TARGET", "No estás en el canal")
+            return
+
+        buffer = self.history.get(ChatHistory.key(target, nickname))
+        entries = (buffer.select(subcommand, reference, limit) if buffer is not None and limit > 0 else None) or []
+
+        # Toda la respuesta en una sola escritura; dentro de un BATCH si el cliente
+        # lo negoció y, si no, seguida de un NOTICE que marca el final (aunque no
+        # haya mensajes, el cliente sabe que el comando terminó)
+        caps = session.caps
+        if caps & CAP_BATCH:
+            ref = new_batch_ref()
+            ssl_socket.sendall(batch_start(ref, "chathistory", target) + replay(entries, caps, ref) + batch_end(ref))
+        else:
+            end = f":mock.server NOTICE {nickname} :*** Fin del historial de {target} ({len(entries)} mensajes)\r\n"
+            ssl_socket.sendall(replay(entries, caps) + end.encode('utf-8'))
+
+    @commands.register("VERSION", needs_registration=False)
+    def _cmd_version(self, session, data):
+        ssl_socket = session.socket
+        nickname = session.nickname
+
+        version_response = (
+            f":mock.server 351 {nickname} mock.irc.server-1.0 mock.server :Python IRC Server\r\n"
+        )
+        ssl_socket.sendall(version_response.encode("utf-8"))
+
+    @commands.register("SERVER", min_params=1, needs_registration=False)
+    def _cmd_server(self, session, data):
+        # Un servidor que se enlaza con nosotros se presenta con SERVER en lugar de NICK
+        if session.nickname is not None:
+            session.socket.sendall(":mock.server 462 * :Ya estás registrado como cliente\r\n".encode('utf-8'))
+            return
+        if not self.network.authorized(session):
+            log.warning("Enlace rechazado desde %s: sin contraseña válida ni dirección permitida", session.addr)
+            session.socket.sendall(b"ERROR :Closing Link: enlace no autorizado\r\n")
+            return False
+        if not self.network.accept(session, data.split(" ", 1)[1]):
+            return False
+
+    @commands.register("CONNECT", min_params=2)
+    def _cmd_connect(self, session, data):
+        ssl_socket = session.socket
+        nickname = session.nickname
+
+        if not self._require_operator(session):
+            return
+
+        parts = data.split()
+        host, port = parts[1], parts[2]
+        if not port.isdigit():
+            ssl_socket.sendall(f":mock.server NOTICE {nickname} :*** Puerto inválido: {port}\r\n".encode('utf-8'))
+            return
+
+        def failed(error):
+            ssl_socket.sendall(f":mock.server NOTICE {nickname} :*** No se pudo conectar a {host}:{port}: {error}\r\n".encode('utf-8'))
+
+        # La conexión TCP se abre en otro hilo para no detener el servidor
+        self.network.connect(host, int(port), on_error=failed)
+        ssl_socket.sendall(f":mock.server NOTICE {nickname} :*** Conectando a {host}:{port}\r\n".encode('utf-8'))
+
+    @commands.register("LINKS")
+    def _cmd_links(self, session, data):
+        ssl_socket = session.socket
+        nickname = session.nickname
+        network = self.network
+
+        # 364 RPL_LINKS: <servidor> <uplink> :<saltos> <información>
+        lines = [f":mock.server 364 {nickname} {network.name} {network.name} :0 {network.info}\r\n"]
+        for name, info in sorted(network.servers.items(), key=lambda item: item[1]["hops"]):
+            lines.append(f":mock.server 364 {nickname} {name} {info['uplink']} :{info['hops']} {info['info']}\r\n")
+        lines.append(f":mock.server 365 {nickname} * :Fin de la lista LINKS\r\n")
+        ssl_socket.sendall("".join(lines).encode('utf-8'))
+
+    @commands.register("SQUIT", min_params=1)
+    def _cmd_squit(self, session, data):
+        ssl_socket = session.socket
+        nickname = session.nickname
+
+        if not self._require_operator(session):
+            return
+
+        parts = data.split(' ', 2)
+        target = parts[1]
+        comment = parts[2].lstrip(':') if len(parts) > 2 else f"SQUIT de {nickname}"
+        if not self.network.squit(target, comment):
+            ssl_socket.sendall(f":mock.server 402 {nickname} {target} :No existe el servidor\r\n".encode('utf-8'))
+
+    @commands.register("CAP", needs_registration=False)
+    def _cmd_cap(self, session, data):
+        ssl_socket = session.socket
+
+        target = session.nickname or "*"
+
+        parts = data.split(" ", 2)
+        subcommand = parts[1].upper() if len(parts) > 1 else ""
+        argument = parts[2].lstrip(":") if len(parts) > 2 else ""
+        client = self.clients.get(session.nickname)
+        if subcommand in ("LS", "REQ") and (client is None or client.username is None):
+            # Negociación antes del registro: la bienvenida espera al CAP END
+            session.cap_negotiating = True
+
+        if subcommand == "LS":
+            ssl_socket.sendall(f":mock.server CAP {target} LS :{' '.join(CAPABILITIES)}\r\n".encode('utf-8'))
+        elif subcommand == "LIST":
+            ssl_socket.sendall(f":mock.server CAP {target} LIST :{cap_names(session.caps)}\r\n".encode('utf-8'))
+        elif subcommand == "REQ":
+            # Se aceptan todas las capacidades pedidas o ninguna
+            request = parse_cap_request(argument)
+            if request is None:
+                ssl_socket.sendall(f":mock.server CAP {target} NAK :{argument}\r\n".encode('utf-8'))
+                return
+            enable, disable = request
+            session.caps = (session.caps | enable) & ~disable
+            if client is not None and client.socket is ssl_socket:
+                client.caps = session.caps
+            if session.caps & (CAP_MESSAGE_TAGS | CAP_LABELED_RESPONSE) and session.framer.max_line < TAGGED_MAX_LINE:
+                # El cliente puede enviar tags (label, +draft/...) delante de una línea de 512
+                session.framer.resize(TAGGED_MAX_LINE)
+            ssl_socket.sendall(f":mock.server CAP {target} ACK :{argument}\r\n".encode('utf-8'))
+        elif subcommand == "END":
+            if session.cap_negotiating:
+                session.cap_negotiating = False
+                if session.nickname in self.clients and ssl_socket in self.pending_users:
+                    self._complete_registration(session.nickname, ssl_socket)
+        else:
+            ssl_socket.sendall(f":mock.server 410 * {subcommand} :Subcomando CAP inválido\r\n".encode('utf-8'))
+
+    @commands.register("STATS", min_params=1, needs_registration=False)
+    def _cmd_stats(self, session, data):
+        ssl_socket = session.socket
+        nickname = session.nickname
+
+        parts = data.split()
+        query = parts[1].upper()
+        if query == "L":  # Ejemplo: Estadísticas de conexiones
+            stats_msg = (
+                f":mock.server 211 {nickname} mock.server :Estadísticas del servidor\r\n"
+                f":mock.server 251 {nickname} :Usuarios conectados: {len(self.clients)}\r\n"
+                f":mock.server 255 {nickname} :Canales activos: {len(self.channels)}\r\n"
+            )
+            ssl_socket.sendall(stats_msg.encode("utf-8"))
+        elif query in ("M", "P", "T", "U"):
+            ssl_socket.sendall(self._stats_metrics(nickname, query).encode("utf-8"))
+        else:
+            error_msg = f":mock.server 219 {nickname} {query} :Tipo de STATS no soportado\r\n"
+            ssl_socket.sendall(error_msg.encode("utf-8"))
+
+        end_msg = f":mock.server 219 {nickname} {query} :Fin de STATS\r\n"
+        ssl_socket.sendall(end_msg.encode("utf-8"))
+
+    def _stats_metrics(self, nickname, query):
+        """
+        Respuestas de STATS a partir de las métricas del servidor:
+        M (uso de comandos), P (latencia por comando), T (tráfico y colas
+        de salida) y U (tiempo en marcha).
+        """
+        snap = self.metrics.snapshot(self)
+        uptime = snap["uptime"]
+        lines = []
+        if query == "M":
+            for verb, (count, size, _) in sorted(snap["commands"].items()):
+                lines.append(f":mock.server 212 {nickname} {verb} {count} {size} 0")
+        elif query == "P":
+            for verb, hist in sorted(snap["latency"].items()):
+                lines.append(
+                    f":mock.server 249 {nickname} P :{verb} {hist.count / uptime:.2f}/s "
+                    f"p50<={hist.quantile(0.5) * 1000:g}ms p99<={hist.quantile(0.99) * 1000:g}ms "
+                    f"media={hist.sum / hist.count * 1000:.3f}ms"
+                )
+        elif query == "T":
+            fanout = snap["fanout"]
+            lines += [
+                f":mock.server 249 {nickname} T :Bytes recibidos {snap['bytes_in']} enviados {snap['bytes_out']}",
+                f":mock.server 249 {nickname} T :Difusiones {fanout.count} destinatarios media "
+                f"{fanout.sum / fanout.count if fanout.count else 0:.1f} p99<={fanout.quantile(0.99)}",
+                f":mock.server 249 {nickname} T :SendQ total {snap['sendq_total']} máxima {snap['sendq_max']} "
+                f"excedidas {snap['sendq_exceeded']}",
+                f":mock.server 249 {nickname} T :Escrituras al socket {snap['socket_writes']}",
+            ]
+            for verb, (count, _, chunks) in sorted(snap["commands"].items()):
+                lines.append(
+                    f":mock.server 249 {nickname} T :{verb} envíos agrupados/comando {chunks / count:.2f}"
+                )
+        else:
+            seconds = int(uptime)
+            lines.append(
+                f":mock.server 242 {nickname} :Server Up {seconds // 86400} days "
+                f"{seconds % 86400 // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+            )
+        return "".join(line + "\r\n" for line in lines)
+
+    @commands.register("PING", min_params=1, needs_registration=False)
+    def _cmd_ping(self, session, data):
+        ssl_socket = session.socket
+        nickname = session.nickname
+
+        server_name = data.split()[1]
+        ssl_socket.sendall(f"PONG {server_name}\r\n".encode('utf-8'))
+        log.debug("PING recibido, PONG enviado a %s", nickname)
+
+    @commands.register("PONG", needs_registration=False)
+    def _cmd_pong(self, session, data):
+        nickname = session.nickname
+
+        log.debug("PONG recibido de %s", nickname)
+        if nickname in self.clients:
+            parts = data.split(":", 1)
+            if len(parts) >= 2:
+                received_token = parts[1].strip()
+                stored_token = self.clients[nickname].ping_token or ""
+                if received_token == stored_token:
+                    self.clients[nickname].last_pong = time.time()
+                    log.debug("PONG válido de %s", nickname)
+                else:
+                    log.debug("Token inválido de %s", nickname)
+
+    @commands.register("QUIT", needs_registration=False)
+    def _cmd_quit(self, session, data):
+        ssl_socket = session.socket
+        nickname = session.nickname
+
+        reason = data.split(":", 1)[1] if ":" in data else "Desconexión voluntaria"
+        log.info("%s se ha desconectado: %s", nickname, reason)
+        ssl_socket.sendall(f":mock.server 221 {nickname} QUIT :{reason}\r\n".encode('utf-8'))
+
+        if nickname in self.clients:
+            # Guardar en WHOWAS
+            self._remember_whowas(nickname)
+
+            # Eliminar al usuario y avisar una vez a cada usuario que compartía canal con él
+            quit_message = f":{nickname} QUIT :{reason}\r\n".encode('utf-8')
+            self._fan_out(self._remove_client(nickname), quit_message)
+        return False
 
     def stop(self):
         """
         Detiene el servidor.
         """
         self.running = False
-        if self.server_socket:
-            self.server_socket.close()
-        print("[SERVER] Servidor detenido correctamente.")
+        self._close_listeners()
+        self._stop_metrics()
+        log.info("Servidor detenido correctamente.")
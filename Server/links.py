@@ -0,0 +1,549 @@
+# Server.links.py
+
+import hmac
+import socket
+from threading import Thread
+
+from Common.framing import ByteFramer
+from Common.irc_protocol import format_tags, parse_tags
+from Server.sendq import QueuedSocket
+from Server.server_log import log
+from Server.records import USER_MODES, mode_names
+
+SPLIT = "split"     # Origen de los cambios por caída de un enlace: no se propagan
+LINK_TIMEOUT = 5    # Segundos máximos para abrir la conexión de un CONNECT
+LINK_MAX_LINE = 64 * 1024  # Límite de línea entre servidores (FANOUT lleva listas de nicks)
+
+
+def _split_params(line):
+    """
+    Separa una línea entre servidores en (origen, verbo, parámetros).
+
+    El último parámetro puede ir tras " :" y contener espacios.
+    """
+    source = None
+    if line.startswith(":"):
+        source, _, line = line[1:].partition(" ")
+    line, sep, trailing = line.partition(" :")
+    params = line.split()
+    if sep:
+        params.append(trailing)
+    if not params:
+        return source, None, []
+    return source, params[0].upper(), params[1:]
+
+
+def _with_source(source, line):
+    """Antepone ":source " a line si hay origen."""
+    return line if source is None else f":{source} {line}"
+
+
+def _nick_groups(nicks, budget):
+    """Une los nicks con comas en grupos de como mucho budget caracteres."""
+    group, size = [], 0
+    for nick in nicks:
+        if group and size + len(nick) + 1 > budget:
+            yield ",".join(group)
+            group, size = [], 0
+        group.append(nick)
+        size += len(nick) + 1
+    if group:
+        yield ",".join(group)
+
+
+class ServerLink:
+    """Conexión directa con un servidor vecino del árbol."""
+    def __init__(self, sock, outgoing):
+        self.socket = sock        # Interfaz sendall/close (cola de salida propia)
+        self.outgoing = outgoing  # True si el enlace lo abrió este servidor (CONNECT)
+        self.name = None          # Nombre del vecino, conocido tras su SERVER
+
+    def send(self, line):
+        self.socket.sendall(f"{line}\r\n".encode("utf-8"))
+
+    def send_bytes(self, data):
+        self.socket.sendall(data)
+
+
+class LinkSocket:
+    """
+    Socket de un usuario conectado a otro servidor de la red.
+
+    Lo que se le envía viaja por el enlace hacia su servidor (siguiente salto
+    del árbol), que lo entrega o lo reenvía.
+    """
+    def __init__(self, link, nick, server):
+        self.link = link
+        self.nick = nick
+        self.server = server  # Servidor donde está conectado el usuario
+
+    def sendall(self, data):
+        header = f"DELIVER {self.nick} :".encode("utf-8")
+        for line in data.split(b"\r\n"):
+            if line:
+                self.link.send_bytes(header + line + b"\r\n")
+
+    def shutdown(self, how):
+        pass  # La conexión la cierra su servidor
+
+    def close(self):
+        pass
+
+
+class ServerNetwork:
+    """
+    Enlaces de este servidor con otros formando un árbol de expansión.
+
+    Cada servidor guarda una réplica de todos los usuarios y canales de la
+    red; los usuarios remotos aparecen en `clients` con un LinkSocket. Los
+    cambios de estado viajan como eventos por el árbol (cada servidor los
+    aplica y los reenvía por sus demás enlaces) y los mensajes a canales se
+    envían una vez por enlace, solo a los enlaces que tienen destinatarios.
+    Al enlazar, cada lado envía al otro su estado completo (burst).
+    """
+    def __init__(self, server, name="mock.server", info="Servidor IRC de prueba"):
+        self.server = server
+        self.name = name
+        self.info = info
+        self.links = {}    # {nombre del vecino: ServerLink}
+        self.password = None        # Contraseña de enlace: PASS antes de SERVER (y la que se envía al conectar)
+        self.allowed_peers = set()  # Direcciones IP de servidores aceptados sin contraseña
+        self.servers = {}  # {nombre: {"hops", "uplink", "info", "link"}} de los servidores remotos
+        self.handlers = {
+            "SERVER": self._on_server,
+            "SQUIT": self._on_squit,
+            "UID": self._on_uid,
+            "USER": self._on_user,
+            "NICK": self._on_nick,
+            "QUIT": self._on_quit,
+            "WHOWAS": self._on_whowas,
+            "KILL": self._on_kill,
+            "JOIN": self._on_join,
+            "PART": self._on_part,
+            "PREFIX": self._on_prefix,
+            "TOPIC": self._on_topic,
+            "UMODE": self._on_umode,
+            "DELIVER": self._on_deliver,
+            "FANOUT": self._on_fanout,
+            "PING": self._on_ping,
+            "PONG": lambda link, source, params: None,
+            "ERROR": self._on_error,
+        }
+
+    # --- Establecer y cerrar enlaces ---
+
+    def connect(self, host, port, on_error=None):
+        """
+        Abre un enlace con el servidor en host:port (comando CONNECT).
+
+        La conexión se abre en un hilo propio; si falla, se llama a
+        on_error(excepción) en el hilo del servidor. El burst se envía
+        cuando el otro lado responde con su SERVER.
+        """
+        Thread(target=self._run_outgoing, args=(host, port, on_error), daemon=True).start()
+
+    def _run_outgoing(self, host, port, on_error):
+        # Los enlaces entrantes se leen como cualquier cliente; los salientes, aquí
+        try:
+            sock = socket.create_connection((host, port), timeout=LINK_TIMEOUT)
+        except OSError as e:
+            log.warning("No se pudo conectar a %s:%s: %s", host, port, e)
+            if on_error is not None:
+                self.server._call_in_server(on_error, e)
+            return
+        sock.settimeout(None)
+        link = ServerLink(QueuedSocket(sock, self.server.max_sendq), outgoing=True)
+        if self.password is not None:
+            link.send(f"PASS :{self.password}")
+        link.send(f"SERVER {self.name} 1 :{self.info}")
+        framer = ByteFramer(LINK_MAX_LINE)
+        try:
+            while framer.recv_into(sock):
+                for raw in framer.lines():
+                    line = str(raw, "utf-8", "ignore").strip()
+                    if line:
+                        self.server._call_in_server(self.on_line, link, line)
+        except OSError:
+            pass
+        self.server._call_in_server(self.drop, link, "Conexión cerrada")
+
+    def authorized(self, session):
+        """
+        Indica si la conexión puede enlazarse como servidor.
+
+        Debe haber enviado la contraseña de enlace con PASS o venir de una
+        dirección de allowed_peers; sin ninguna de las dos configurada no se
+        acepta ningún enlace entrante.
+        """
+        if self.password is not None and session.password is not None:
+            if hmac.compare_digest(session.password.encode("utf-8"), self.password.encode("utf-8")):
+                return True
+        return bool(session.addr) and session.addr[0] in self.allowed_peers
+
+    def accept(self, session, params):
+        """
+        Convierte la sesión de un cliente que envió SERVER (ya autorizada) en un enlace.
+
+        Returns:
+            bool: False si el saludo no se aceptó (la conexión debe cerrarse).
+        """
+        link = ServerLink(session.socket, outgoing=False)
+        session.link = link
+        session.framer.resize(LINK_MAX_LINE)  # Lo que sigue al SERVER ya es tráfico entre servidores
+        self.on_line(link, "SERVER " + params)
+        return link.name is not None
+
+    def drop(self, link, reason):
+        """Cierra un enlace y da de baja a los servidores y usuarios que había detrás."""
+        if link.name is None or self.links.get(link.name) is not link:
+            link.socket.close()
+            return
+        del self.links[link.name]
+        link.socket.close()
+        log.info("Enlace con %s cerrado: %s", link.name, reason)
+        self._split(link.name, reason)
+        self.propagate(("SQUIT", link.name, reason), link)
+
+    def squit(self, name, reason):
+        """
+        Corta el enlace con el servidor `name` (comando SQUIT).
+
+        Si no es un vecino directo, el pedido viaja por el árbol hasta el
+        servidor que sí lo es.
+
+        Returns:
+            bool: False si el servidor no forma parte de la red.
+        """
+        if name in self.links:
+            self.drop(self.links[name], reason)
+            return True
+        if name in self.servers:
+            self.servers[name]["link"].send(f"SQUIT {name} :{reason}")
+            return True
+        return False
+
+    # --- Propagación de cambios locales ---
+
+    def propagate(self, event, origin=None):
+        """
+        Reenvía un evento de estado por todos los enlaces salvo el de origen.
+
+        `origin` es el enlace por el que llegó el cambio (None si es local);
+        SPLIT indica un cambio provocado por la caída de un enlace, que cada
+        servidor deduce por su cuenta a partir del SQUIT.
+        """
+        if not self.links or origin is SPLIT:
+            return
+        line = self._encode(event)
+        for link in list(self.links.values()):
+            if link is not origin:
+                link.send(line)
+
+    def _encode(self, event):
+        kind = event[0]
+        if kind == "UID":
+            _, nick, hostname = event
+            sock = self.server.clients[nick].socket
+            owner = sock.server if isinstance(sock, LinkSocket) else self.name
+            return f":{owner} UID {nick} {hostname}"
+        if kind == "USER":
+            _, nick, username, realname = event
+            return f"USER {nick} {username} :{realname}"
+        if kind == "JOIN":
+            _, channel, nick, prefix = event
+            return f"JOIN {channel} {nick} {prefix or '-'}"
+        # PREFIX, PART y TOPIC llevan como origen al usuario que hizo el cambio
+        # (None si no lo hizo nadie en particular, p. ej. el TOPIC del burst)
+        if kind == "PREFIX":
+            _, channel, nick, prefix, by = event
+            return _with_source(by, f"PREFIX {channel} {nick} {prefix or '-'}")
+        if kind == "PART":
+            _, channel, nick, by = event
+            return _with_source(by, f"PART {channel} {nick}")
+        if kind == "TOPIC":
+            _, channel, topic, by = event
+            return _with_source(by, f"TOPIC {channel}" if topic is None else f"TOPIC {channel} :{topic}")
+        if kind == "UMODE":
+            _, nick, mode, enabled = event
+            return f"UMODE {nick} {mode} {int(enabled)}"
+        if kind == "SQUIT":
+            return f"SQUIT {event[1]} :{event[2]}"
+        return " ".join(event)
+
+    def fan_out(self, nicks, data, skip=None, tags=None):
+        """
+        Entrega data a los usuarios locales y, para cada enlace con
+        destinatarios, un único FANOUT con la lista de los que hay detrás.
+
+        Las tags del mensaje (time, msgid) viajan en el FANOUT, de modo que
+        todos los servidores entregan las mismas.
+        """
+        clients = self.server.clients
+        local = []
+        remote = {}  # {enlace: [nicks]}
+        for nick in nicks:
+            if nick == skip:
+                continue
+            sock = clients[nick].socket
+            if isinstance(sock, LinkSocket):
+                remote.setdefault(sock.link, []).append(nick)
+            else:
+                local.append(nick)
+        self.server._deliver(local, data, tags=tags)
+        block = format_tags(tags)
+        head = f"FANOUT {{}} {block} :" if block else "FANOUT {} :"
+        for link, targets in remote.items():
+            for line in data.split(b"\r\n"):
+                if line:
+                    for group in _nick_groups(targets, LINK_MAX_LINE - len(line) - len(head)):
+                        link.send_bytes(head.format(group).encode("utf-8") + line + b"\r\n")
+
+    # --- Burst ---
+
+    def _burst(self, link):
+        """Envía al nuevo vecino todo lo que este servidor conoce de la red."""
+        server = self.server
+        # Servidores en orden de saltos, para que cada uno llegue después de su uplink
+        for name, info in sorted(self.servers.items(), key=lambda item: item[1]["hops"]):
+            if info["link"] is not link:
+                link.send(f":{info['uplink']} SERVER {name} {info['hops'] + 1} :{info['info']}")
+        for nick, client in list(server.clients.items()):
+            sock = client.socket
+            if isinstance(sock, LinkSocket) and sock.link is link:
+                continue
+            link.send(self._encode(("UID", nick, client.hostname)))
+            if client.username is not None:
+                link.send(self._encode(("USER", nick, client.username, client.realname)))
+            for mode in mode_names(client.modes, USER_MODES):
+                link.send(self._encode(("UMODE", nick, mode, True)))
+        for channel, details in list(server.channels.items()):
+            for nick, prefix in details.users.items():
+                sock = server.clients[nick].socket
+                if not (isinstance(sock, LinkSocket) and sock.link is link):
+                    link.send(self._encode(("JOIN", channel, nick, prefix)))
+            if details.topic is not None:
+                link.send(self._encode(("TOPIC", channel, details.topic, None)))
+
+    # --- Líneas recibidas de un enlace ---
+
+    def on_line(self, link, line):
+        source, verb, params = _split_params(line)
+        handler = self.handlers.get(verb)
+        if handler is None:
+            log.warning("Línea desconocida del enlace %s: %s", link.name, line)
+            return
+        if link.name is None and verb not in ("SERVER", "ERROR"):
+            return  # Nada antes del saludo
+        try:
+            handler(link, source, params)
+        except (IndexError, KeyError, ValueError) as e:
+            log.error("Línea inválida del enlace %s (%s): %s", link.name, e, line)
+            if link.name is None:
+                # Saludo mal formado: no queda un enlace a medio registrar
+                link.send("ERROR :Closing Link: SERVER inválido")
+                link.socket.close()
+
+    def _behind(self, link, nick):
+        """Indica si nick es un usuario remoto alcanzable por link."""
+        client = self.server.clients.get(nick)
+        return client is not None and isinstance(client.socket, LinkSocket) and client.socket.link is link
+
+    def _op_behind(self, link, nick, channel):
+        """Indica si nick está detrás de link y es operador de channel (puede cambiarlo)."""
+        return self._behind(link, nick) and self.server._is_operator(channel, nick)
+
+    def _kill_local(self, nick, reason):
+        """Desconecta a un usuario de este servidor (colisión de nick)."""
+        sock = self.server.clients[nick].socket
+        sock.sendall(f"ERROR :Closing Link: {nick} (Killed: {reason})\r\n".encode("utf-8"))
+        self.server._disconnect_client(nick, reason)
+
+    def _quit_remote(self, nick, reason, link):
+        """Da de baja la réplica de un usuario detrás de link y avisa a los locales."""
+        server = self.server
+        client = server.clients[nick]
+        peers = server._remove_client(nick, origin=link)
+        local = [peer for peer in peers if not isinstance(server.clients[peer].socket, LinkSocket)]
+        server._fan_out(local, f":{nick}!{client.username}@mock.server QUIT :{reason}\r\n")
+
+    def _on_server(self, link, source, params):
+        name, hops, info = params[0], int(params[1]), params[2] if len(params) > 2 else ""
+        if name == self.name or name in self.servers:
+            # Ya está en la red: aceptarlo cerraría un ciclo en el árbol
+            link.send(f"ERROR :El servidor {name} ya está enlazado")
+            if link.name is None:
+                link.socket.close()
+            return
+
+        if link.name is None:
+            # Saludo de un vecino nuevo
+            link.name = name
+            self.links[name] = link
+            self.servers[name] = {"hops": 1, "uplink": self.name, "info": info, "link": link}
+            if not link.outgoing:
+                link.send(f"SERVER {self.name} 1 :{self.info}")
+            log.info("Enlace establecido con %s", name)
+            self._burst(link)
+            intro = f":{self.name} SERVER {name} 2 :{info}"
+        else:
+            # Servidor detrás del vecino
+            self.servers[name] = {"hops": hops, "uplink": source or link.name, "info": info, "link": link}
+            intro = f":{source or link.name} SERVER {name} {hops + 1} :{info}"
+        for other in list(self.links.values()):
+            if other is not link:
+                other.send(intro)
+
+    def _on_squit(self, link, source, params):
+        name, reason = params[0], params[1] if len(params) > 1 else ""
+        info = self.servers.get(name)
+        if info is None:
+            return
+        if info["link"] is not link:
+            # Pedido de cortar un enlace que está de nuestro lado del árbol
+            self.squit(name, reason)
+            return
+        self._split(name, reason)
+        self.propagate(("SQUIT", name, reason), link)
+
+    def _split(self, name, reason):
+        """Da de baja a name, los servidores detrás de él y sus usuarios."""
+        info = self.servers.get(name)
+        uplink = info["uplink"] if info else self.name
+        lost = {name}
+        changed = True
+        while changed:
+            changed = False
+            for other, info in self.servers.items():
+                if other not in lost and info["uplink"] in lost:
+                    lost.add(other)
+                    changed = True
+        for other in lost:
+            self.servers.pop(other, None)
+
+        server = self.server
+        quit_reason = f"{uplink} {name}"  # Formato habitual de un netsplit
+        for nick, client in list(server.clients.items()):
+            sock = client.socket
+            if isinstance(sock, LinkSocket) and sock.server in lost:
+                peers = server._remove_client(nick, origin=SPLIT)
+                local = [peer for peer in peers if not isinstance(server.clients[peer].socket, LinkSocket)]
+                server._fan_out(local, f":{nick}!{client.username}@mock.server QUIT :{quit_reason}\r\n")
+        log.info("Se separaron de la red %s servidores (%s): %s", len(lost), name, reason)
+
+    def _on_uid(self, link, source, params):
+        nick, hostname = params[0], params[1]
+        server = self.server
+        if nick in server.clients:
+            # Colisión: como en RFC 1459, se expulsa a los dos usuarios. Cada
+            # servidor desconecta al suyo (el otro lado ve nuestro UID y hace lo
+            # mismo) y el QUIT resultante se propaga como cualquier otro
+            if not isinstance(server.clients[nick].socket, LinkSocket):
+                self._kill_local(nick, "Colisión de nick")
+            return
+        server._add_client(nick, LinkSocket(link, nick, source or link.name), hostname, origin=link)
+
+    def _on_user(self, link, source, params):
+        nick, username, realname = params
+        if self._behind(link, nick):
+            self.server._set_user_info(nick, username, realname)
+            self.propagate(("USER", nick, username, realname), link)
+
+    def _on_nick(self, link, source, params):
+        old_nick, new_nick = params
+        server = self.server
+        if not self._behind(link, old_nick):
+            return
+        if new_nick in server.clients:
+            # Colisión: se desconecta al usuario local con ese nick y se da de
+            # baja al remoto (su servidor ve nuestra colisión y lo desconecta)
+            if not isinstance(server.clients[new_nick].socket, LinkSocket):
+                self._kill_local(new_nick, "Colisión de nick")
+            self._quit_remote(old_nick, "Colisión de nick", link)
+            return
+        server.clients[old_nick].socket.nick = new_nick
+        server._rename_member(old_nick, new_nick, origin=link)
+
+    def _on_quit(self, link, source, params):
+        if self._behind(link, params[0]):
+            self.server._remove_client(params[0], origin=link)
+
+    def _on_whowas(self, link, source, params):
+        if self._behind(link, params[0]):
+            self.server._remember_whowas(params[0], origin=link)
+
+    def _on_kill(self, link, source, params):
+        # Un enlace solo puede dar de baja a usuarios que están detrás de él
+        nick, reason = params[0], params[1] if len(params) > 1 else ""
+        if self._behind(link, nick):
+            self._quit_remote(nick, f"Killed: {reason}", link)
+
+    def _on_join(self, link, source, params):
+        channel, nick, prefix = params[0], params[1], params[2].replace("-", "")
+        server = self.server
+        if not self._behind(link, nick):
+            return
+        if channel not in server.channels:
+            server._create_channel(channel)
+        if nick not in server.channels[channel].users:
+            server._add_member(channel, nick, prefix, origin=link)
+
+    def _on_part(self, link, source, params):
+        # Sale un usuario de detrás del enlace, o lo expulsa (KICK) un operador de detrás
+        channel, nick = params
+        server = self.server
+        if channel not in server.channels or nick not in server.channels[channel].users:
+            return
+        if self._behind(link, nick) or self._op_behind(link, source, channel):
+            server._remove_member(channel, nick, origin=link, by=source)
+
+    def _on_prefix(self, link, source, params):
+        channel, nick, prefix = params[0], params[1], params[2].replace("-", "")
+        server = self.server
+        if channel not in server.channels or nick not in server.channels[channel].users:
+            return
+        if self._op_behind(link, source, channel):
+            server._set_prefix(channel, nick, prefix, origin=link, by=source)
+
+    def _on_topic(self, link, source, params):
+        # Lo cambia un operador de detrás del enlace; sin origen (burst), el
+        # canal debe tener algún miembro detrás del enlace
+        channel = params[0]
+        server = self.server
+        if channel not in server.channels:
+            return
+        if source is None:
+            allowed = any(self._behind(link, nick) for nick in server.channels[channel].users)
+        else:
+            allowed = self._op_behind(link, source, channel)
+        if allowed:
+            server._set_topic(channel, params[1] if len(params) > 1 else None, origin=link, by=source)
+
+    def _on_umode(self, link, source, params):
+        nick, mode, enabled = params
+        if self._behind(link, nick):
+            self.server._set_user_mode(nick, mode, enabled == "1", origin=link)
+
+    def _on_deliver(self, link, source, params):
+        # La línea debe venir de un usuario de detrás del enlace (":nick!user@host ...")
+        # y nunca vuelve hacia el origen
+        nick, line = params
+        client = self.server.clients.get(nick)
+        sender = line[1:].split(" ", 1)[0].split("!", 1)[0] if line.startswith(":") else None
+        if client is not None and not self._behind(link, nick) and self._behind(link, sender):
+            client.socket.sendall(f"{line}\r\n".encode("utf-8"))
+
+    def _on_fanout(self, link, source, params):
+        nicks = [nick for nick in params[0].split(",") if nick in self.server.clients]
+        tags = parse_tags(params[1][1:]) if len(params) > 2 else None  # "@time=...;msgid=..."
+        data = f"{params[-1]}\r\n".encode("utf-8")
+        clients = self.server.clients
+        if any(not isinstance(clients[nick].socket, LinkSocket) for nick in nicks):
+            # Alguno de los destinatarios es de este servidor: queda en su historial
+            self.server._record_remote(data, tags)
+        self.fan_out(nicks, data, tags=tags)
+
+    def _on_ping(self, link, source, params):
+        link.send(f"PONG :{params[0] if params else self.name}")
+
+    def _on_error(self, link, source, params):
+        log.error("Error del enlace %s: %s", link.name, params[0] if params else "")
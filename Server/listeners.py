@@ -0,0 +1,91 @@
+# Server.listeners.py
+
+import os
+import socket
+import stat
+
+UNIX_PREFIX = "unix:"
+
+
+def is_unix(address):
+    """Un extremo Unix se indica con una ruta (str); uno TCP con (host, puerto)."""
+    return isinstance(address, str)
+
+
+def parse_endpoint(text):
+    """
+    Interpreta un extremo escrito en la línea de comandos.
+
+    Formatos: `host:puerto` para TCP y `unix:/ruta/al/socket` para un socket
+    Unix, en ambos casos con un `@backlog` opcional al final
+    (p. ej. `unix:/run/irc.sock@1024`).
+
+    Returns:
+        dict: {"address": (host, puerto) o ruta, "backlog": n o None}
+    """
+    backlog = None  # El backlog por defecto del servidor
+    if "@" in text:
+        text, backlog = text.rsplit("@", 1)
+        backlog = int(backlog)
+    if text.startswith(UNIX_PREFIX):
+        return {"address": text[len(UNIX_PREFIX):], "backlog": backlog}
+    host, sep, port = text.rpartition(":")
+    if not sep:
+        raise ValueError(f"Extremo inválido: {text} (se espera host:puerto o unix:/ruta)")
+    return {"address": (host or "0.0.0.0", int(port)), "backlog": backlog}
+
+
+def describe(address):
+    return f"{UNIX_PREFIX}{address}" if is_unix(address) else f"{address[0]}:{address[1]}"
+
+
+def open_listener(address, backlog, reuse_port=False):
+    """
+    Crea, enlaza y pone a escuchar el socket de un extremo.
+
+    En un socket Unix se borra antes un socket viejo que haya quedado en la
+    ruta (p. ej. tras un reinicio brusco), pero nunca un archivo de otro tipo.
+
+    Returns:
+        socket.socket: El socket en escucha.
+    """
+    if is_unix(address):
+        try:
+            if stat.S_ISSOCK(os.stat(address).st_mode):
+                os.unlink(address)
+        except FileNotFoundError:
+            pass
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if reuse_port:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    try:
+        sock.bind(address)
+        sock.listen(backlog)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def close_listener(sock, address):
+    """Cierra el socket de un extremo y borra la ruta si es Unix."""
+    sock.close()
+    if is_unix(address):
+        try:
+            os.unlink(address)
+        except OSError:
+            pass
+
+
+def peer_address(addr, address):
+    """
+    Dirección del cliente como (host, puerto) para cualquier familia.
+
+    Los clientes de un socket Unix no tienen dirección propia: se les trata
+    como `localhost` y se guarda la ruta del socket en lugar del puerto.
+    """
+    if is_unix(address):
+        return ("localhost", address)
+    return addr
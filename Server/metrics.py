@@ -0,0 +1,245 @@
+# Server.metrics.py
+
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+import time
+
+# Límites superiores de los buckets (segundos) para la latencia de cada comando
+LATENCY_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+# Límites superiores de los buckets para el número de destinatarios de una difusión
+FANOUT_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class Histogram:
+    """
+    Histograma de buckets fijos al estilo Prometheus.
+
+    Solo guarda un contador por bucket, la suma y el total, así que registrar
+    una observación cuesta una búsqueda binaria y tres sumas.
+    """
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # El último bucket es +Inf
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Límite superior del bucket que contiene el cuantil q (aproximado)."""
+        if not self.count:
+            return 0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def copy(self):
+        other = Histogram(self.bounds)
+        other.counts = list(self.counts)
+        other.sum = self.sum
+        other.count = self.count
+        return other
+
+
+class ServerMetrics:
+    """
+    Contadores del servidor para planificar capacidad sin un perfilador.
+
+    Comandos por verbo, latencia de cada manejador y tamaño de las difusiones
+    se actualizan bajo un único candado (una adquisición por evento). Los
+    bytes recibidos y enviados y las escrituras al socket se cuentan en cada
+    sesión, sin candado, y aquí solo se acumulan los de las sesiones ya
+    cerradas.
+    """
+    def __init__(self):
+        self.started = time.time()
+        self.lock = Lock()
+        self.commands = {}   # {verbo: [veces, bytes, envíos agrupados]}
+        self.latency = {}    # {verbo: Histogram} del tiempo de manejo
+        self.fanout = Histogram(FANOUT_BUCKETS)
+        self.closed_bytes_in = 0
+        self.closed_bytes_out = 0
+        self.closed_writes = 0
+        self.sendq_exceeded = 0
+
+    def record_command(self, verb, size, elapsed, chunks=0):
+        """
+        Registra un comando: bytes de la línea, tiempo de manejo y envíos a la
+        propia conexión que se agruparon en su respuesta.
+
+        Las escrituras reales al socket las hace el escritor de cada conexión
+        y pueden juntar respuestas de varios comandos y difusiones, así que
+        no se atribuyen a un verbo: solo se cuentan en total (socket_writes).
+        """
+        with self.lock:
+            entry = self.commands.get(verb)
+            if entry is None:
+                entry = self.commands[verb] = [0, 0, 0]
+                self.latency[verb] = Histogram(LATENCY_BUCKETS)
+            entry[0] += 1
+            entry[1] += size
+            entry[2] += chunks
+            self.latency[verb].observe(elapsed)
+
+    def record_fanout(self, recipients):
+        with self.lock:
+            self.fanout.observe(recipients)
+
+    def record_closed(self, session):
+        """Acumula el tráfico de una sesión que se cierra."""
+        sendq = session.socket.sendq
+        with self.lock:
+            self.closed_bytes_in += session.bytes_in
+            self.closed_bytes_out += sendq.total_bytes
+            self.closed_writes += sendq.writes
+            if sendq.exceeded:
+                self.sendq_exceeded += 1
+
+    def snapshot(self, server):
+        """
+        Copia coherente de los contadores más los valores actuales de las
+        sesiones abiertas (tráfico y colas de salida).
+
+        Returns:
+            dict: Valores listos para STATS o para la exposición de Prometheus.
+        """
+        sessions = list(server.sessions)
+        with self.lock:
+            snap = {
+                "uptime": time.time() - self.started,
+                "commands": {verb: tuple(entry) for verb, entry in self.commands.items()},
+                "latency": {verb: hist.copy() for verb, hist in self.latency.items()},
+                "fanout": self.fanout.copy(),
+                "bytes_in": self.closed_bytes_in,
+                "bytes_out": self.closed_bytes_out,
+                "socket_writes": self.closed_writes,
+                "sendq_exceeded": self.sendq_exceeded,
+            }
+        depths = [session.socket.sendq.size for session in sessions]
+        snap["bytes_in"] += sum(session.bytes_in for session in sessions)
+        snap["bytes_out"] += sum(session.socket.sendq.total_bytes for session in sessions)
+        snap["socket_writes"] += sum(session.socket.sendq.writes for session in sessions)
+        snap["sendq_total"] = sum(depths)
+        snap["sendq_max"] = max(depths, default=0)
+        snap["sessions"] = len(sessions)
+        snap["clients"] = len(server.clients)
+        snap["channels"] = len(server.channels)
+        return snap
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+
+def _histogram_lines(name, hist, **labels):
+    lines = []
+    cumulative = 0
+    for bound, count in zip(hist.bounds, hist.counts):
+        cumulative += count
+        lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {cumulative}")
+    lines.append(f"{name}_bucket{_labels(**labels, le='+Inf')} {hist.count}")
+    suffix = _labels(**labels) if labels else ""
+    lines.append(f"{name}_sum{suffix} {hist.sum}")
+    lines.append(f"{name}_count{suffix} {hist.count}")
+    return lines
+
+
+def render_prometheus(snap):
+    """Convierte una instantánea de métricas al formato de texto de Prometheus."""
+    lines = [
+        "# HELP irc_uptime_seconds Segundos desde que arrancó el servidor.",
+        "# TYPE irc_uptime_seconds gauge",
+        f"irc_uptime_seconds {snap['uptime']:.3f}",
+        "# HELP irc_clients Clientes registrados.",
+        "# TYPE irc_clients gauge",
+        f"irc_clients {snap['clients']}",
+        "# HELP irc_connections Conexiones abiertas (registradas o no).",
+        "# TYPE irc_connections gauge",
+        f"irc_connections {snap['sessions']}",
+        "# HELP irc_channels Canales activos.",
+        "# TYPE irc_channels gauge",
+        f"irc_channels {snap['channels']}",
+        "# HELP irc_commands_total Comandos procesados por verbo.",
+        "# TYPE irc_commands_total counter",
+    ]
+    for verb, (count, _, _) in sorted(snap["commands"].items()):
+        lines.append(f"irc_commands_total{_labels(verb=verb)} {count}")
+    lines += [
+        "# HELP irc_command_reply_chunks_total Envíos a la propia conexión de cada verbo, agrupados en una sola respuesta.",
+        "# TYPE irc_command_reply_chunks_total counter",
+    ]
+    for verb, (_, _, chunks) in sorted(snap["commands"].items()):
+        lines.append(f"irc_command_reply_chunks_total{_labels(verb=verb)} {chunks}")
+    lines += [
+        "# HELP irc_command_duration_seconds Tiempo de manejo de cada comando.",
+        "# TYPE irc_command_duration_seconds histogram",
+    ]
+    for verb, hist in sorted(snap["latency"].items()):
+        lines += _histogram_lines("irc_command_duration_seconds", hist, verb=verb)
+    lines += [
+        "# HELP irc_received_bytes_total Bytes recibidos de los clientes.",
+        "# TYPE irc_received_bytes_total counter",
+        f"irc_received_bytes_total {snap['bytes_in']}",
+        "# HELP irc_sent_bytes_total Bytes encolados hacia los clientes.",
+        "# TYPE irc_sent_bytes_total counter",
+        f"irc_sent_bytes_total {snap['bytes_out']}",
+        "# HELP irc_socket_writes_total Escrituras a los sockets de los clientes.",
+        "# TYPE irc_socket_writes_total counter",
+        f"irc_socket_writes_total {snap['socket_writes']}",
+        "# HELP irc_fanout_recipients Destinatarios de cada difusión.",
+        "# TYPE irc_fanout_recipients histogram",
+    ]
+    lines += _histogram_lines("irc_fanout_recipients", snap["fanout"])
+    lines += [
+        "# HELP irc_sendq_bytes Bytes pendientes en todas las colas de salida.",
+        "# TYPE irc_sendq_bytes gauge",
+        f"irc_sendq_bytes {snap['sendq_total']}",
+        "# HELP irc_sendq_max_bytes Cola de salida más llena.",
+        "# TYPE irc_sendq_max_bytes gauge",
+        f"irc_sendq_max_bytes {snap['sendq_max']}",
+        "# HELP irc_sendq_exceeded_total Clientes desconectados por SendQ excedida.",
+        "# TYPE irc_sendq_exceeded_total counter",
+        f"irc_sendq_exceeded_total {snap['sendq_exceeded']}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def start_metrics_endpoint(server, port, host="127.0.0.1"):
+    """
+    Sirve GET /metrics en formato Prometheus desde un hilo propio.
+
+    Solo escucha en localhost por defecto: las métricas no pasan por el
+    protocolo IRC ni quedan expuestas a la red.
+
+    Returns:
+        ThreadingHTTPServer: para consultar el puerto real y detenerlo.
+    """
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            # La instantánea se toma en el hilo dueño del estado
+            snap = server._ask_server(server.metrics.snapshot, server)
+            body = render_prometheus(snap).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Sin una línea por cada consulta
+
+    httpd = ThreadingHTTPServer((host, port), MetricsHandler)
+    httpd.daemon_threads = True
+    Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
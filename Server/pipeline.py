@@ -0,0 +1,28 @@
+# Server.pipeline.py
+
+
+def parse_line(line):
+    """
+    Separa una línea de cliente en verbo y comando normalizado.
+
+    Descarta las tags de IRCv3 ("@..."), el prefijo opcional (":origen ") y
+    pasa el verbo a mayúsculas, de modo que "nick Ana" y ":Ana NICK Ana" se
+    despachan igual que "NICK Ana".
+
+    Returns:
+        tuple: (verbo, línea normalizada sin prefijo, tags sin "@" o ""), o
+        (None, None, "") si la línea no contiene comando.
+    """
+    tags = ""
+    if line.startswith("@"):
+        tags, _, line = line.partition(" ")
+        tags = tags[1:]
+        line = line.lstrip(" ")
+    if line.startswith(":"):
+        _, _, line = line.partition(" ")
+        line = line.lstrip(" ")
+    command, sep, rest = line.partition(" ")
+    if not command:
+        return None, None, ""
+    command = command.upper()
+    return command, command + sep + rest, tags
@@ -0,0 +1,62 @@
+# Server.records.py
+
+# Modos de usuario como bits de un entero
+UMODE_INVISIBLE = 1 << 0   # +i
+UMODE_WALLOPS = 1 << 1     # +w
+UMODE_OPERATOR = 1 << 2    # +o
+USER_MODES = {"+i": UMODE_INVISIBLE, "+w": UMODE_WALLOPS, "+o": UMODE_OPERATOR}
+
+# Modos de canal
+CMODE_NO_EXTERNAL = 1 << 0  # +n: No mensajes externos
+CMODE_TOPIC_OPS = 1 << 1    # +t: Solo ops pueden cambiar el tema
+CMODE_INVITE_ONLY = 1 << 2  # +i
+CMODE_MODERATED = 1 << 3    # +m
+CHANNEL_MODES = {"+n": CMODE_NO_EXTERNAL, "+t": CMODE_TOPIC_OPS, "+i": CMODE_INVITE_ONLY, "+m": CMODE_MODERATED}
+
+
+def mode_names(flags, table):
+    """Modos activos de flags como lista de cadenas ("+i", ...), en el orden de table."""
+    return [name for name, bit in table.items() if flags & bit]
+
+
+def mode_string(flags, table):
+    """Modos activos de flags en una sola cadena, p. ej. "+nt"."""
+    return "+" + "".join(name[1] for name in mode_names(flags, table))
+
+
+class Client:
+    """
+    Registro de un usuario con nick (local o de otro servidor).
+
+    Usa __slots__ en lugar de un dict por cliente: con cientos de miles de
+    usuarios el diccionario de atributos pesa más que los propios datos.
+    """
+    __slots__ = ("socket", "modes", "caps", "username", "realname", "hostname", "channels",
+                 "ping_token", "last_ping_sent", "last_pong")
+
+    def __init__(self, sock, hostname):
+        self.socket = sock        # Interfaz sendall/close hacia el usuario
+        self.modes = 0            # Bits UMODE_*
+        self.caps = 0             # Bits CAP_* negociados (ver Server.capabilities)
+        self.username = None
+        self.realname = None
+        self.hostname = hostname
+        self.channels = set()     # Índice inverso: canales en los que está
+        self.ping_token = None
+        self.last_ping_sent = None
+        self.last_pong = None
+
+    @property
+    def invisible(self):
+        return bool(self.modes & UMODE_INVISIBLE)
+
+
+class Channel:
+    """Registro de un canal: miembros con su prefijo, tema y modos."""
+    __slots__ = ("users", "topic", "modes")
+
+    def __init__(self):
+        self.users = {}   # {nickname: prefijo}, "@" para operadores
+        self.topic = None
+        self.modes = CMODE_NO_EXTERNAL | CMODE_TOPIC_OPS  # +nt por defecto
+
@@ -0,0 +1,199 @@
+# Server.sendq.py
+
+from collections import deque
+import socket
+from threading import Condition, Thread, Timer
+
+from Server.server_log import log
+
+SENDQ_EXCEEDED = b"ERROR :SendQ exceeded\r\n"
+CLOSE_GRACE = 5  # Segundos para vaciar la cola antes de cortar la conexión
+REPLY_SENDQ_FACTOR = 8  # Respuestas propias pendientes admitidas, en múltiplos de max_bytes
+
+
+class SendQ:
+    """
+    Cola de salida acotada (sendq) de un cliente.
+
+    Guarda los bytes pendientes de escribir. Si un cliente no lee y la cola
+    supera `max_bytes`, se descarta lo pendiente, se deja solo el
+    `ERROR :SendQ exceeded` y la cola pasa a estado de cierre.
+
+    Las respuestas a los comandos de la propia conexión (push_reply) no
+    cuentan para ese límite: pedir un LIST grande no convierte al cliente
+    en un lector lento. Tienen su propio tope, `max_reply_bytes`, para que
+    un cliente que envía comandos sin leer nunca las respuestas también
+    termine desconectado.
+    """
+    def __init__(self, max_bytes, max_reply_bytes=None):
+        self.max_bytes = max_bytes
+        self.max_reply_bytes = max_reply_bytes or max_bytes * REPLY_SENDQ_FACTOR
+        self.chunks = deque()
+        self.size = 0          # Bytes encolados aún no entregados al escritor
+        self.reply_bytes = 0   # Parte de size que son respuestas de push_reply
+        self.closing = False   # No se aceptan más datos; cerrar al vaciar
+        self.exceeded = False
+        self.total_bytes = 0   # Bytes aceptados en toda la vida de la cola (métricas)
+        self.held = None       # Lista que retiene los envíos entre hold() y release()
+        self.writes = 0        # Escrituras al socket (solo las cuenta el escritor)
+
+    def push(self, data):
+        """
+        Encola `data`.
+
+        Returns:
+            bool: False si este envío desbordó la cola.
+        """
+        if self.closing:
+            return True
+        if self.held is not None:
+            self.held.append(data)
+            return True
+        if self.size - self.reply_bytes + len(data) > self.max_bytes:
+            self._overflow()
+            return False
+        self.chunks.append(data)
+        self.size += len(data)
+        self.total_bytes += len(data)
+        return True
+
+    def push_reply(self, chunks):
+        """
+        Encola la respuesta de un comando a la propia conexión, bloque a bloque.
+
+        Cada bloque se compara con lo pendiente que no es respuesta (igual
+        que un envío normal) y con el tope de respuestas sin leer.
+
+        Returns:
+            bool: False si algún bloque desbordó la cola.
+        """
+        if self.closing:
+            return True
+        for data in chunks:
+            if (self.size - self.reply_bytes + len(data) > self.max_bytes
+                    or self.reply_bytes + len(data) > self.max_reply_bytes):
+                self._overflow()
+                return False
+            self.chunks.append(data)
+            self.size += len(data)
+            self.reply_bytes += len(data)
+            self.total_bytes += len(data)
+        return True
+
+    def _overflow(self):
+        # Se descarta lo pendiente y solo queda el aviso antes de cerrar
+        self.chunks.clear()
+        self.chunks.append(SENDQ_EXCEEDED)
+        self.size = len(SENDQ_EXCEEDED)
+        self.reply_bytes = 0
+        self.closing = True
+        self.exceeded = True
+
+    def hold(self):
+        """
+        Retiene lo que se envíe desde ahora hasta release(), sin entregarlo.
+
+        Solo la usa el hilo que ejecuta los comandos: todas las respuestas de
+        un comando se juntan y salen en una única escritura.
+        """
+        self.held = []
+
+    def release(self):
+        """Termina la retención y devuelve la lista de envíos retenidos."""
+        held = self.held or []
+        self.held = None
+        return held
+
+    def flush_held(self):
+        """Encola lo retenido (al cerrar la conexión en medio de un comando)."""
+        if self.held is not None:
+            self.push_reply(self.release())
+
+    def pop_all(self):
+        """Extrae todo lo encolado como un único bloque de bytes."""
+        if not self.chunks:
+            return b""
+        data = self.chunks[0] if len(self.chunks) == 1 else b"".join(self.chunks)
+        self.chunks.clear()
+        self.size = 0
+        self.reply_bytes = 0
+        return data
+
+
+class QueuedSocket:
+    """
+    Socket con cola de salida acotada vaciada por un hilo escritor propio.
+
+    `sendall` nunca bloquea a quien envía: un cliente lento solo llena su
+    propia cola y, al superar el límite, se le desconecta.
+    """
+    def __init__(self, sock, max_bytes):
+        self.sock = sock
+        self.sendq = SendQ(max_bytes)
+        self.cond = Condition()
+        self._abort_timer = None
+        Thread(target=self._write_loop, daemon=True).start()
+
+    def sendall(self, data):
+        with self.cond:
+            if not self.sendq.push(data):
+                log.warning("SendQ excedida para %s, desconectando", self._peer())
+                self._schedule_abort()
+            self.cond.notify()
+
+    def send_reply(self, chunks):
+        """Encola la respuesta de un comando de esta conexión (ver SendQ.push_reply)."""
+        with self.cond:
+            if not self.sendq.push_reply(chunks):
+                log.warning("SendQ excedida para %s, desconectando", self._peer())
+                self._schedule_abort()
+            self.cond.notify()
+
+    def shutdown(self, how):
+        self.close()
+
+    def close(self):
+        """Cierra la conexión después de vaciar lo pendiente."""
+        with self.cond:
+            self.sendq.flush_held()
+            if not self.sendq.closing:
+                self.sendq.closing = True
+                self._schedule_abort()
+            self.cond.notify()
+
+    def _schedule_abort(self):
+        # Si el cliente no lee, la cola nunca se vacía: cortar tras un margen
+        if self._abort_timer is None:
+            self._abort_timer = Timer(CLOSE_GRACE, self._close_socket)
+            self._abort_timer.daemon = True
+            self._abort_timer.start()
+
+    def _write_loop(self):
+        while True:
+            with self.cond:
+                while not self.sendq.chunks and not self.sendq.closing:
+                    self.cond.wait()
+                data = self.sendq.pop_all()
+            if not data:
+                break  # Cerrando y sin nada pendiente
+            try:
+                self.sock.sendall(data)
+            except OSError:
+                break
+            self.sendq.writes += 1
+        self._close_socket()
+
+    def _close_socket(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        if self._abort_timer is not None:
+            self._abort_timer.cancel()
+
+    def _peer(self):
+        try:
+            return self.sock.getpeername()
+        except OSError:
+            return "cliente desconectado"
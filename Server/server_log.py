@@ -0,0 +1,86 @@
+# Server.server_log.py
+
+import logging
+import logging.handlers
+import queue
+import sys
+
+log = logging.getLogger("irc.server")
+
+# Prefijos con los que el servidor siempre ha marcado su salida
+PREFIXES = {
+    logging.DEBUG: "[DEBUG]",
+    logging.INFO: "[SERVER]",
+    logging.WARNING: "[!]",
+    logging.ERROR: "[ERROR]",
+    logging.CRITICAL: "[ERROR]",
+}
+
+
+class PrefixFormatter(logging.Formatter):
+    """Formatea cada registro como "<prefijo> <mensaje>"."""
+    def format(self, record):
+        message = f"{PREFIXES.get(record.levelno, '[SERVER]')} {record.getMessage()}"
+        if record.exc_info:
+            message += "\n" + self.formatException(record.exc_info)
+        return message
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Encola los registros para el hilo escritor sin bloquear nunca al que loguea.
+
+    Si la cola está llena el registro se descarta y se cuenta en `dropped`.
+    El formateo (con sus argumentos) se hace en el hilo escritor.
+    """
+    def __init__(self, record_queue):
+        super().__init__(record_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class ServerLogging:
+    """Handler de cola y escritor en segundo plano activos."""
+    def __init__(self, handler, listener):
+        self.handler = handler
+        self.listener = listener
+
+    @property
+    def dropped(self):
+        return self.handler.dropped
+
+    def stop(self):
+        """Vacía la cola pendiente y detiene el hilo escritor."""
+        self.listener.stop()
+        log.removeHandler(self.handler)
+
+
+def configure_logging(level=logging.INFO, queue_size=10000, stream=None):
+    """
+    Envía los registros del servidor a `stream` (stdout por defecto) a través
+    de una cola acotada vaciada por un hilo escritor.
+
+    Returns:
+        ServerLogging: para consultar los registros descartados y detenerlo.
+    """
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(PrefixFormatter())
+    handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+    listener = logging.handlers.QueueListener(handler.queue, output)
+
+    # Reemplaza una configuración anterior (p. ej. la heredada por un worker)
+    for previous in list(log.handlers):
+        log.removeHandler(previous)
+    log.setLevel(level)
+    log.addHandler(handler)
+    log.propagate = False
+    listener.start()
+    return ServerLogging(handler, listener)
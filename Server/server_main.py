@@ -1,20 +1,54 @@
 # Server.server_main.py
 
 from Server.irc_server import IRCServer
+from Server.async_irc_server import AsyncIRCServer
+from Server.cluster import ServerCluster
+from Server.server_log import configure_logging
+from Server.listeners import parse_endpoint
+import logging
 import time
 
 DEFAULT_HOST = "127.0.0.1"
 DEFAULT_PORT = 8080
 
-def run_server():
+# Motores disponibles: un hilo por cliente o un único loop de asyncio
+ENGINES = {
+    "threaded": IRCServer,
+    "asyncio": AsyncIRCServer,
+}
+
+def run_server(engine="threaded", log_level=logging.INFO, metrics_port=None, workers=1,
+               port=DEFAULT_PORT, name=None, listen=(), link_password=None, link_allow=(), opers=()):
+    server = None
+    logs = configure_logging(log_level)
     try:
-        # Crear una instancia del servidor IRC
-        server = IRCServer(DEFAULT_HOST, DEFAULT_PORT)
-        print("Servidor IRC en ejecución...")
-        
+        # Extremos adicionales (host:puerto o unix:/ruta, con @backlog opcional)
+        endpoints = [parse_endpoint(text) for text in listen]
+        if workers > 1:
+            if endpoints:
+                raise ValueError("--listen solo se admite con un único proceso (--workers 1)")
+            # Varios procesos en el mismo puerto (SO_REUSEPORT) con estado compartido
+            server = ServerCluster(ENGINES[engine], workers, DEFAULT_HOST, port, log_level, metrics_port)
+            print(f"Servidor IRC en ejecución (motor {engine}, {workers} workers)...")
+        else:
+            # Crear una instancia del servidor IRC
+            server = ENGINES[engine](DEFAULT_HOST, port)
+            server.metrics_port = metrics_port
+            if name:
+                server.network.name = name  # Nombre único dentro de una red de servidores
+            # Sin contraseña ni direcciones permitidas no se aceptan enlaces entrantes
+            server.network.password = link_password
+            server.network.allowed_peers.update(link_allow)
+            for oper in opers:
+                oper_name, _, oper_password = oper.partition(":")
+                server.operators[oper_name] = oper_password
+            for endpoint in endpoints:
+                server.add_listener(endpoint["address"], endpoint["backlog"])
+            print(f"Servidor IRC en ejecución (motor {engine})...")
+
         # Iniciar el servidor (esto ejecuta _accept_clients en un hilo separado)
         server.start()
-        
+
         # Mantener el programa en ejecución
         while True:
             time.sleep(1)  # Evitar que el programa termine
@@ -24,7 +58,9 @@ def run_server():
         print(f"Error en el servidor: {e}")
     finally:
         # Detener el servidor de manera segura
-        server.stop()
+        if server:
+            server.stop()
+        logs.stop()
 
 if __name__ == "__main__":
     run_server()
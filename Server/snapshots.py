@@ -0,0 +1,34 @@
+# Server.snapshots.py
+
+
+class Snapshot:
+    """
+    Vista inmutable (una tupla) de una parte del estado del servidor.
+
+    El servidor sube `state_version` con cada cambio de clients o channels;
+    get() reconstruye la tupla solo si la versión cambió desde la última
+    vez. Mientras no haya cambios, tomarla es O(1) y todas las lecturas
+    comparten el mismo resultado ya renderizado; quien la recorre nunca ve
+    un cambio a medias.
+    """
+    __slots__ = ("build", "version", "value")
+
+    def __init__(self, build):
+        self.build = build   # Función sin argumentos que devuelve la tupla
+        self.version = -1
+        self.value = ()
+
+    def get(self, version):
+        """
+        Devuelve la vista correspondiente a version.
+
+        Args:
+            version (int): Versión actual del estado.
+
+        Returns:
+            tuple: Filas de la vista.
+        """
+        if version != self.version:
+            self.value = tuple(self.build())
+            self.version = version
+        return self.value
@@ -0,0 +1,67 @@
+# Server.timer_wheel.py
+
+import math
+from threading import Lock
+
+
+class TimerWheel:
+    """
+    Rueda de temporizadores con hash (hashed timing wheel).
+
+    Cada temporizador se guarda en la ranura `tick_vencimiento % slots`, de
+    modo que programar y cancelar cuestan O(1) y cada avance solo revisa las
+    ranuras de los ticks transcurridos, no todos los temporizadores. Cada
+    clave tiene a lo sumo un temporizador activo; reprogramarla reemplaza al
+    anterior.
+    """
+    def __init__(self, tick=1.0, slots=512, now=0.0):
+        self.tick = tick
+        self.slots = [{} for _ in range(slots)]  # {clave: (tick_vencimiento, callback)}
+        self.index = {}                          # {clave: ranura} para cancelar en O(1)
+        self.current = int(now / tick)           # Último tick procesado
+        self.lock = Lock()
+
+    def schedule(self, key, delay, callback, now):
+        """Programa callback(key) para dentro de `delay` segundos."""
+        deadline = max(math.ceil((now + delay) / self.tick), self.current + 1)
+        slot = deadline % len(self.slots)
+        with self.lock:
+            self._remove(key)
+            self.slots[slot][key] = (deadline, callback)
+            self.index[key] = slot
+
+    def cancel(self, key):
+        with self.lock:
+            self._remove(key)
+
+    def _remove(self, key):
+        slot = self.index.pop(key, None)
+        if slot is not None:
+            del self.slots[slot][key]
+
+    def advance(self, now):
+        """
+        Avanza la rueda hasta `now` y devuelve los temporizadores vencidos.
+
+        Returns:
+            list: Pares (callback, clave), para ejecutarlos fuera del candado.
+        """
+        target = int(now / self.tick)
+        expired = []
+        with self.lock:
+            # Si la rueda se atrasó más de una vuelta basta con recorrer cada ranura una vez
+            start = max(self.current + 1, target - len(self.slots) + 1)
+            for tick in range(start, target + 1):
+                bucket = self.slots[tick % len(self.slots)]
+                if not bucket:
+                    continue
+                for key, (deadline, callback) in list(bucket.items()):
+                    if deadline <= target:
+                        del bucket[key]
+                        del self.index[key]
+                        expired.append((callback, key))
+            self.current = max(self.current, target)
+        return expired
+
+    def __len__(self):
+        return len(self.index)
@@ -0,0 +1,103 @@
+# Server.whowas.py
+
+from collections import OrderedDict, deque
+
+WHOWAS_PER_NICK = 10         # Entradas máximas por nick
+WHOWAS_MAX_ENTRIES = 10000   # Entradas máximas entre todos los nicks
+WHOWAS_TTL = 24 * 3600       # Segundos que se recuerda una entrada
+WHOWAS_SWEEP = 60            # Segundos entre barridos de entradas vencidas
+
+
+class WhowasEntry:
+    """Datos de un usuario al dejar un nick (QUIT o cambio de nick)."""
+    __slots__ = ("nickname", "username", "hostname", "realname", "disconnected_time")
+
+    def __init__(self, nickname, username, hostname, realname, disconnected_time):
+        self.nickname = nickname
+        self.username = username
+        self.hostname = hostname
+        self.realname = realname
+        self.disconnected_time = disconnected_time
+
+
+class WhowasStore:
+    """
+    Historial de WHOWAS acotado en tamaño y en tiempo.
+
+    Cada nick tiene un deque(maxlen) con sus entradas, de la más reciente a
+    la más antigua. Los nicks se guardan en orden de último uso: al superar
+    el total de entradas se descartan las más antiguas del nick usado hace
+    más tiempo, y expire() (llamado desde la rueda de temporizadores) borra
+    lo que superó el TTL.
+    """
+    def __init__(self, per_nick=WHOWAS_PER_NICK, max_entries=WHOWAS_MAX_ENTRIES, ttl=WHOWAS_TTL):
+        self.nicks = OrderedDict()  # {nick: deque de WhowasEntry}, el último es el usado más recientemente
+        self.size = 0               # Entradas entre todos los nicks
+        self.per_nick = per_nick
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+    def __len__(self):
+        return self.size
+
+    def add(self, entry):
+        """Guarda entry como la más reciente de su nick y aplica el límite total."""
+        nick = entry.nickname
+        entries = self.nicks.get(nick)
+        if entries is None:
+            entries = self.nicks[nick] = deque(maxlen=self.per_nick)
+        else:
+            self.nicks.move_to_end(nick)
+        before = len(entries)
+        entries.appendleft(entry)  # Con maxlen, el deque descarta la más antigua
+        self.size += len(entries) - before
+        while self.size > self.max_entries:
+            oldest_nick, oldest = next(iter(self.nicks.items()))
+            oldest.pop()
+            self.size -= 1
+            if not oldest:
+                del self.nicks[oldest_nick]
+
+    def get(self, nick, now):
+        """
+        Entradas de nick de la más reciente a la más antigua.
+
+        Devuelve el propio deque (sin copiarlo), ya sin las entradas vencidas.
+
+        Returns:
+            deque: Entradas vigentes, o None si no queda ninguna.
+        """
+        entries = self.nicks.get(nick)
+        if entries is None:
+            return None
+        self._trim(nick, entries, now - self.ttl)
+        return self.nicks.get(nick)
+
+    def expire(self, now):
+        """
+        Borra los nicks cuya entrada más reciente venció.
+
+        Los nicks están en orden de último uso, así que el barrido se detiene
+        en el primero que sigue vigente; las entradas viejas de nicks más
+        recientes se recortan al consultarlos o en barridos posteriores.
+
+        Returns:
+            int: Entradas eliminadas.
+        """
+        cutoff = now - self.ttl
+        removed = 0
+        while self.nicks:
+            nick, entries = next(iter(self.nicks.items()))
+            if entries[0].disconnected_time > cutoff:
+                break
+            removed += len(entries)
+            self.size -= len(entries)
+            del self.nicks[nick]
+        return removed
+
+    def _trim(self, nick, entries, cutoff):
+        while entries and entries[-1].disconnected_time <= cutoff:
+            entries.pop()
+            self.size -= 1
+        if not entries:
+            del self.nicks[nick]
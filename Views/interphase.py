@@ -8,7 +8,6 @@ from Common.shared_constants import DEFAULT_HOST, DEFAULT_PORT
 import threading
 from Common.custom_errors import ProtocolError
 import queue
-from Common.irc_protocol import parse_message
 
 
 class MainView(tk.Tk):
@@ -1132,8 +1131,7 @@ class MainView(tk.Tk):
         while True:
             try:                
                 # raw_response = self.server_messages.get(timeout=1)
-                raw_response = self.channel_list_queue.get(timeout=1)
-                prefix, command, params, trailing = parse_message(raw_response)
+                prefix, command, params, trailing = self.channel_list_queue.get(timeout=1)
             
                 if command == "322":  # LIST
                     channel = params[1] if len(params) > 1 else params[0]
@@ -1161,8 +1159,7 @@ class MainView(tk.Tk):
         while True:
             try:
                 # raw_response = self.server_messages.get(timeout=1)
-                raw_response = self.user_list_queue.get(timeout=1)
-                prefix, command, params, trailing = parse_message(raw_response)
+                prefix, command, params, trailing = self.user_list_queue.get(timeout=1)
             
                 if command == "352":  # WHO
                     user = params[5]  # Nombre de usuario
@@ -1254,9 +1251,10 @@ class MainView(tk.Tk):
 
         while not self.server_messages.empty():
             try:
+                # ClientConnection.receive ya entrega cada línea parseada (Message)
                 raw_message = self.server_messages.get()
                 
-                prefix, command, params, trailing = parse_message(raw_message)
+                prefix, command, params, trailing = raw_message
                 display_text = f"{prefix} {command} {' '.join(params)} :{trailing}"
 
                 print(f"[DEBUG] Prefix: {prefix}, Comando: {command}, Params: {params}, Trailing: {trailing}")  # Depuración
@@ -1527,6 +1525,8 @@ class MainView(tk.Tk):
             """Ejecuta el comando JOIN en un hilo separado."""
             try:
                 self.connection.join_channel(channel)
+                # Recuperar lo que se dijo en el canal mientras no estábamos
+                self.connection.chathistory(channel)
                 messagebox.showinfo("Notificación", f"Te has unido al canal {channel}.")
             except Exception as e:
                 messagebox.showerror("Error", f"No se pudo unir al canal: {e}")
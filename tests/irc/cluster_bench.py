@@ -0,0 +1,90 @@
+# tests.irc.cluster_bench.py
+#
+# Mide cómo escala el modo multi-proceso (SO_REUSEPORT + coordinador):
+# levanta el clúster con 1, 2, ... workers y varios procesos cliente que
+# envían ráfagas de PING y esperan los PONG. Reporta mensajes/segundo.
+#
+# Uso: python3 tests/irc/cluster_bench.py --workers 1 2 4 --clients 8 --duration 5
+
+import argparse
+import logging
+import multiprocessing
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from Server.irc_server import IRCServer
+from Server.async_irc_server import AsyncIRCServer
+from Server.cluster import ServerCluster
+
+ENGINES = {"threaded": IRCServer, "asyncio": AsyncIRCServer}
+BATCH = 50  # PING enviados antes de esperar sus PONG
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def client(port, index, deadline, results):
+    sock = socket.create_connection(("127.0.0.1", port))
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.sendall(f"NICK bench{index}\r\nUSER b 0 * :b\r\n".encode())
+    burst = b"PING :bench\r\n" * BATCH
+    done = 0
+    buffer = b""
+    while time.time() < deadline:
+        sock.sendall(burst)
+        pongs = 0
+        while pongs < BATCH:
+            buffer += sock.recv(65536)
+            pongs += buffer.count(b"PONG")
+            buffer = buffer[buffer.rfind(b"\r\n") + 2:]
+        done += BATCH
+    results[index] = done
+    sock.close()
+
+
+def run(engine, workers, clients, duration):
+    port = free_port()
+    cluster = ServerCluster(ENGINES[engine], workers, "127.0.0.1", port, logging.WARNING)
+    cluster.start()
+    results = multiprocessing.Array("q", clients)
+    deadline = time.time() + duration
+    processes = [
+        multiprocessing.Process(target=client, args=(port, i, deadline, results))
+        for i in range(clients)
+    ]
+    start = time.time()
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    elapsed = time.time() - start
+    cluster.stop()
+    return sum(results) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Escalado del servidor IRC con varios workers")
+    parser.add_argument("--engine", choices=list(ENGINES), default="asyncio")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, os.cpu_count() or 1])
+    parser.add_argument("--clients", type=int, default=8, help="Procesos cliente")
+    parser.add_argument("--duration", type=float, default=5.0, help="Segundos de medición")
+    args = parser.parse_args()
+
+    print(f"CPUs: {os.cpu_count()}  motor: {args.engine}")
+    print(f"{'workers':>8} {'msgs/s':>10} {'escala':>8}")
+    base = None
+    for workers in sorted(set(args.workers)):
+        rate = run(args.engine, workers, args.clients, args.duration)
+        base = base or rate
+        print(f"{workers:>8} {rate:>10.0f} {rate / base:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
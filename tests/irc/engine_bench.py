@@ -0,0 +1,97 @@
+# tests.irc.engine_bench.py
+#
+# Compara los motores del servidor (hilo por cliente vs asyncio):
+# abre N conexiones ociosas y mide mensajes/segundo con varios clientes activos
+# que envían PING y esperan el PONG.
+#
+# Uso: python3 tests/irc/engine_bench.py --idle 10000 --active 8 --duration 5
+
+import argparse
+import contextlib
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from Server.irc_server import IRCServer
+from Server.async_irc_server import AsyncIRCServer, _raise_fd_limit
+
+ENGINES = {"threaded": IRCServer, "asyncio": AsyncIRCServer}
+
+
+def open_idle(port, count):
+    sockets = []
+    for _ in range(count):
+        try:
+            sockets.append(socket.create_connection(("127.0.0.1", port)))
+        except OSError as e:
+            print(f"[BENCH] Solo se abrieron {len(sockets)} conexiones ociosas: {e}", file=sys.__stdout__)
+            break
+    return sockets
+
+
+def ping_worker(port, deadline, results, index):
+    sock = socket.create_connection(("127.0.0.1", port))
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    done = 0
+    buffer = b""
+    while time.time() < deadline:
+        sock.sendall(b"PING :bench\r\n")
+        while b"\r\n" not in buffer:
+            buffer += sock.recv(4096)
+        _, buffer = buffer.split(b"\r\n", 1)
+        done += 1
+    results[index] = done
+    sock.close()
+
+
+def run_engine(name, idle, active, duration):
+    server = ENGINES[name]("127.0.0.1", 0)
+    server.backlog = 1024  # Misma cola de aceptación para ambos motores
+    server.start()
+    idle_sockets = open_idle(server.port, idle)
+
+    results = [0] * active
+    deadline = time.time() + duration
+    workers = [
+        threading.Thread(target=ping_worker, args=(server.port, deadline, results, i))
+        for i in range(active)
+    ]
+    start = time.time()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.time() - start
+
+    server.stop()
+    for sock in idle_sockets:
+        sock.close()
+    return len(idle_sockets), sum(results) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de motores del servidor IRC")
+    parser.add_argument("--engines", nargs="+", choices=list(ENGINES), default=list(ENGINES))
+    parser.add_argument("--idle", type=int, default=1000, help="Conexiones ociosas")
+    parser.add_argument("--active", type=int, default=8, help="Clientes activos")
+    parser.add_argument("--duration", type=float, default=5.0, help="Segundos de medición")
+    args = parser.parse_args()
+
+    _raise_fd_limit()
+    rows = []
+    for name in args.engines:
+        # Silenciar los print del servidor durante la medición
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            rows.append((name, *run_engine(name, args.idle, args.active, args.duration)))
+
+    print(f"{'motor':<10} {'ociosas':>8} {'msgs/s':>10}")
+    for name, idle, rate in rows:
+        print(f"{name:<10} {idle:>8} {rate:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,514 @@
+# tests.irc.load_bench.py
+#
+# Generador de carga para el servidor IRC: levanta el servidor (en este
+# proceso o en un subproceso con run_server) en un puerto libre y lo conecta con
+# miles de clientes simulados, repartidos en varios procesos, que envían una
+# mezcla configurable de PRIVMSG, JOIN, WHO y NICK.
+#
+# Reporta comandos/s, mensajes entregados/s, latencia de entrega de PRIVMSG
+# (p50/p99/p999, del envío a la recepción en cada miembro del canal), CPU y
+# RSS del servidor. Con --output guarda el resultado en JSON para comparar
+# motores o versiones en la misma máquina.
+#
+# Uso: python3 tests/irc/load_bench.py --engine asyncio --clients 2000 --rate 1 \
+#          --mix privmsg=85,join=5,who=5,nick=5 --duration 10 --output asyncio.json
+
+import argparse
+import contextlib
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import selectors
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, ROOT)
+
+from Server.irc_server import IRCServer
+from Server.async_irc_server import AsyncIRCServer, _raise_fd_limit
+from Server.server_log import configure_logging
+
+ENGINES = {"threaded": IRCServer, "asyncio": AsyncIRCServer}
+OPERATIONS = ("privmsg", "join", "who", "nick")
+RESERVOIR = 50000  # Muestras de latencia que guarda cada proceso cliente
+DRAIN = 1.0        # Segundos para recibir lo que quedó en vuelo al terminar
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def parse_mix(text):
+    """
+    Convierte "privmsg=85,join=5,who=5,nick=5" en pesos por operación.
+
+    Raises:
+        argparse.ArgumentTypeError: Si una operación no existe o el peso no es válido.
+    """
+    mix = dict.fromkeys(OPERATIONS, 0)
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip().lower()
+        if name not in mix or not weight.strip().isdigit():
+            raise argparse.ArgumentTypeError(f"operación inválida en la mezcla: {item!r}")
+        mix[name] = int(weight)
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError("la mezcla no tiene ninguna operación con peso")
+    return mix
+
+
+# --- Uso de CPU y memoria del servidor ---
+
+def _proc_children():
+    """{ppid: [pid, ...]} de todos los procesos visibles en /proc."""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as stat:
+                    fields = stat.read().rsplit(")", 1)[1].split()
+            except OSError:
+                continue
+            children.setdefault(int(fields[1]), []).append(int(entry))
+    return children
+
+
+def process_usage(pid, tree=False):
+    """
+    CPU acumulada (segundos) y RSS actual (bytes) de pid, sumando sus
+    descendientes si tree es True (p. ej. los workers de --workers).
+
+    Returns:
+        tuple: (cpu, rss), o (None, None) si no hay /proc (solo Linux).
+    """
+    if not os.path.isdir("/proc"):
+        return None, None
+    pids = [pid]
+    if tree:
+        children = _proc_children()
+        for parent in pids:
+            pids.extend(children.get(parent, ()))
+    ticks = os.sysconf("SC_CLK_TCK")
+    page = os.sysconf("SC_PAGE_SIZE")
+    cpu = rss = 0
+    for each in pids:
+        try:
+            with open(f"/proc/{each}/stat") as stat:
+                fields = stat.read().rsplit(")", 1)[1].split()
+            with open(f"/proc/{each}/statm") as statm:
+                rss += int(statm.read().split()[1]) * page
+        except OSError:
+            continue  # El proceso terminó entre la lista y la lectura
+        cpu += (int(fields[11]) + int(fields[12])) / ticks  # utime + stime
+    return cpu, rss
+
+
+# --- Clientes simulados ---
+
+class SimClient:
+    """Una conexión simulada: su nick, sus canales y lo pendiente de enviar."""
+    __slots__ = ("sock", "nick", "channels", "inbuf", "outbuf", "writing", "joins_pending", "renames")
+
+    def __init__(self, sock, nick, channels):
+        self.sock = sock
+        self.nick = nick
+        self.channels = channels
+        self.inbuf = b""
+        self.outbuf = bytearray()
+        self.writing = False  # Registrado para EVENT_WRITE (hay salida pendiente)
+        self.joins_pending = len(channels)  # 366 que faltan para estar listo
+        self.renames = 0
+
+
+class ClientProcess:
+    """Maneja con un selector un grupo de clientes simulados dentro de un proceso."""
+    def __init__(self, index, port, first, count, args):
+        self.index = index
+        self.port = port
+        self.args = args
+        self.random = random.Random(args.seed * 1000 + index)
+        self.selector = selectors.DefaultSelector()
+        self.clients = []
+        self.first = first
+        self.count = count
+        self.sent = 0          # Comandos enviados durante la medición
+        self.received = 0      # Líneas recibidas durante la medición
+        self.delivered = 0     # PRIVMSG recibidos con marca de tiempo
+        self.samples = []      # Reservorio de latencias (ns)
+        self.measuring = False
+        weights = args.mix
+        self.operations = [op for op in OPERATIONS if weights[op]]
+        self.weights = [weights[op] for op in self.operations]
+        self.padding = "x" * max(0, args.size - 20)
+
+    def connect(self):
+        channels = [f"#load{i}" for i in range(self.args.channels)]
+        for i in range(self.first, self.first + self.count):
+            sock = socket.create_connection(("127.0.0.1", self.port))
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.setblocking(False)
+            joined = self.random.sample(channels, min(self.args.per_client, len(channels)))
+            client = SimClient(sock, f"load{i}", joined)
+            self.clients.append(client)
+            self.selector.register(sock, selectors.EVENT_READ, client)
+            self.send(client, f"NICK {client.nick}\r\nUSER load 0 * :Cliente de carga {i}\r\n"
+                              + "".join(f"JOIN {channel}\r\n" for channel in joined))
+
+    def send(self, client, text):
+        client.outbuf += text.encode("utf-8")
+        self.flush(client)
+
+    def flush(self, client):
+        try:
+            sent = client.sock.send(client.outbuf)
+        except BlockingIOError:
+            sent = 0
+        del client.outbuf[:sent]
+        writing = bool(client.outbuf)
+        if writing != client.writing:
+            client.writing = writing
+            events = selectors.EVENT_READ | (selectors.EVENT_WRITE if writing else 0)
+            self.selector.modify(client.sock, events, client)
+
+    def poll(self, timeout):
+        for key, events in self.selector.select(timeout):
+            client = key.data
+            if events & selectors.EVENT_WRITE:
+                self.flush(client)
+            if events & selectors.EVENT_READ:
+                try:
+                    data = client.sock.recv(65536)
+                except BlockingIOError:
+                    continue
+                if data:
+                    self.on_data(client, data)
+                else:
+                    self.selector.unregister(client.sock)  # El servidor cerró la conexión
+
+    def on_data(self, client, data):
+        now = time.monotonic_ns()
+        lines = (client.inbuf + data).split(b"\r\n")
+        client.inbuf = lines.pop()
+        for line in lines:
+            if not self.measuring:
+                if b" 366 " in line:
+                    client.joins_pending -= 1
+                continue
+            self.received += 1
+            # ":nick!user@host PRIVMSG #canal :<ns> xxx"
+            if b" PRIVMSG " in line:
+                stamp = line.partition(b" :")[2].partition(b" ")[0]
+                if stamp.isdigit():
+                    self.record(now - int(stamp))
+
+    def record(self, latency):
+        self.delivered += 1
+        if len(self.samples) < RESERVOIR:
+            self.samples.append(latency)
+        else:
+            slot = self.random.randrange(self.delivered)
+            if slot < RESERVOIR:
+                self.samples[slot] = latency
+
+    def ready(self):
+        return all(client.joins_pending <= 0 for client in self.clients)
+
+    def operate(self):
+        """Envía una operación de la mezcla desde un cliente al azar."""
+        client = self.random.choice(self.clients)
+        operation = self.random.choices(self.operations, self.weights)[0]
+        if operation == "privmsg":
+            channel = self.random.choice(client.channels)
+            text = f"PRIVMSG {channel} :{time.monotonic_ns()} {self.padding}\r\n"
+        elif operation == "join":
+            # PART de un canal y JOIN de otro, para que la membresía no crezca
+            old = self.random.choice(client.channels)
+            new = f"#load{self.random.randrange(self.args.channels)}"
+            if new in client.channels:
+                text = f"PART {old}\r\nJOIN {old}\r\n"
+            else:
+                client.channels[client.channels.index(old)] = new
+                text = f"PART {old}\r\nJOIN {new}\r\n"
+        elif operation == "who":
+            text = f"WHO {self.random.choice(client.channels)}\r\n"
+        else:
+            client.renames += 1
+            new = f"{client.nick.split('_')[0]}_{client.renames}"
+            text = f"NICK {new}\r\n"
+            client.nick = new
+        self.send(client, text)
+        self.sent += 1
+
+    def run(self, start_at, duration):
+        """Mide durante duration segundos a partir de start_at (reloj monotónico)."""
+        while time.monotonic() < start_at:
+            self.poll(max(0.0, start_at - time.monotonic()))
+        self.measuring = True
+        interval = 1.0 / (self.args.rate * self.count) if self.args.rate > 0 else 0.0
+        deadline = start_at + duration
+        next_op = start_at
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            if interval == 0.0 or now >= next_op:
+                self.operate()
+                next_op += interval
+                if next_op < now - 1.0:
+                    next_op = now  # El cliente no da abasto: no acumular atraso
+                self.poll(0)
+            else:
+                self.poll(min(next_op, deadline) - now)
+        # Recibir lo que quedó en vuelo (sin contarlo en el tiempo de medición)
+        drain_until = time.monotonic() + DRAIN
+        while time.monotonic() < drain_until:
+            self.poll(drain_until - time.monotonic())
+
+    def close(self):
+        for client in self.clients:
+            with contextlib.suppress(OSError):
+                client.sock.close()
+
+
+def client_main(index, port, first, count, args, connect, ready, start, results):
+    _raise_fd_limit()
+    worker = ClientProcess(index, port, first, count, args)
+    connect.wait()
+    worker.connect()
+    while not worker.ready():
+        worker.poll(0.1)
+    ready.put(index)
+    start.wait()
+    worker.run(start.start_at.value, args.duration)
+    results.put({
+        "sent": worker.sent,
+        "received": worker.received,
+        "delivered": worker.delivered,
+        "samples": worker.samples,
+    })
+    worker.close()
+
+
+class StartSignal:
+    """Evento con la hora (monotónica) a la que empieza la medición."""
+    def __init__(self):
+        self.event = multiprocessing.Event()
+        self.start_at = multiprocessing.Value("d", 0.0)
+
+    def set(self, start_at):
+        self.start_at.value = start_at
+        self.event.set()
+
+    def wait(self):
+        self.event.wait()
+
+
+# --- Servidor ---
+
+SERVER_SCRIPT = (
+    "import logging, sys\n"
+    "from Server.server_main import run_server\n"
+    "run_server(sys.argv[1], logging.WARNING, None, int(sys.argv[2]), int(sys.argv[3]))\n"
+)
+
+class InProcessServer:
+    def __init__(self, engine, port):
+        self.logs = configure_logging(logging.WARNING)
+        self.server = ENGINES[engine]("127.0.0.1", port)
+        self.server.backlog = 4096
+        self.pid = os.getpid()
+        self.tree = False
+
+    def start(self):
+        _raise_fd_limit()
+        # Silenciar los print del servidor durante la medición
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            self.server.start()
+
+    def stop(self):
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            self.server.stop()
+        self.logs.stop()
+
+
+class SubprocessServer:
+    def __init__(self, engine, port, workers):
+        self.command = [sys.executable, "-c", SERVER_SCRIPT, engine, str(workers), str(port)]
+        self.port = port
+        self.process = None
+        self.pid = None
+        self.tree = workers > 1
+
+    def start(self):
+        self.process = subprocess.Popen(self.command, cwd=ROOT, stdout=subprocess.DEVNULL,
+                                        stderr=subprocess.DEVNULL)
+        self.pid = self.process.pid
+        deadline = time.monotonic() + 15
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"el servidor terminó al iniciar (código {self.process.returncode})")
+            try:
+                socket.create_connection(("127.0.0.1", self.port), timeout=0.5).close()
+                return
+            except OSError:
+                time.sleep(0.1)
+        raise RuntimeError("el servidor no empezó a escuchar a tiempo")
+
+    def stop(self):
+        self.process.send_signal(signal.SIGINT)
+        try:
+            self.process.wait(10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+# --- Medición ---
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(args):
+    port = free_port()
+    # Los procesos cliente se crean antes de iniciar el servidor (sin hilos que heredar)
+    connect, start, ready, results = multiprocessing.Event(), StartSignal(), multiprocessing.Queue(), multiprocessing.Queue()
+    per_process = [args.clients // args.procs + (i < args.clients % args.procs) for i in range(args.procs)]
+    processes, first = [], 0
+    for index, count in enumerate(per_process):
+        if count:
+            processes.append(multiprocessing.Process(
+                target=client_main, args=(index, port, first, count, args, connect, ready, start, results)))
+        first += count
+    for process in processes:
+        process.start()
+
+    if args.server == "subprocess":
+        server = SubprocessServer(args.engine, port, args.workers)
+    else:
+        server = InProcessServer(args.engine, port)
+    try:
+        server.start()
+        connect.set()
+        for _ in processes:
+            ready.get(timeout=args.setup_timeout)
+
+        # Todos registrados y en sus canales: empieza la medición
+        start_at = time.monotonic() + 0.2
+        start.set(start_at)
+        time.sleep(max(0.0, start_at - time.monotonic()))
+        cpu_before, _ = process_usage(server.pid, server.tree)
+        time.sleep(args.duration)
+        cpu_after, rss = process_usage(server.pid, server.tree)
+
+        totals = [results.get(timeout=args.duration + DRAIN + 30) for _ in processes]
+        for process in processes:
+            process.join()
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        if server.pid is not None:
+            server.stop()
+
+    samples = sorted(sample for total in totals for sample in total["samples"])
+    sent = sum(total["sent"] for total in totals)
+    received = sum(total["received"] for total in totals)
+    delivered = sum(total["delivered"] for total in totals)
+    to_ms = lambda value: None if value is None else value / 1e6
+    return {
+        "config": {
+            "engine": args.engine, "server": args.server, "workers": args.workers,
+            "clients": args.clients, "procs": args.procs, "channels": args.channels,
+            "per_client": args.per_client, "rate": args.rate, "size": args.size,
+            "mix": args.mix, "duration": args.duration, "seed": args.seed,
+        },
+        "machine": {
+            "platform": platform.platform(), "python": platform.python_version(),
+            "cpus": os.cpu_count(), "commit": git_commit(),
+        },
+        "results": {
+            "commands_per_sec": sent / args.duration,
+            "lines_per_sec": received / args.duration,
+            "delivered_per_sec": delivered / args.duration,
+            "latency_ms": {
+                "p50": to_ms(percentile(samples, 0.50)),
+                "p99": to_ms(percentile(samples, 0.99)),
+                "p999": to_ms(percentile(samples, 0.999)),
+                "max": to_ms(samples[-1] if samples else None),
+                "samples": len(samples),
+            },
+            "server_cpu_percent": None if cpu_before is None else 100 * (cpu_after - cpu_before) / args.duration,
+            "server_rss_bytes": rss,
+        },
+    }
+
+
+def report(result):
+    config, results = result["config"], result["results"]
+    latency = results["latency_ms"]
+    fmt = lambda value, spec: "-" if value is None else format(value, spec)
+    print(f"motor: {config['engine']} ({config['server']}, {config['workers']} workers)  "
+          f"clientes: {config['clients']}  mezcla: {config['mix']}")
+    print(f"{'comandos/s':>12} {'entregas/s':>12} {'p50 ms':>8} {'p99 ms':>8} {'p999 ms':>8} {'CPU %':>7} {'RSS MiB':>8}")
+    rss = results["server_rss_bytes"]
+    print(f"{results['commands_per_sec']:>12.0f} {results['delivered_per_sec']:>12.0f} "
+          f"{fmt(latency['p50'], '.2f'):>8} {fmt(latency['p99'], '.2f'):>8} {fmt(latency['p999'], '.2f'):>8} "
+          f"{fmt(results['server_cpu_percent'], '.0f'):>7} {fmt(rss and rss / 2 ** 20, '.1f'):>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generador de carga y benchmark del servidor IRC")
+    parser.add_argument("--engine", choices=list(ENGINES), default="asyncio")
+    parser.add_argument("--server", choices=["inprocess", "subprocess"], default="inprocess",
+                        help="Servidor en este proceso o en un subproceso (como run_server)")
+    parser.add_argument("--workers", type=int, default=1, help="Workers del servidor (solo con --server subprocess)")
+    parser.add_argument("--clients", type=int, default=1000, help="Clientes simulados")
+    parser.add_argument("--procs", type=int, default=max(1, min(8, (os.cpu_count() or 2) // 2)),
+                        help="Procesos entre los que se reparten los clientes")
+    parser.add_argument("--channels", type=int, default=50, help="Canales disponibles")
+    parser.add_argument("--per-client", type=int, default=2, help="Canales de cada cliente")
+    parser.add_argument("--rate", type=float, default=1.0,
+                        help="Comandos por segundo de cada cliente (0 = tan rápido como se pueda)")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("privmsg=85,join=5,who=5,nick=5"),
+                        help="Pesos de cada operación, p. ej. privmsg=85,join=5,who=5,nick=5")
+    parser.add_argument("--size", type=int, default=64, help="Bytes aproximados de texto por PRIVMSG")
+    parser.add_argument("--duration", type=float, default=10.0, help="Segundos de medición")
+    parser.add_argument("--setup-timeout", type=float, default=120.0,
+                        help="Segundos máximos para registrar a todos los clientes")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Archivo JSON donde guardar el resultado")
+    args = parser.parse_args()
+    if args.workers > 1 and args.server != "subprocess":
+        parser.error("--workers requiere --server subprocess")
+    args.procs = max(1, min(args.procs, args.clients))
+
+    result = run(args)
+    report(result)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(result, output, indent=2)
+        print(f"resultado guardado en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# tests.irc.memory_bench.py
+#
+# Memoria por usuario y por conexión del servidor, para seguirla de una
+# versión a otra:
+#   - estado: registros de clientes y canales creados directamente con los
+#     helpers del servidor (sin sockets), medidos con tracemalloc;
+#   - conexión: conexiones reales registradas desde otro proceso, medidas con
+#     tracemalloc y con el RSS del proceso servidor.
+#
+# Uso: python3 tests/irc/memory_bench.py --users 20000 --connections 2000 --engine asyncio
+
+import argparse
+import gc
+import logging
+import multiprocessing
+import os
+import socket
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from Server.irc_server import IRCServer
+from Server.async_irc_server import AsyncIRCServer
+from Server.server_log import configure_logging
+
+ENGINES = {"threaded": IRCServer, "asyncio": AsyncIRCServer}
+
+
+def rss_bytes():
+    """RSS actual del proceso (Linux); None si no se puede leer."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def measure_state(users, channels, per_user):
+    """Bytes por usuario de los registros: nick, datos de USER y canales."""
+    server = IRCServer("127.0.0.1", 0)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(users):
+        nick = f"user{i}"
+        server._add_client(nick, None, "127.0.0.1")
+        client = server.clients[nick]
+        client.username = f"u{i}"
+        client.realname = f"Usuario {i}"
+        for j in range(per_user):
+            channel = f"#canal{(i + j) % channels}"
+            if channel not in server.channels:
+                server._create_channel(channel)
+            server._add_member(channel, nick)
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / users
+
+
+def hold_connections(port, count, ready, release):
+    socks = []
+    for i in range(count):
+        sock = socket.create_connection(("127.0.0.1", port))
+        sock.sendall(f"NICK c{i}\r\nUSER c 0 * :Conexión {i}\r\n".encode())
+        socks.append(sock)
+    ready.set()
+    release.wait()
+    for sock in socks:
+        # Leer lo pendiente (bienvenida) para cerrar sin RST
+        sock.setblocking(False)
+        try:
+            while sock.recv(65536):
+                pass
+        except OSError:
+            pass
+        sock.close()
+
+
+def measure_connections(engine, count):
+    """Bytes por conexión registrada: (tracemalloc, RSS)."""
+    server = ENGINES[engine]("127.0.0.1", 0)
+    server.ping_interval = 3600  # Sin PING durante la medición
+    server.start()
+    gc.collect()
+    tracemalloc.start()
+    traced_before = tracemalloc.get_traced_memory()[0]
+    rss_before = rss_bytes()
+
+    ready, release = multiprocessing.Event(), multiprocessing.Event()
+    holder = multiprocessing.Process(target=hold_connections, args=(server.port, count, ready, release))
+    holder.start()
+    ready.wait()
+    while len(server.clients) < count:
+        time.sleep(0.05)
+    gc.collect()
+    traced = (tracemalloc.get_traced_memory()[0] - traced_before) / count
+    rss = rss_bytes()
+    tracemalloc.stop()
+
+    release.set()
+    holder.join()
+    server.stop()
+    return traced, (rss - rss_before) / count if rss is not None and rss_before is not None else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memoria por usuario y por conexión del servidor IRC")
+    parser.add_argument("--users", type=int, default=20000, help="Usuarios para la medición de estado")
+    parser.add_argument("--channels", type=int, default=500, help="Canales para la medición de estado")
+    parser.add_argument("--per-user", type=int, default=3, help="Canales por usuario")
+    parser.add_argument("--connections", type=int, default=1000, help="Conexiones reales (0 = omitir)")
+    parser.add_argument("--engine", choices=list(ENGINES), default="asyncio")
+    args = parser.parse_args()
+
+    logs = configure_logging(logging.WARNING)
+    state = measure_state(args.users, args.channels, args.per_user)
+    print(f"estado: {state:.0f} bytes/usuario ({args.users} usuarios, {args.per_user} canales c/u)")
+    if args.connections:
+        traced, rss = measure_connections(args.engine, args.connections)
+        rss_text = f", RSS {rss:.0f} bytes/conexión" if rss is not None else ""
+        print(f"conexión ({args.engine}): {traced:.0f} bytes/conexión en Python{rss_text}")
+    logs.stop()
+
+
+if __name__ == "__main__":
+    main()
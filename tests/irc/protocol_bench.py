@@ -0,0 +1,288 @@
+# tests.irc.protocol_bench.py
+#
+# Microbenchmark de Common/irc_protocol: parse_message, parse_bytes y
+# build_message sobre corpus realistas (numéricos, PRIVMSG con texto largo, líneas con tags de
+# IRCv3 y entradas mal formadas). Para cada corpus reporta:
+#   - ns/msg: mejor de --repeat pasadas completas sobre el corpus;
+#   - bloques/msg: objetos que deja vivos el resultado de cada llamada
+#     (tupla, cadenas, lista de parámetros), con sys.getallocatedblocks;
+#   - pico B/msg: memoria máxima reservada durante una llamada (tracemalloc).
+#
+# Sirve de control de aceptación para cambios del parser: --output guarda el
+# resultado en JSON y --baseline compara con uno anterior; termina con código
+# 1 si un corpus es más lento que --max-regression o si los resultados del
+# parser cambiaron.
+#
+# Uso: python3 tests/irc/protocol_bench.py --output antes.json
+#      python3 tests/irc/protocol_bench.py --baseline antes.json --max-regression 10
+
+import argparse
+import contextlib
+import gc
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from Common.irc_protocol import parse_message, parse_bytes, build_message
+from Common.custom_errors import ProtocolError
+
+WORDS = ("hola", "canal", "servidor", "mensaje", "prueba", "nick", "latencia", "cliente",
+         "enlace", "ráfaga", "réplica", "tema", "lista", "árbol", "conexión")
+
+
+def _nick(rng):
+    return rng.choice(("ana", "bob", "carla", "diego", "eva", "fer")) + str(rng.randrange(1000))
+
+
+def corpus_numerics(rng, size):
+    lines = []
+    for _ in range(size):
+        nick = _nick(rng)
+        channel = f"#canal{rng.randrange(50)}"
+        lines.append(rng.choice((
+            f":mock.server 001 {nick} :Bienvenido al servidor",
+            f":mock.server 353 {nick} = {channel} :" + " ".join(("@" if i == 0 else "") + _nick(rng) for i in range(rng.randrange(5, 40))),
+            f":mock.server 366 {nick} {channel} :Fin de la lista NAMES",
+            f":mock.server 322 {nick} {channel} {rng.randrange(200)} :" + " ".join(rng.choices(WORDS, k=6)),
+            f":mock.server 352 {nick} {channel} u 127.0.0.1 mock.server {_nick(rng)} H :0 Nombre Real",
+            f":mock.server 433 * {nick} :El nick ya está en uso",
+            f":mock.server 311 {nick} {_nick(rng)} u 127.0.0.1 * :Nombre Real",
+        )))
+    return lines
+
+
+def corpus_privmsg(rng, size):
+    lines = []
+    for _ in range(size):
+        nick = _nick(rng)
+        target = rng.choice((f"#canal{rng.randrange(50)}", _nick(rng)))
+        text = " ".join(rng.choices(WORDS, k=rng.randrange(20, 60)))[:420]
+        lines.append(f":{nick}!{nick}@mock.server PRIVMSG {target} :{text}")
+    return lines
+
+
+def corpus_tagged(rng, size):
+    lines = []
+    for i in range(size):
+        nick = _nick(rng)
+        tags = [f"time=2026-10-17T12:{i % 60:02d}:{rng.randrange(60):02d}.{rng.randrange(1000):03d}Z",
+                f"msgid={rng.getrandbits(64):016x}"]
+        if rng.random() < 0.5:
+            tags.append(f"account={nick}")
+        if rng.random() < 0.3:
+            tags.append("+draft/reply=" + f"{rng.getrandbits(32):08x}")
+        body = rng.choice((
+            f":{nick}!{nick}@mock.server PRIVMSG #canal{rng.randrange(50)} :" + " ".join(rng.choices(WORDS, k=12)),
+            f":{nick}!{nick}@mock.server JOIN #canal{rng.randrange(50)}",
+            f":mock.server BATCH +{rng.getrandbits(24):06x} chathistory #canal{rng.randrange(50)}",
+        ))
+        lines.append("@" + ";".join(tags) + " " + body)
+    return lines
+
+
+def corpus_malformed(rng, size):
+    samples = ("", " ", ":", ":solo.prefijo", ":prefijo ", " :solo trailing", "PRIVMSG", "PRIVMSG  #a  :",
+               ":a!b@c", "\x00\x01 basura", "::: ::", ":x " + " ".join(["p"] * 20), "NOTICE :" + ":" * 50,
+               "@tag=sin-comando", "@", ":a b :c :d :e")
+    return [rng.choice(samples) for _ in range(size)]
+
+
+CORPORA = {
+    "numerics": corpus_numerics,
+    "privmsg": corpus_privmsg,
+    "tagged": corpus_tagged,
+    "malformed": corpus_malformed,
+}
+
+
+def parse_or_none(line):
+    try:
+        return parse_message(line)
+    except ProtocolError:
+        return None
+
+
+def parse_bytes_or_none(line):
+    try:
+        return parse_bytes(line)
+    except ProtocolError:
+        return None
+
+
+def decode_all(line):
+    """parse_bytes leyendo todos los campos, como hace la interfaz gráfica."""
+    try:
+        return tuple(parse_bytes(line))
+    except ProtocolError:
+        return None
+
+
+def normalize(result):
+    """Resultado del parser como tupla comparable (prefix, command, params, trailing)."""
+    if result is None:
+        return None
+    prefix, command, params, trailing = result
+    return prefix, command, list(params), trailing
+
+
+def digest(results):
+    """Huella de los resultados del parser, para detectar cambios de comportamiento."""
+    text = json.dumps([normalize(result) for result in results], ensure_ascii=False)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def time_per_call(function, items, repeat):
+    """Mejor tiempo de repeat pasadas completas, en ns por elemento (sin el GC, como timeit)."""
+    best = None
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter_ns()
+            for item in items:
+                function(item)
+            elapsed = time.perf_counter_ns() - start
+            best = elapsed if best is None else min(best, elapsed)
+    finally:
+        gc.enable()
+    return best / len(items)
+
+
+def blocks_per_call(function, items):
+    """Objetos que quedan vivos por cada resultado (conservando todos los resultados)."""
+    gc.collect()
+    gc.disable()
+    try:
+        before = sys.getallocatedblocks()
+        kept = [function(item) for item in items]
+        after = sys.getallocatedblocks()
+    finally:
+        gc.enable()
+    # La lista kept aporta un bloque propio; se descuenta
+    return max(0, after - before - 1) / len(items), kept
+
+
+def peak_per_call(function, items):
+    """Pico medio de memoria (bytes) reservada dentro de una llamada."""
+    tracemalloc.start()
+    total = 0
+    for item in items:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        result = function(item)
+        total += tracemalloc.get_traced_memory()[1] - base
+        del result
+    tracemalloc.stop()
+    return total / len(items)
+
+
+def measure(function, items, repeat):
+    ns = time_per_call(function, items, repeat)
+    blocks, kept = blocks_per_call(function, items)
+    peak = peak_per_call(function, items[:2000])
+    return {"ns_per_msg": ns, "blocks_per_msg": blocks, "peak_bytes_per_msg": peak}, kept
+
+
+def build_args(parsed):
+    """(command, params, trailing) para build_message a partir de los resultados del parser."""
+    args = []
+    for result in parsed:
+        if result is not None:
+            prefix, command, params, trailing = result
+            args.append((command, list(params), trailing))
+    return args
+
+
+def run(size, repeat, seed):
+    results = {}
+    for name, generate in CORPORA.items():
+        lines = generate(random.Random(seed), size)
+        parse_stats, parsed = measure(parse_or_none, lines, repeat)
+        parse_stats["errors"] = sum(result is None for result in parsed)
+        parse_stats["digest"] = digest(parsed)
+        results[f"parse/{name}"] = parse_stats
+
+        # La misma línea ya en bytes, como la entrega el framer
+        encoded = [line.encode("utf-8") for line in lines]
+        for key, function in ((f"bytes/{name}", parse_bytes_or_none), (f"bytes+campos/{name}", decode_all)):
+            stats, kept = measure(function, encoded, repeat)
+            stats["errors"] = sum(result is None for result in kept)
+            stats["digest"] = digest(kept)
+            results[key] = stats
+
+        messages = build_args(parsed)
+        if messages:
+            build = lambda message: build_message(*message)
+            build_stats, built = measure(build, messages, repeat)
+            build_stats["digest"] = hashlib.sha256("\n".join(built).encode("utf-8")).hexdigest()[:16]
+            results[f"build/{name}"] = build_stats
+    return results
+
+
+def compare(results, baseline, max_regression):
+    """
+    Compara con un resultado anterior.
+
+    Returns:
+        list: Problemas encontrados (vacía si el cambio es aceptable).
+    """
+    problems = []
+    for key, stats in results.items():
+        before = baseline.get(key)
+        if before is None:
+            continue
+        change = 100 * (stats["ns_per_msg"] / before["ns_per_msg"] - 1)
+        stats["change_percent"] = change
+        if change > max_regression:
+            problems.append(f"{key}: {change:+.1f}% más lento (límite {max_regression:+.1f}%)")
+        if stats["digest"] != before["digest"]:
+            problems.append(f"{key}: los resultados cambiaron respecto de la línea base")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark de parse_message y build_message")
+    parser.add_argument("--size", type=int, default=20000, help="Mensajes por corpus")
+    parser.add_argument("--repeat", type=int, default=5, help="Pasadas por corpus (se toma la mejor)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Archivo JSON donde guardar el resultado")
+    parser.add_argument("--baseline", help="Resultado JSON anterior con el que comparar")
+    parser.add_argument("--max-regression", type=float, default=10.0,
+                        help="Porcentaje máximo de aumento de ns/msg aceptado frente a --baseline")
+    args = parser.parse_args()
+
+    # parse_message puede escribir en stdout; no se muestra durante la medición
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        results = run(args.size, args.repeat, args.seed)
+
+    problems = []
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            problems = compare(results, json.load(baseline)["results"], args.max_regression)
+
+    print(f"{'caso':<24} {'ns/msg':>9} {'bloques/msg':>12} {'pico B/msg':>11} {'cambio':>8}")
+    for key, stats in results.items():
+        change = stats.get("change_percent")
+        change = "-" if change is None else f"{change:+.1f}%"
+        print(f"{key:<24} {stats['ns_per_msg']:>9.0f} {stats['blocks_per_msg']:>12.1f} "
+              f"{stats['peak_bytes_per_msg']:>11.0f} {change:>8}")
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump({"config": {"size": args.size, "repeat": args.repeat, "seed": args.seed,
+                                  "python": sys.version.split()[0]},
+                       "results": results}, output, indent=2)
+        print(f"resultado guardado en {args.output}")
+
+    for problem in problems:
+        print(f"[BENCH] {problem}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+# tests.irc.test_cluster.py
+#
+# Pruebas de las reservas del clúster sin bloquear al worker: NICK y JOIN
+# esperan la respuesta del coordinador sin detener a los demás clientes, y
+# las reservas que no se usan (respuesta tardía o comando fallido) se
+# devuelven con RELEASE.
+#
+# Uso: python3 -m pytest tests/irc/test_cluster.py
+
+import itertools
+import os
+import socket
+import sys
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from Server.cluster import ClusterHub, cluster_server_class
+from Server.server_main import ENGINES
+
+
+class FakeLink:
+    """Canal con el coordinador que solo registra lo enviado; las respuestas las da la prueba."""
+
+    def __init__(self):
+        self.ids = itertools.count()
+        self.sent = []
+
+    def send(self, message):
+        self.sent.append(message)
+
+    def requests(self, kind):
+        return [message for message in self.sent if message[0] == kind]
+
+
+class FakeConn:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, message):
+        self.sent.append(message)
+
+
+def wait_for(condition, timeout=3):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class ClusterWorkerTest(unittest.TestCase):
+    def start_worker(self, engine):
+        server = cluster_server_class(ENGINES[engine])("127.0.0.1", 0)
+        link = FakeLink()
+        server.join_cluster(link, 0)
+        server.start()
+        self.addCleanup(server.stop)
+        return server, link
+
+    def connect(self, server):
+        sock = socket.create_connection(("127.0.0.1", server.port))
+        sock.settimeout(0.3)
+        self.addCleanup(sock.close)
+        return sock
+
+    def read(self, sock):
+        out = b""
+        try:
+            while True:
+                data = sock.recv(65536)
+                if not data:
+                    break
+                out += data
+        except socket.timeout:
+            pass
+        return out.decode("utf-8")
+
+    def reply(self, server, request, granted):
+        server._call_in_server(server._on_link_message, ("REPLY", request[1], granted))
+
+    def register(self, server, link, nick):
+        sock = self.connect(server)
+        sock.sendall(f"NICK {nick}\r\nUSER {nick} 0 * :{nick}\r\n".encode("utf-8"))
+        self.assertTrue(wait_for(lambda: any(request[2] == nick for request in link.requests("CLAIM"))))
+        self.reply(server, [request for request in link.requests("CLAIM") if request[2] == nick][-1], True)
+        self.assertIn(" 001 ", self.read(sock))
+        return sock
+
+    def test_la_espera_no_bloquea_a_los_demas(self):
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                server, link = self.start_worker(engine)
+                bob = self.register(server, link, "bob")
+
+                ana = self.connect(server)
+                ana.sendall(b"NICK ana\r\nUSER ana 0 * :ana\r\nJOIN #c\r\n")
+                self.assertTrue(wait_for(lambda: len(link.requests("CLAIM")) == 2))
+                bob.sendall(b"PING :sigo\r\n")
+                self.assertIn("PONG", self.read(bob))  # Atendido mientras ana espera
+                self.assertEqual(self.read(ana), "")
+
+                self.reply(server, link.requests("CLAIM")[-1], True)
+                self.assertTrue(wait_for(lambda: link.requests("CREATE")))
+                self.reply(server, link.requests("CREATE")[-1], True)
+                reply = self.read(ana)
+                self.assertIn(" 001 ana ", reply)
+                self.assertIn(":mock.server 353 ana = #c :@ana", reply)
+                self.assertEqual(link.requests("RELEASE"), [])
+
+    def test_nick_denegado(self):
+        server, link = self.start_worker("threaded")
+        sock = self.connect(server)
+        sock.sendall(b"NICK ana\r\n")
+        self.assertTrue(wait_for(lambda: link.requests("CLAIM")))
+        self.reply(server, link.requests("CLAIM")[-1], False)
+        self.assertIn(" 433 * ana ", self.read(sock))
+        self.assertNotIn("ana", server.clients)
+
+    def test_respuesta_tardia_se_libera(self):
+        with mock.patch("Server.cluster.CLAIM_TIMEOUT", 0.5):
+            server, link = self.start_worker("threaded")
+            sock = self.connect(server)
+            sock.sendall(b"NICK ana\r\n")
+            self.assertTrue(wait_for(lambda: link.requests("CLAIM")))
+            # Sin respuesta: vence la espera y el NICK se rechaza
+            sock.settimeout(3)
+            self.assertIn(" 433 * ana ", sock.recv(4096).decode("utf-8"))
+        self.reply(server, link.requests("CLAIM")[-1], True)
+        self.assertTrue(wait_for(lambda: link.requests("RELEASE")))
+        self.assertEqual(link.requests("RELEASE"), [("RELEASE", "CLAIM", "ana")])
+
+    def test_desconexion_en_espera_libera_lo_concedido(self):
+        server, link = self.start_worker("threaded")
+        self.register(server, link, "bob")
+        sock = self.connect(server)
+        sock.sendall(b"NICK ana\r\n")
+        self.assertTrue(wait_for(lambda: len(link.requests("CLAIM")) == 2))
+        sock.close()
+        self.assertTrue(wait_for(lambda: not server.parked))
+        self.reply(server, link.requests("CLAIM")[-1], True)
+        self.assertTrue(wait_for(lambda: link.requests("RELEASE")))
+        self.assertEqual(link.requests("RELEASE"), [("RELEASE", "CLAIM", "ana")])
+
+
+class ClusterHubTest(unittest.TestCase):
+    def test_release_devuelve_reservas_sin_usar(self):
+        hub = ClusterHub([FakeConn(), FakeConn()])
+        hub._on_message(0, ("CLAIM", 1, "ana"))
+        hub._on_message(0, ("CREATE", 2, "#c"))
+        self.assertEqual(hub.owners, {"ana": 0})
+        hub._on_message(0, ("RELEASE", "CLAIM", "ana"))
+        hub._on_message(0, ("RELEASE", "CREATE", "#c"))
+        self.assertEqual(hub.owners, {})
+        self.assertEqual(hub.channels, {})
+        # Otro worker ya puede tomarlos
+        hub._on_message(1, ("CLAIM", 3, "ana"))
+        hub._on_message(1, ("CREATE", 4, "#c"))
+        self.assertEqual(hub.conns[1].sent, [("REPLY", 3, True), ("REPLY", 4, True)])
+
+    def test_release_no_quita_lo_de_otro_ni_un_canal_con_miembros(self):
+        hub = ClusterHub([FakeConn(), FakeConn()])
+        hub._on_message(0, ("CLAIM", 1, "ana"))
+        hub._on_message(0, ("CREATE", 2, "#c"))
+        hub._on_message(0, ("EVENT", ("JOIN", "#c", "ana", "@")))
+        hub._on_message(1, ("RELEASE", "CLAIM", "ana"))
+        hub._on_message(0, ("RELEASE", "CREATE", "#c"))
+        self.assertEqual(hub.owners, {"ana": 0})
+        self.assertEqual(hub.channels, {"#c": {"ana"}})
+
+
+if __name__ == "__main__":
+    unittest.main()
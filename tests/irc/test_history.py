@@ -0,0 +1,145 @@
+# tests.irc.test_history.py
+#
+# Pruebas del historial de CHATHISTORY: anillos acotados, selectores
+# LATEST/BEFORE/AFTER y búferes de conversaciones privadas por nick exacto.
+#
+# Uso: python3 -m pytest tests/irc/test_history.py
+
+import os
+import socket
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from Server.capabilities import server_time
+from Server.history import ChatHistory, HistoryBuffer, HistoryEntry
+from Server.server_main import ENGINES
+
+BASE = 1_700_000_000  # Segundos: hora de la primera entrada de las pruebas
+
+
+def entry(index, text=None):
+    """Entrada con msgid "m<index>" y hora BASE + index segundos."""
+    line = f":ana!a@mock.server PRIVMSG #c :{text or index}".encode("utf-8")
+    return HistoryEntry(f"m{index}", server_time(BASE + index), line)
+
+
+def texts(entries):
+    return [item.line.rsplit(b":", 1)[1].decode() for item in entries]
+
+
+class HistoryBufferTest(unittest.TestCase):
+    def test_descarta_lo_mas_antiguo_al_superar_las_lineas(self):
+        buffer = HistoryBuffer(max_lines=3)
+        for index in range(5):
+            buffer.append(entry(index))
+        self.assertEqual(texts(buffer.entries), ["2", "3", "4"])
+        self.assertEqual(buffer.size, sum(item.size for item in buffer.entries))
+
+    def test_descarta_lo_mas_antiguo_al_superar_los_bytes(self):
+        size = entry(0).size
+        buffer = HistoryBuffer(max_bytes=size * 2)
+        for index in range(4):
+            buffer.append(entry(index))
+        self.assertEqual(texts(buffer.entries), ["2", "3"])
+
+    def test_conserva_un_mensaje_mayor_que_el_limite(self):
+        buffer = HistoryBuffer(max_bytes=10)
+        buffer.append(entry(0))
+        self.assertEqual(len(buffer.entries), 1)
+
+    def test_selectores(self):
+        buffer = HistoryBuffer()
+        for index in range(6):
+            buffer.append(entry(index))
+        at = lambda index: ("timestamp", (BASE + index) * 1000)
+        self.assertEqual(texts(buffer.select("LATEST", None, 2)), ["4", "5"])
+        self.assertEqual(texts(buffer.select("LATEST", ("msgid", "m3"), 10)), ["4", "5"])
+        self.assertEqual(texts(buffer.select("BEFORE", ("msgid", "m3"), 2)), ["1", "2"])
+        self.assertEqual(texts(buffer.select("AFTER", ("msgid", "m3"), 1)), ["4"])
+        self.assertEqual(texts(buffer.select("BEFORE", at(2), 10)), ["0", "1"])
+        self.assertEqual(texts(buffer.select("AFTER", at(2), 10)), ["3", "4", "5"])
+        self.assertEqual(buffer.select("AFTER", ("msgid", "no-existe"), 10), None)
+
+
+class ChatHistoryTest(unittest.TestCase):
+    def test_conversaciones_privadas_por_nick_exacto(self):
+        self.assertEqual(ChatHistory.key("bob", "Ana"), ("Ana", "bob"))
+        self.assertNotEqual(ChatHistory.key("bob", "Ana"), ChatHistory.key("bob", "ana"))
+        self.assertEqual(ChatHistory.key("#c", "Ana"), "#c")
+
+    def test_drop_nick_solo_olvida_ese_nick(self):
+        history = ChatHistory()
+        history.record(ChatHistory.key("bob", "Ana"), entry(0))
+        history.record(ChatHistory.key("bob", "ana"), entry(1))
+        history.record("#c", entry(2))
+        history.drop_nick("ana")
+        self.assertIsNotNone(history.get(("Ana", "bob")))
+        self.assertIsNone(history.get(("ana", "bob")))
+        self.assertIsNotNone(history.get("#c"))
+        self.assertNotIn("ana", history.by_nick)
+        self.assertEqual(history.size, entry(0).size + entry(2).size)
+
+    def test_descarta_el_bufer_usado_hace_mas_tiempo(self):
+        size = entry(0).size
+        history = ChatHistory(max_total_bytes=size * 3)
+        history.record("#a", entry(0))
+        history.record(ChatHistory.key("bob", "Ana"), entry(1))
+        history.record("#a", entry(2))   # #a pasa a ser el más reciente
+        history.record("#b", entry(3))
+        self.assertIsNone(history.get(("Ana", "bob")))
+        self.assertEqual(history.by_nick, {})
+        self.assertEqual(list(history.buffers), ["#a", "#b"])
+
+
+class ChatHistoryServerTest(unittest.TestCase):
+    """CHATHISTORY contra un servidor real con dos clientes que solo difieren en mayúsculas."""
+
+    def connect(self, server, nick):
+        sock = socket.create_connection(("127.0.0.1", server.port))
+        sock.settimeout(0.3)
+        sock.sendall(f"NICK {nick}\r\nUSER {nick} 0 * :{nick}\r\n".encode("utf-8"))
+        self.addCleanup(sock.close)
+        self.read(sock)
+        return sock
+
+    def read(self, sock):
+        out = b""
+        try:
+            while True:
+                data = sock.recv(65536)
+                if not data:
+                    break
+                out += data
+        except socket.timeout:
+            pass
+        return out.decode("utf-8")
+
+    def test_nicks_que_solo_difieren_en_mayusculas(self):
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                server = ENGINES[engine]("127.0.0.1", 0)
+                server.start()
+                self.addCleanup(server.stop)
+                upper = self.connect(server, "Ana")
+                bob = self.connect(server, "bob")
+                lower = self.connect(server, "ana")
+
+                upper.sendall(b"PRIVMSG bob :secreto para bob\r\n")
+                self.read(bob)
+                lower.sendall(b"CHATHISTORY LATEST bob * 10\r\n")
+                reply = self.read(lower)
+                self.assertNotIn("secreto", reply)
+                self.assertIn("Fin del historial de bob (0 mensajes)", reply)
+
+                # Que "ana" se vaya no borra la conversación de "Ana"
+                lower.sendall(b"QUIT :chau\r\n")
+                time.sleep(0.2)
+                bob.sendall(b"CHATHISTORY LATEST Ana * 10\r\n")
+                self.assertIn(":Ana!Ana@mock.server PRIVMSG bob :secreto para bob", self.read(bob))
+
+
+if __name__ == "__main__":
+    unittest.main()
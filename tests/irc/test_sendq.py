@@ -0,0 +1,157 @@
+# tests.irc.test_sendq.py
+#
+# Pruebas de la cola de salida acotada: desborde (ERROR :SendQ exceeded y
+# desconexión), tope aparte para las respuestas retenidas y orden de
+# hold/release. QueuedSocket se prueba con un socket que nunca se vacía.
+#
+# Uso: python3 -m pytest tests/irc/test_sendq.py
+
+import os
+import sys
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from Server.sendq import SENDQ_EXCEEDED, QueuedSocket, SendQ
+
+
+class SendQTest(unittest.TestCase):
+    def test_desborde_deja_solo_el_error_y_cierra(self):
+        sendq = SendQ(100)
+        self.assertTrue(sendq.push(b"a" * 60))
+        self.assertFalse(sendq.push(b"b" * 60))
+        self.assertTrue(sendq.exceeded)
+        self.assertTrue(sendq.closing)
+        self.assertEqual(list(sendq.chunks), [SENDQ_EXCEEDED])
+        self.assertEqual(sendq.size, len(SENDQ_EXCEEDED))
+        # Ya cerrando: lo que llegue después se descarta sin tocar la cola
+        self.assertTrue(sendq.push(b"c"))
+        self.assertEqual(sendq.pop_all(), SENDQ_EXCEEDED)
+
+    def test_respuestas_propias_no_cuentan_para_el_limite(self):
+        sendq = SendQ(100, max_reply_bytes=1000)
+        self.assertTrue(sendq.push_reply([b"r" * 80, b"r" * 80, b"r" * 80]))
+        self.assertTrue(sendq.push(b"a" * 90))
+        self.assertFalse(sendq.exceeded)
+        self.assertEqual(sendq.size, 330)
+        self.assertEqual(sendq.reply_bytes, 240)
+
+    def test_respuesta_tras_un_atraso_ajeno_desborda(self):
+        sendq = SendQ(100, max_reply_bytes=1000)
+        self.assertTrue(sendq.push(b"a" * 90))
+        self.assertFalse(sendq.push_reply([b"r" * 20]))
+        self.assertTrue(sendq.exceeded)
+
+    def test_tope_de_respuestas_sin_leer(self):
+        sendq = SendQ(100, max_reply_bytes=200)
+        self.assertFalse(sendq.push_reply([b"r" * 80, b"r" * 80, b"r" * 80]))
+        self.assertTrue(sendq.exceeded)
+        self.assertEqual(list(sendq.chunks), [SENDQ_EXCEEDED])
+        self.assertEqual(sendq.reply_bytes, 0)
+
+    def test_pop_all_libera_el_tope_de_respuestas(self):
+        sendq = SendQ(100, max_reply_bytes=200)
+        self.assertTrue(sendq.push_reply([b"r" * 80, b"r" * 80]))
+        self.assertEqual(sendq.pop_all(), b"r" * 160)
+        self.assertTrue(sendq.push_reply([b"r" * 80, b"r" * 80]))
+        self.assertFalse(sendq.exceeded)
+
+    def test_hold_release_conserva_el_orden(self):
+        sendq = SendQ(100)
+        sendq.push(b"1")
+        sendq.hold()
+        sendq.push(b"2")
+        sendq.push(b"3")
+        self.assertEqual(list(sendq.chunks), [b"1"])  # Lo retenido no llega al escritor
+        held = sendq.release()
+        self.assertEqual(held, [b"2", b"3"])
+        self.assertIsNone(sendq.held)
+        sendq.push_reply(held)
+        sendq.push(b"4")
+        self.assertEqual(sendq.pop_all(), b"1234")
+
+    def test_retener_no_aplica_el_limite(self):
+        sendq = SendQ(10)
+        sendq.hold()
+        self.assertTrue(sendq.push(b"x" * 50))
+        self.assertFalse(sendq.exceeded)
+        self.assertEqual(sendq.size, 0)
+
+    def test_flush_held_encola_lo_retenido(self):
+        sendq = SendQ(100)
+        sendq.hold()
+        sendq.push(b"adios")
+        sendq.flush_held()
+        self.assertIsNone(sendq.held)
+        self.assertEqual(sendq.pop_all(), b"adios")
+
+
+class StalledSocket:
+    """Socket cuyo sendall se bloquea hasta release() o close(), como un cliente que no lee."""
+
+    def __init__(self):
+        self.sent = []
+        self.writing = threading.Event()  # El escritor ya está bloqueado en sendall
+        self.released = threading.Event()
+        self.closed = threading.Event()
+
+    def sendall(self, data):
+        self.writing.set()
+        while not self.released.wait(0.01):
+            if self.closed.is_set():
+                raise OSError("socket cerrado")
+        self.sent.append(data)
+
+    def release(self):
+        self.released.set()
+
+    def shutdown(self, how):
+        pass
+
+    def close(self):
+        self.closed.set()
+
+    def getpeername(self):
+        return ("127.0.0.1", 0)
+
+
+class QueuedSocketTest(unittest.TestCase):
+    def test_lector_que_no_lee_se_desconecta(self):
+        sock = StalledSocket()
+        with mock.patch("Server.sendq.CLOSE_GRACE", 0.2):
+            queued = QueuedSocket(sock, 100)
+            queued.sendall(b"a" * 50)  # El escritor lo toma y queda bloqueado
+            self.assertTrue(sock.writing.wait(2))
+            queued.sendall(b"b" * 60)
+            queued.sendall(b"c" * 60)  # Supera los 100 bytes pendientes
+            self.assertTrue(queued.sendq.exceeded)
+            # Nadie vacía la cola: el margen de cierre corta la conexión
+            self.assertTrue(sock.closed.wait(2))
+        self.assertEqual(sock.sent, [])
+
+    def test_el_error_sale_antes_de_cerrar(self):
+        sock = StalledSocket()
+        queued = QueuedSocket(sock, 100)
+        queued.sendall(b"a" * 50)
+        self.assertTrue(sock.writing.wait(2))
+        queued.sendall(b"b" * 60)
+        queued.sendall(b"c" * 60)
+        sock.release()  # El cliente vuelve a leer dentro del margen
+        self.assertTrue(sock.closed.wait(2))
+        self.assertEqual(sock.sent, [b"a" * 50, SENDQ_EXCEEDED])
+
+    def test_respuesta_grande_no_desconecta(self):
+        sock = StalledSocket()
+        queued = QueuedSocket(sock, 100)
+        queued.send_reply([b"r" * 80] * 5)
+        self.assertFalse(queued.sendq.exceeded)
+        sock.release()
+        queued.close()
+        self.assertTrue(sock.closed.wait(2))
+        self.assertEqual(b"".join(sock.sent), b"r" * 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+# tests.irc.test_timer_wheel.py
+#
+# Pruebas de la rueda de temporizadores: vencimiento por ticks,
+# reprogramación y cancelación por clave, demoras de más de una vuelta y
+# avances atrasados.
+#
+# Uso: python3 -m pytest tests/irc/test_timer_wheel.py
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from Server.timer_wheel import TimerWheel
+
+
+def fire(wheel, now):
+    """Avanza la rueda y ejecuta los vencidos como _on_timer_tick: callback(key)."""
+    fired = []
+    for callback, key in wheel.advance(now):
+        callback(key)
+        fired.append(key)
+    return fired
+
+
+class TimerWheelTest(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        self.callback = self.calls.append
+
+    def test_vence_al_llegar_su_tick(self):
+        wheel = TimerWheel(tick=1.0, slots=8)
+        wheel.schedule("a", 3, self.callback, now=0)
+        self.assertEqual(fire(wheel, 2.9), [])
+        self.assertEqual(fire(wheel, 3.0), ["a"])
+        self.assertEqual(self.calls, ["a"])
+        self.assertEqual(len(wheel), 0)
+        self.assertEqual(fire(wheel, 20), [])
+
+    def test_reprogramar_reemplaza_al_anterior(self):
+        wheel = TimerWheel(tick=1.0, slots=8)
+        wheel.schedule("a", 2, self.callback, now=0)
+        wheel.schedule("a", 5, self.callback, now=0)
+        self.assertEqual(len(wheel), 1)
+        self.assertEqual(fire(wheel, 4), [])
+        self.assertEqual(fire(wheel, 5), ["a"])
+
+    def test_cancelar(self):
+        wheel = TimerWheel(tick=1.0, slots=8)
+        wheel.schedule("a", 2, self.callback, now=0)
+        wheel.schedule("b", 2, self.callback, now=0)
+        wheel.cancel("a")
+        wheel.cancel("no-existe")
+        self.assertEqual(fire(wheel, 2), ["b"])
+
+    def test_demora_mayor_que_una_vuelta(self):
+        wheel = TimerWheel(tick=1.0, slots=8)
+        wheel.schedule("a", 11, self.callback, now=0)  # Misma ranura que el tick 3
+        self.assertEqual(fire(wheel, 3), [])
+        self.assertEqual(fire(wheel, 10), [])
+        self.assertEqual(fire(wheel, 11), ["a"])
+
+    def test_avance_atrasado_mas_de_una_vuelta(self):
+        wheel = TimerWheel(tick=1.0, slots=8)
+        for key, delay in (("a", 1), ("b", 7), ("c", 30)):
+            wheel.schedule(key, delay, self.callback, now=0)
+        self.assertEqual(sorted(fire(wheel, 25)), ["a", "b"])
+        self.assertEqual(fire(wheel, 30), ["c"])
+
+    def test_demora_cero_vence_en_el_tick_siguiente(self):
+        wheel = TimerWheel(tick=1.0, slots=8, now=5)
+        wheel.schedule("a", 0, self.callback, now=5)
+        self.assertEqual(fire(wheel, 5.5), [])
+        self.assertEqual(fire(wheel, 6), ["a"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+# tests.irc.test_whowas.py
+#
+# Pruebas del historial de WHOWAS: entradas por nick acotadas con
+# deque(maxlen), descarte del nick usado hace más tiempo al llegar al total
+# y vencimiento por el barrido de la rueda de temporizadores.
+#
+# Uso: python3 -m pytest tests/irc/test_whowas.py
+
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from Server.irc_server import IRCServer
+from Server.whowas import WHOWAS_SWEEP, WhowasEntry, WhowasStore
+
+
+def entry(nick, at, username="u"):
+    return WhowasEntry(nick, username, "mock.server", "Real", at)
+
+
+class WhowasStoreTest(unittest.TestCase):
+    def test_entradas_por_nick_acotadas(self):
+        store = WhowasStore(per_nick=3, ttl=100)
+        for at in range(5):
+            store.add(entry("ana", at, username=f"u{at}"))
+        entries = store.get("ana", now=5)
+        self.assertEqual([item.username for item in entries], ["u4", "u3", "u2"])
+        self.assertEqual(len(store), 3)
+
+    def test_descarta_el_nick_usado_hace_mas_tiempo(self):
+        store = WhowasStore(per_nick=5, max_entries=4, ttl=100)
+        store.add(entry("ana", 0))
+        store.add(entry("ana", 1))
+        store.add(entry("bob", 2))
+        store.add(entry("ana", 3))   # ana pasa a ser el usado más recientemente
+        store.add(entry("cid", 4))
+        store.add(entry("dan", 5))
+        # Con 6 entradas y tope 4: se va bob entero y luego la más antigua de ana
+        self.assertIsNone(store.get("bob", now=6))
+        self.assertEqual([item.disconnected_time for item in store.get("ana", now=6)], [3, 1])
+        self.assertEqual(len(store), 4)
+        self.assertEqual(list(store.nicks), ["ana", "cid", "dan"])
+
+    def test_get_recorta_las_entradas_vencidas(self):
+        store = WhowasStore(ttl=10)
+        store.add(entry("ana", 0))
+        store.add(entry("ana", 8))
+        self.assertEqual([item.disconnected_time for item in store.get("ana", now=15)], [8])
+        self.assertEqual(len(store), 1)
+        self.assertIsNone(store.get("ana", now=20))
+        self.assertEqual(len(store), 0)
+
+    def test_expire_se_detiene_en_el_primer_nick_vigente(self):
+        store = WhowasStore(ttl=10)
+        store.add(entry("ana", 0))
+        store.add(entry("bob", 8))
+        store.add(entry("cid", 1))
+        self.assertEqual(store.expire(now=15), 1)
+        # cid venció pero está detrás de bob, que sigue vigente
+        self.assertEqual(list(store.nicks), ["bob", "cid"])
+        self.assertEqual(store.expire(now=30), 2)
+        self.assertEqual(len(store), 0)
+
+
+class WhowasTimerTest(unittest.TestCase):
+    def test_el_barrido_de_la_rueda_vence_las_entradas(self):
+        server = IRCServer("127.0.0.1", 0)
+        server.whowas.add(entry("ana", time.time() - server.whowas.ttl - 1))
+        server.whowas.add(entry("bob", time.time()))
+        self.assertEqual(server.timers.advance(time.monotonic()), [])
+
+        expired = server.timers.advance(time.monotonic() + WHOWAS_SWEEP + 1)
+        self.assertEqual([key for _, key in expired], ["WHOWAS"])
+        for callback, key in expired:
+            callback(key)
+        self.assertIsNone(server.whowas.get("ana", time.time()))
+        self.assertIsNotNone(server.whowas.get("bob", time.time()))
+        self.assertEqual(len(server.timers), 1)  # El barrido se vuelve a programar
+
+
+if __name__ == "__main__":
+    unittest.main()
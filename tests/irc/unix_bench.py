@@ -0,0 +1,98 @@
+# tests.irc.unix_bench.py
+#
+# Compara el mismo servidor atendido por TCP de loopback y por un socket Unix:
+# varios procesos cliente envían ráfagas de PING y esperan los PONG, primero
+# por 127.0.0.1 y luego por la ruta del socket. Reporta mensajes/segundo.
+#
+# Uso: python3 tests/irc/unix_bench.py --engine asyncio --clients 8 --duration 5
+
+import argparse
+import logging
+import multiprocessing
+import os
+import socket
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from Server.irc_server import IRCServer
+from Server.async_irc_server import AsyncIRCServer
+from Server.server_log import configure_logging
+
+ENGINES = {"threaded": IRCServer, "asyncio": AsyncIRCServer}
+BATCH = 50  # PING enviados antes de esperar sus PONG
+
+
+def connect(address):
+    if isinstance(address, str):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(address)
+    else:
+        sock = socket.create_connection(address)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock
+
+
+def client(address, index, deadline, results):
+    sock = connect(address)
+    sock.sendall(f"NICK bench{index}\r\nUSER b 0 * :b\r\n".encode())
+    burst = b"PING :bench\r\n" * BATCH
+    done = 0
+    buffer = b""
+    while time.time() < deadline:
+        sock.sendall(burst)
+        pongs = 0
+        while pongs < BATCH:
+            buffer += sock.recv(65536)
+            pongs += buffer.count(b"PONG")
+            buffer = buffer[buffer.rfind(b"\r\n") + 2:]
+        done += BATCH
+    results[index] = done
+    sock.close()
+
+
+def run(address, clients, duration):
+    results = multiprocessing.Array("q", clients)
+    deadline = time.time() + duration
+    processes = [
+        multiprocessing.Process(target=client, args=(address, i, deadline, results))
+        for i in range(clients)
+    ]
+    start = time.time()
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    return sum(results) / (time.time() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TCP de loopback frente a socket Unix")
+    parser.add_argument("--engine", choices=list(ENGINES), default="asyncio")
+    parser.add_argument("--clients", type=int, default=8, help="Procesos cliente")
+    parser.add_argument("--duration", type=float, default=5.0, help="Segundos de medición por transporte")
+    args = parser.parse_args()
+
+    logs = configure_logging(logging.WARNING)
+    path = os.path.join(tempfile.mkdtemp(), "irc.sock")
+    server = ENGINES[args.engine]("127.0.0.1", 0)
+    server.add_listener(path)
+    server.start()
+
+    print(f"motor: {args.engine}  clientes: {args.clients}")
+    print(f"{'transporte':>12} {'msgs/s':>10} {'relativo':>9}")
+    base = None
+    for name, address in (("tcp", ("127.0.0.1", server.port)), ("unix", path)):
+        rate = run(address, args.clients, args.duration)
+        base = base or rate
+        print(f"{name:>12} {rate:>10.0f} {rate / base:>8.2f}x")
+
+    server.stop()
+    logs.stop()
+    os.rmdir(os.path.dirname(path))
+
+
+if __name__ == "__main__":
+    main()